@@ -171,7 +171,7 @@ assay_monitor.py \
 
 # generate genbank metadata
 echo "isolate|accession|col_date|create_date|Country: region|seq_length|start_pos|end_pos|region|country|division|location, region_exposure|country_exposure|division_exposure|segment|host|age|sex|originating_lab|submitting_lab|authors|title|comment" | sed "s/|/\t/g" > $resource_directory/metadata.tsv
-cat $fasta_directory/All_Seqs.fasta | grep '>' | sed "s/>//" | sed "s/|/\t/g" >> $resource_directory/metadata.tsv
+fasta_index.py $fasta_directory/All_Seqs.fasta | sed "s/>//" | sed "s/|/\t/g" >> $resource_directory/metadata.tsv
 
 echo -e "\nGenerating data for visualization...\n"
 primer_validation_vis.py \
@@ -179,7 +179,7 @@ primer_validation_vis.py \
     -m $resource_directory/metadata.tsv \
     -p $results_directory/match_table.csv \
     -a $resource_directory/assays.txt \
-    -r $results_directory/Assay_Results.json \
+    -r $results_directory/Assay_Results.store \
     -o $phyd3d_dist_directory/data/SARS-CoV-2.xml
 
 cp $resource_directory/db_totals.json $phyd3d_dist_directory/data/
@@ -3,12 +3,14 @@ import sys
 import os
 import re
 import json
+import results_store as rstore
 
 class AssayResult(object):
     """ This is the class for generating assay result JSON files.
 
-    :param json: The file location of the input JSON tree
-    :type json: str
+    :param ar_json: The location of the assay results (results store
+        directory or legacy JSON file)
+    :type ar_json: str
     :param outdir: The output dir
     :type outdir: str
     """
@@ -21,9 +23,10 @@ class AssayResult(object):
             "true_positives": {}
         }
 
-    def load_json(self):        
-        with open(self.ar_json) as f:
-            self.data = json.load(f)
+    def load_json(self):
+        # Only True Positives are split out to files
+        self.data = rstore.load_results(
+            self.ar_json, [rstore.positives_type])
 
     def get_stats(self):        
         return self.stats
@@ -10,6 +10,10 @@ import json
 import logging
 import pycountry_convert as pc
 import numpy as np
+import metadata_index as midx
+
+# Cached heatmap row of an assay partition
+heatmap_suffix = ".heatmap.json"
 
 class Metadata(object):
     """ This is the class for getting metadata for seqeunces.
@@ -19,6 +23,8 @@ class Metadata(object):
     """
 
     def __init__(self, metadata_jsons):
+        # Virus names of GISAID metadata.tsv files, for lookups by name
+        self.name_acc_map = {}
         self.meta_df = self._load_metadata(metadata_jsons)
 
     def _load_metadata(self, metadata_files):
@@ -53,6 +59,25 @@ class Metadata(object):
                     df['authors'] = df['authors']
                     df['coverage'] = ""
 
+                # GISAID's download metadata (columns as in the JSON files)
+                if 'Accession ID' in df:
+                    df['taxonomy'] = df['Virus name'].str.replace('hCoV-19/', '')
+                    df['gender'] = df['Gender']
+                    df['age'] = df['Patient age']
+                    df['collection_date'] = df['Collection date']
+                    df['host'] = df['Host']
+                    df[['continent','country']] = df.Location.str.split(' / ',n=1, expand=True)
+                    df['acc'] = df['Accession ID']
+                    # Not in every version of the download
+                    df['sequencing_center'] = df.get('Submitting lab', "")
+                    df['submitting_lab'] = df.get('Submitting lab', "")
+                    df['originating_lab'] = df.get('Originating lab', "")
+                    df['authors'] = df.get('Authors', "")
+                    df['coverage'] = df.get('Coverage', "")
+
+                    # Virus names, from the metafile's index
+                    self.name_acc_map.update(midx.load_name_acc_map(file))
+
                 # GenBank's metadata
                 # isolate accession col_date create_date Country: region
                 if 'accession' in df:
@@ -104,6 +129,8 @@ class Metadata(object):
             'originating_lab': "Unknown",
             'authors': "Unknown"
         }
+        if acc not in self.meta_df.index:
+            acc = self.name_acc_map.get(acc, acc)
         try:
             acc_series = self.meta_df.loc[[acc]].iloc[0]
             return acc_series[['taxonomy', 'gender', 'age', 'collection_date','host','continent','country','coverage','submitting_lab','originating_lab','authors']].fillna("None").to_dict()
@@ -487,7 +514,29 @@ class PhyXML(object):
 
         return ts_dom
 
-    def add_graph_validation_heatmap(self, val_table, title):
+    def _transform_by_partition(self, primer_df, transform_func,
+                                partition_cache, assay_keys):
+        """
+        Transform match table rows, reusing the cached rows of assay
+        partitions (keyed by the assay's oligos, see assay_partitions.py)
+        """
+        rows = []
+        for p_name, row in primer_df.iterrows():
+            key = assay_keys.get(p_name)
+            if key and partition_cache.has(key, heatmap_suffix):
+                values = partition_cache.read_json(key, heatmap_suffix)
+            else:
+                values = [ transform_func(x.item() if hasattr(x, 'item') else x)
+                           for x in row.tolist() ]
+                if key:
+                    partition_cache.write_json(key, heatmap_suffix, values)
+            rows.append(values)
+
+        return pd.DataFrame(rows, index=primer_df.index,
+                            columns=primer_df.columns)
+
+    def add_graph_validation_heatmap(self, val_table, title,
+                                     partition_cache=None, assay_keys=None):
         # load validation tahble
         primer_table = val_table
         primer_df = pd.read_csv(primer_table, index_col=0)
@@ -501,7 +550,11 @@ class PhyXML(object):
                 return 3
             else:
                 return x
-        primer_df = primer_df.applymap(transform_func)
+        if partition_cache is None:
+            primer_df = primer_df.applymap(transform_func)
+        else:
+            primer_df = self._transform_by_partition(
+                primer_df, transform_func, partition_cache, assay_keys)
 
         # store to valid_result_df
         self.valid_result_df = self.valid_result_df.append(primer_df)
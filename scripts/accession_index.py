@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 14:31:02 2026
+
+Accession index shared by all assays.
+
+    Every accession in the evaluated database gets an integer, once.
+    Per assay, positives and negatives are then sorted int arrays of
+    these integers, and negatives are a vectorized set difference
+    instead of a set rebuilt per assay.
+
+    NegativesList stands in for the "False Negatives" list of an assay
+    dict.  It holds the negative accessions as an int array and only
+    creates the {"Accession": ...} dicts when something iterates it.
+    Entries appended later (e.g. True Positives moved by the three prime
+    filter) are kept as the dicts they are.
+"""
+import numpy as np
+from collections.abc import Sequence
+
+
+''' 'Global' Variables '''
+# Dictionary Labels
+assay = "Assay"
+negatives_type = "False Negatives"
+
+
+''' Methods '''
+
+class AccessionIndex(object):
+    """ Integer index of all accessions in the evaluated database.
+
+    :param accession_list: All accessions, in database order
+    :type accession_list: list
+    """
+
+    def __init__(self, accession_list):
+        self.index = {}
+        for accession in accession_list:
+            self.index.setdefault(accession, len(self.index))
+        self.accessions = list(self.index)
+
+    def __len__(self):
+        return len(self.accessions)
+
+    def encode(self, accessions):
+        """ Sorted, unique int array of the known accessions given """
+        index = self.index
+        idx = [index[acc] for acc in accessions if acc in index]
+        return np.unique(np.array(idx, dtype=np.int32))
+
+    def decode(self, idx):
+        accessions = self.accessions
+        return [accessions[i] for i in idx]
+
+    def complement(self, idx):
+        """ Sorted int array of all accessions not in idx """
+        mask = np.ones(len(self.accessions), dtype=bool)
+        mask[idx] = False
+        return np.flatnonzero(mask).astype(np.int32)
+
+
+class NegativesList(Sequence):
+    """ Lazy list of False Negative dicts for one assay.
+
+    :param accession_index: The shared accession index
+    :type accession_index: AccessionIndex
+    :param idx: Sorted int array of negative accessions
+    :type idx: numpy.ndarray
+    """
+
+    def __init__(self, accession_index, idx):
+        self.accession_index = accession_index
+        self.idx = idx
+        self.extra = []
+
+    def __len__(self):
+        return len(self.idx) + len(self.extra)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if i < len(self.idx):
+            accession = self.accession_index.accessions[self.idx[i]]
+            return {"Accession": accession}
+        return self.extra[i - len(self.idx)]
+
+    def __iter__(self):
+        accessions = self.accession_index.accessions
+        for i in self.idx:
+            yield {"Accession": accessions[i]}
+        yield from self.extra
+
+    def append(self, entry):
+        self.extra.append(entry)
+
+    def extend(self, entries):
+        self.extra.extend(entries)
+
+    def accession_list(self):
+        """ Accessions of all entries, without building the dicts """
+        return (self.accession_index.decode(self.idx) +
+                [entry["Accession"] for entry in self.extra])
+
+
+def expand_negatives(Full_Dict):
+    """ Copy of Full_Dict with plain lists in place of NegativesLists """
+    expanded = dict(Full_Dict)
+    expanded[assay] = []
+    for assay_dict in Full_Dict[assay]:
+        assay_dict = dict(assay_dict)
+        if isinstance(assay_dict[negatives_type], NegativesList):
+            assay_dict[negatives_type] = list(assay_dict[negatives_type])
+        expanded[assay].append(assay_dict)
+    return expanded
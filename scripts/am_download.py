@@ -11,6 +11,8 @@ This script will download and prepare the necessary data for running the
 
 Dependencies:
     ncbi_download.py
+    download_manifest.py
+    genome_store.py
 
 
 The script requires the following arguments:
@@ -45,6 +47,42 @@ The script requires the following arguments:
             Input the range of sequence lengths in the format:  29000:30500.
             For no limit in either direction, put: 0:99999999
 
+Optional arguments:
+
+        '-k', '--api_key' <ncbi_api_key>
+            NCBI API key; raises the allowed request rate from 3 to 10
+            requests per second
+
+        '-t', '--threads' <number_of_threads>
+            Number of batches fetched at once (default: the allowed
+            request rate)
+
+        '-H', '--use_history'
+            Keep the search on the NCBI history server and fetch pages of
+            it (WebEnv/query_key with retstart/retmax) instead of lists
+            of ids; not capped at 99,999 records.  Pages finished by an
+            interrupted run of the same search are skipped on rerun.
+
+        '-N', '--no_manifest'
+            Fetch every record found by the search.  By default the
+            search results are summarized (esummary) and compared with
+            download_manifest.sqlite in the results directory, and only
+            records that are new, updated or not yet fetched (e.g. by an
+            interrupted run) are downloaded.  Not used with -H.
+
+        '-F', '--fna_files'
+            Write one <accession>.fna file per genome to the fasta
+            directory.  By default genomes are appended to a genome store
+            (genome_store/ in the fasta directory): block gzipped fasta
+            shards with .fai/.gzi indexes.
+
+        '-u', '--base_url' <eutils_url>
+            E-utilities base URL (default: NCBI's); e.g. a local server
+            for testing
+
+    Batches are fetched concurrently over one keep-alive session, within
+    NCBI's request rate, and failed requests are retried with backoff.
+
 @author: adanm
 """
 
@@ -53,6 +91,8 @@ import sys
 import time
 import argparse as ap
 import ncbi_download
+import download_manifest as dman
+import genome_store as gstore
 
 
 
@@ -74,6 +114,20 @@ def get_arguments():
                         required=True, help="results files directory")
     parser.add_argument('-f', '--fasta_directory', metavar='[STR]', nargs=1, type=str,
                         required=True, help="location of fasta files")
+    parser.add_argument('-k', '--api_key', metavar='[STR]', type=str,
+                        default=None, help="NCBI API key")
+    parser.add_argument('-t', '--threads', metavar='[INT]', type=int,
+                        default=None, help="number of batches fetched at once")
+    parser.add_argument('-H', '--use_history', action='store_true',
+                        help="page efetch through the NCBI history server")
+    parser.add_argument('-N', '--no_manifest', action='store_true',
+                        help="download all records found by the search")
+    parser.add_argument('-F', '--fna_files', action='store_true',
+                        help="write one fna file per genome instead of " +
+                        "the genome store")
+    parser.add_argument('-u', '--base_url', metavar='[STR]', type=str,
+                        default=ncbi_download.base_url,
+                        help="E-utilities base URL")
 
     return parser.parse_args()
 
@@ -98,6 +152,8 @@ def main():
     resource_dir = args.resource_directory[0]
     results_dir = args.results_directory[0]
     fasta_dir = args.fasta_directory[0]
+    api_key = args.api_key
+    ncbi_download.base_url = args.base_url
 
 
     # Query
@@ -107,36 +163,64 @@ def main():
 
     # File Names
     esearch_query_file = os.path.join(resource_dir, 'esearch_results.xml')
-    efetch_results_file = os.path.join(results_dir, 'efetch_results.txt')
 
+    # Genome store for the downloaded genomes
+    genome_store = None
+    if not args.fna_files:
+        genome_store = gstore.GenomeStore(gstore.get_store_dir(fasta_dir))
 
-    ''' ESearch '''
-    print("5 second pause...")
-    time.sleep(5)
-    ncbi_download.run_esearch(target_query, esearch_query_file, email, tool, min_date, max_date)
 
+    if args.use_history:
+        ''' ESearch, results kept on the history server '''
+        ncbi_download.run_esearch_history(target_query, esearch_query_file,
+                email, tool, min_date, max_date,
+                limiter=ncbi_download.make_rate_limiter(api_key),
+                api_key=api_key)
 
-    ''' Get id list from esearch file '''
-    id_list = ncbi_download.get_id_list(esearch_query_file)
-    print("Length of search list:", len(id_list), "\n")
-
-    ''' Get indices to split list '''
-    indices = ncbi_download.split_indices(id_list)
-
-
-    ''' EFetch '''
-    for index in indices:
-        print("\nGetting sequences {} to {}...".format(index[0], index[1]))
-        id_list_string = ncbi_download.split_id_list(id_list, index)
-
-
-        print("5 second pause...")
-        time.sleep(5)
-        ncbi_download.run_efetch(id_list_string, fasta_dir, efetch_results_file, email, tool)
-
-        file_list = ncbi_download.read_efetch_write_fna(efetch_results_file, fasta_dir)
+        ''' EFetch (pages of the history, fetched concurrently) '''
+        search_signature = "\t".join([target_query, min_date, max_date])
+        file_list = ncbi_download.run_efetch_history_parallel(
+                esearch_query_file, fasta_dir, results_dir, email, tool,
+                search_signature, api_key, args.threads, genome_store)
+        for each in file_list:
+                print(each)
+    else:
+        ''' ESearch '''
+        ncbi_download.run_esearch(target_query, esearch_query_file, email,
+                tool, min_date, max_date,
+                limiter=ncbi_download.make_rate_limiter(api_key),
+                api_key=api_key)
+
+        ''' Get id list from esearch file '''
+        id_list = ncbi_download.get_id_list(esearch_query_file)
+        print("Length of search list:", len(id_list), "\n")
+
+        ''' Keep only new or updated records '''
+        manifest = None
+        if not args.no_manifest:
+            summaries = ncbi_download.run_esummary_parallel(id_list, email,
+                    tool, api_key, args.threads)
+            manifest = dman.DownloadManifest(
+                    os.path.join(results_dir, dman.manifest_filename))
+            if genome_store is not None:
+                downloaded = set(genome_store.index)
+            else:
+                downloaded = { fna_file.split('.')[0] for fna_file in
+                               os.listdir(fasta_dir) if fna_file.endswith(".fna") }
+            id_list = manifest.find_updates(summaries, downloaded)
+            update_ids = set(id_list)
+            manifest.record_pending([ summary for summary in summaries
+                                      if summary[0] in update_ids ])
+            print("{} new or updated records, {} already downloaded\n".format(
+                len(id_list), len(summaries) - len(id_list)))
+
+        ''' EFetch (batches of ids, fetched concurrently) '''
+        file_list = ncbi_download.run_efetch_parallel(id_list, fasta_dir,
+                email, tool, api_key, args.threads, manifest, genome_store)
         for each in file_list:
                 print(each)
+        if manifest is not None:
+            manifest.close()
 
 
     big_toc = time.perf_counter()
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 00:04:51 2026
+
+Per-assay amplicon windows for tntblast.
+
+    Each assay amplifies a small region of the genome, so instead of
+    whole genomes tntblast can search, per assay, a window around that
+    region.  The region is anchored by exact matches of the 3' ends
+    (seed_length bases, either strand) of the forward and reverse
+    primers; the window spans all anchors plus the primer length and
+    window_padding on each side.  A genome is searched in full for an
+    assay if either primer has no anchor, or if the anchors span more
+    than the maximum amplicon length (repeats or a mismatch in a seed);
+    an assay with a degenerate base in a primer seed is searched in full
+    in every genome.
+
+    A window record's header is the genome's header with the window's
+    start appended as "|window_start=<start>".  When hits on a window are
+    copied to the combined output the tag is removed, so hits parse to the
+    same genome, and the amplicon and probe ranges are shifted back to
+    genome coordinates by the window's start.
+"""
+import os
+
+
+''' 'Global' Variables '''
+window_dirname = "amplicon_windows"
+seed_length = 12
+window_padding = 100
+seed_bases = set(b"ACGT")
+complement_table = bytes.maketrans(b"ACGTN", b"TGCAN")
+range_prefixes = (b"amplicon range = ", b"probe range = ")
+window_start_tag = b"|window_start="
+
+
+''' Methods '''
+
+def reverse_complement(sequence):
+    return sequence.translate(complement_table)[::-1]
+
+
+def primer_seeds(primer):
+    ''' 3' seed of a primer and its reverse complement; None if the seed
+        has a degenerate base '''
+    seed = primer.upper().encode()[-seed_length:]
+    if not set(seed) <= seed_bases:
+        return None
+    return seed, reverse_complement(seed)
+
+
+def assay_anchors(assay_line):
+    ''' (forward primer seeds, reverse primer seeds, window padding) of an
+        assays.txt line, or None if it can not be windowed '''
+    fields = assay_line.split()
+    forward_seeds = primer_seeds(fields[1])
+    reverse_seeds = primer_seeds(fields[2])
+    if forward_seeds is None or reverse_seeds is None:
+        return None
+    oligo_length = max(len(oligo) for oligo in fields[1:4])
+    return forward_seeds, reverse_seeds, oligo_length + window_padding
+
+
+def find_seeds(sequence, seeds):
+    positions = []
+    for seed in seeds:
+        position = sequence.find(seed)
+        while position != -1:
+            positions.append(position)
+            position = sequence.find(seed, position + 1)
+    return positions
+
+
+def find_window(sequence, anchors, max_amplicon_length):
+    ''' (start, end) of the assay's window in sequence, or None '''
+    forward_seeds, reverse_seeds, padding = anchors
+    forward_positions = find_seeds(sequence, forward_seeds)
+    if not forward_positions:
+        return None
+    reverse_positions = find_seeds(sequence, reverse_seeds)
+    if not reverse_positions:
+        return None
+
+    positions = forward_positions + reverse_positions
+    low = min(positions)
+    high = max(positions) + seed_length
+    if max_amplicon_length and high - low > max_amplicon_length:
+        return None
+    return max(0, low - padding), min(len(sequence), high + padding)
+
+
+def iter_range_records(fasta_file, start, end):
+    ''' (header line, sequence lines) of the records in a byte range '''
+    header = None
+    lines = []
+    with open(fasta_file, 'rb') as read_file:
+        read_file.seek(start)
+        position = start
+        while position < end and (line := read_file.readline()):
+            position += len(line)
+            if line.startswith(b">"):
+                if header is not None:
+                    yield header, lines
+                header = line
+                lines = []
+            elif header is not None:
+                lines.append(line)
+    if header is not None:
+        yield header, lines
+
+
+def get_part_path(window_dir, assay_num, shard_num):
+    return os.path.join(window_dir, "assay{:04d}_part{:04d}.fasta".format(
+        assay_num, shard_num))
+
+
+def extract_windows(argument):
+    ''' Write the window (or, failing that, whole) record of each genome
+        of one fasta shard, for each windowed assay; returns the count of
+        whole genomes by assay '''
+    (fasta_file, start, end, shard_num, window_dir, assay_anchor_list,
+        max_amplicon_length) = argument
+
+    write_handles = { assay_num: open(
+        get_part_path(window_dir, assay_num, shard_num), 'wb')
+        for assay_num, anchors in assay_anchor_list }
+    full_counts = { assay_num: 0 for assay_num, anchors in assay_anchor_list }
+
+    for header, lines in iter_range_records(fasta_file, start, end):
+        sequence = b"".join(line.strip() for line in lines).upper()
+        header_line = header.rstrip(b"\r\n")
+        for assay_num, anchors in assay_anchor_list:
+            write_handle = write_handles[assay_num]
+            window = find_window(sequence, anchors, max_amplicon_length)
+            if window is None:
+                write_handle.write(header)
+                write_handle.writelines(lines)
+                full_counts[assay_num] += 1
+                continue
+            window_start, window_end = window
+            write_handle.write(header_line + window_start_tag
+                               + str(window_start).encode() + b"\n")
+            write_handle.write(sequence[window_start:window_end] + b"\n")
+
+    for write_handle in write_handles.values():
+        write_handle.close()
+
+    return full_counts
+
+
+def split_window_header(line):
+    ''' (genome header line, window start) of a header line of a hit '''
+    header_line = line.rstrip(b"\r\n")
+    genome_header, tag, window_start = header_line.rpartition(
+        window_start_tag)
+    if not tag or not window_start.isdigit():
+        return line, 0
+    return genome_header + line[len(header_line):], int(window_start)
+
+
+def shift_range_line(line, offset):
+    for prefix in range_prefixes:
+        if line.startswith(prefix):
+            fields = line.split()
+            return prefix + "{} .. {}\n".format(
+                int(fields[3]) + offset, int(fields[5]) + offset).encode()
+    return line
+
+
+def write_shifted_hits(tnt_file, write_handle):
+    ''' Copy the hits of a window tnt file (no separators), with genome
+        headers and ranges shifted to genome coordinates '''
+    record = []
+
+    def write_record():
+        offset = 0
+        for line_num, line in enumerate(record):
+            if line.startswith(b">"):
+                record[line_num], offset = split_window_header(line)
+        if offset:
+            write_handle.writelines(
+                [ shift_range_line(line, offset) for line in record ])
+        else:
+            write_handle.writelines(record)
+
+    with open(tnt_file, 'rb') as read_file:
+        for line in read_file:
+            if line.startswith(b"#####"):
+                continue
+            if line.startswith(b"name = ") and record:
+                write_record()
+                record = []
+            record.append(line)
+    if record:
+        write_record()
@@ -8,8 +8,9 @@ This script runs the assay monitor functionality for this package.
     resource files (detailed below), assays (provided in a resource 
     file) will be evaluated against each genome (previously downloaded 
     fastas) using ThermonucleotideBLAST.  Results will be output as full
-    results in Assay_Results.json, as a summary in summary_table.json, 
-    and as cross referenced results in match_table.csv.
+    results in the columnar store Assay_Results.store (optionally also as
+    Assay_Results.json), as a summary in summary_table.json, and as cross
+    referenced results in match_table.csv.
 
 This script calls ThermonucleotideBLAST (TNTBLAST) which was created by 
     Jason Gans at Los Alamos National Laboratory with the BSD 3-Clause 
@@ -31,6 +32,7 @@ Dependencies:
     aux_funx
     assay_sum_table
     newer_tnt_parse_oldtnt
+    results_store
     TNTBLAST
 
 
@@ -89,6 +91,8 @@ import time
 import aux_funx
 import ujson as json
 import argparse as ap
+import results_store as rstore
+import accession_index as accidx
 import assay_sum_table as assum
 import newer_tnt_parse_oldtnt as nuparse
 
@@ -106,6 +110,13 @@ def write_dict_to_json(Full_Dict, results_file):
     print("Wrote file:", results_file)
 
 
+def write_results(Full_Dict, file_ns):
+    rstore.write_results_store(Full_Dict, file_ns.results_store)
+    if file_ns.write_json:
+        write_dict_to_json(
+                accidx.expand_negatives(Full_Dict), file_ns.results_json)
+
+
 def print_time(tic, msg):
     toc = time.perf_counter()
     elapsed_time = toc-tic
@@ -138,6 +149,7 @@ def create_filename_namespace(args):
     meta_filename = "metadata.tsv"
     accession_filename = "accessions.txt"
     results_filename = "Assay_Results.json"
+    results_store_name = "Assay_Results" + rstore.store_suffix
     three_prime_filename = "del_ct_table.txt"
     sum_table_name = "summary_table.json"
     accession_list_filename = "accession_list.txt"
@@ -160,6 +172,8 @@ def create_filename_namespace(args):
             results_dir, accession_filename)
     filenames_ns.results_json = os.path.join(
             results_dir, results_filename)
+    filenames_ns.results_store = os.path.join(
+            results_dir, results_store_name)
     filenames_ns.three_prime_table = os.path.join(
             resource_dir, three_prime_filename)
     filenames_ns.sum_table_file = os.path.join(
@@ -168,6 +182,9 @@ def create_filename_namespace(args):
     # GISAID flag
     filenames_ns.use_gisaid = args.use_gisaid
 
+    # Compatibility JSON output flag
+    filenames_ns.write_json = args.write_json
+
     return filenames_ns
 
 
@@ -199,6 +216,9 @@ def get_arguments():
                         help="Delta Ct value to use as threshold in " +
                         "determining thermo mismatches in the three " +
                         "prime filter. Default value is 2.0.")
+    parser.add_argument('-J', '--write_json', action='store_true',
+                        help="Also write full results as " +
+                        "Assay_Results.json (compatibility output).")
     return parser.parse_args()
 
 
@@ -233,8 +253,8 @@ def main():
 #    # Full_Dict = nuparse.parse_tnt_results(
 #    #         file_ns.tnt_result, iso_acc_dict, iso_idx)
 #
-#    # Output results as json file
-#    write_dict_to_json(Full_Dict, file_ns.results_json)
+#    # Output results to results store
+#    write_results(Full_Dict, file_ns)
 #
 #    print_time(tic, "Parsing")
 #    ''' ################# End TNT_BLAST Parsing #################### '''
@@ -256,9 +276,8 @@ def main():
 #        for line in acc_file.readlines():
 #            accession_list.append(line.strip())
 #    
-#    # Get assay monitor data from json file
-#    with open(file_ns.results_json) as json_file:
-#        Full_Dict = json.load(json_file)
+#    # Get assay monitor data from results store
+#    Full_Dict = rstore.read_results_store(file_ns.results_store)
 #
 #    # Parse and Determine false negative results
 #    tic = time.perf_counter()
@@ -280,20 +299,22 @@ def main():
     ''' #################### Three Prime Filter #################### '''
     tic = time.perf_counter()
 
-    # Get assay monitor data from json file
-    with open(file_ns.results_json) as json_file:
-        Full_Dict = json.load(json_file)
+    # Get assay monitor data from results store
+    Full_Dict = rstore.read_results_store(file_ns.results_store)
         
-    # Move 3' MMs (above del_Ct threshold) from TP to FN (Parallel)
-    Full_Dict = nuparse.set_queues_for_three_prime(
-            Full_Dict, file_ns.three_prime_table, 
-            del_ct_threshhold, num_of_procs)
+    # Move 3' MMs (above del_Ct threshold) from TP to FN (one batch)
+    Full_Dict = nuparse.filter_three_prime_vectorized(
+            Full_Dict, file_ns.three_prime_table, del_ct_threshhold)
+    # # Move 3' MMs (above del_Ct threshold) from TP to FN (Parallel)
+    # Full_Dict = nuparse.set_queues_for_three_prime(
+    #         Full_Dict, file_ns.three_prime_table, 
+    #         del_ct_threshhold, num_of_procs)
     # # Move 3' MMs (above del_Ct threshold) from TP to FN (single thread)
     # Full_Dict = nuparse.filter_three_prime(
     #         Full_Dict, file_ns.three_prime_table, del_ct_threshhold)
 
-    # Output results as json file
-    write_dict_to_json(Full_Dict, file_ns.results_json)
+    # Output results to results store
+    write_results(Full_Dict, file_ns)
 
     print_time(tic, "Three Prime Filter")
     ''' ################# End Three Prime Filter ################### '''
@@ -307,13 +328,10 @@ def main():
     ''' ################### Create Summary Table ################### '''
     tic = time.perf_counter()
 
-    # Get assay monitor data from json file
-    with open(file_ns.results_json, 'r') as json_file:
-        Full_Dict = json.load(json_file)
-
     # Generate dictionary containing summary results
     # table_dict = assum.generate_table(Full_Dict)
-    table_dict = assum.generate_table_parallel(Full_Dict, num_of_procs)
+    # table_dict = assum.generate_table_parallel(Full_Dict, num_of_procs)
+    table_dict = assum.generate_table_from_store(file_ns.results_store)
 
     # Output results as json file
     write_dict_to_json(table_dict, file_ns.sum_table_file)
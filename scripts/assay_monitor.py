@@ -0,0 +1,491 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 11:05:17 2026
+
+This script runs the assay monitor functionality for this package in a
+    single process.  It replaces running assay_1analyze.py and
+    assay_2analyze.py with blocks toggled by hand: TNTBLAST output is
+    parsed, false negatives are determined, the three prime filter is
+    applied and the summary table is generated, all on the same in-memory
+    Full_Dict.  Only the final artifacts are written to disk:
+
+        Assay_Results.store     full results (columnar results store)
+        summary_table.json      summary of the results
+        match_table.csv         max mismatches per assay and genome
+        accessions.txt          accessions of all evaluated genomes
+        Assay_Results.json      only with -J/--write_json
+        match_table.npz         only with -b/--binary_match_table
+
+    With -c/--checkpoint the results store is also written after each
+    stage to the "checkpoints" directory under the results directory.
+
+    With -i/--incremental TNTBLAST is run by this script (via run_tnt.py
+    and variable_config.py) on only the genomes that are new or changed
+    since the last incremental run, according to genome_manifest.json in
+    the results directory.  Their hits are merged with the cached True
+    Positives of the Parsed checkpoint before false negatives, the three
+    prime filter and the summaries are recomputed for all genomes.  A
+    change to assays.txt or to the tntblast settings in
+    variable_config.py, or a missing manifest or checkpoint, runs all
+    genomes.  Checkpoints are always written in this mode.
+
+    With -P/--assay_partitions the TNTBLAST output is read from the per
+    assay partitions written by "run_tnt.py -P" instead of the combined
+    results file.  Parsed hits and summary tallies are cached per assay
+    in the "assay_partitions" directory under the results directory
+    (see assay_partitions.py), so only new or modified assays are
+    parsed and tallied again.
+
+This script calls ThermonucleotideBLAST (TNTBLAST) which was created by
+    Jason Gans at Los Alamos National Laboratory with the BSD 3-Clause
+    License.  Please contact Jason at jgans@lanl.gov
+
+    The reference for ThermonucleotideBLAST is:
+    "Improved assay-dependent searching of nucleic acid sequence
+    databases." by J. D. Gans and M. Wolinsky, Nucleic Acids Res. 2008
+    Jul;36(12):e74. doi: 10.1093/nar/gkn301.
+
+
+Dependencies:
+    accession_index
+    aux_funx
+    assay_sum_table
+    genome_manifest
+    newer_tnt_parse_oldtnt
+    results_store
+    assay_partitions
+    genome_dedup
+    run_tnt (only with -i/--incremental)
+    TNTBLAST (output in the tnt results directory)
+
+
+The script requires the following arguments:
+
+        '-r', '--resource_directory' <resource_directory>
+            This is the directory which must contain certain necessary
+            files and to which other resource files will be created.
+            Use the format:  /XXX/XXX/XXX/
+
+        '-R', '--results_directory' <results_directory>
+            This is the directory where results files will be created.
+            Use the format:  /XXX/XXX/XXX/
+
+        '-f', '--fasta_directory' <fasta_directory>
+            This is the directory which contains the fna sequence files.
+            Use the format:  /XXX/XXX/XXX/
+
+        '-t', '--tnt_results_directory' <tnt_results_directory>
+            This is the directory in which TNTBLAST results files were
+            created.
+            Use the format:  /XXX/XXX/XXX/
+
+The resource directory must contain "del_ct_table.txt" (and
+    "metadata.tsv" when using GISAID), as described in assay_1analyze.py,
+    and "assays.txt" when using -i/--incremental or -P/--assay_partitions.
+
+If run_tnt.py was run with -D/--dedup, the hits of each representative
+    sequence are copied to its duplicates (<tnt results>_members.json)
+    while parsing, so results cover every genome.
+"""
+import os
+import sys
+import time
+import aux_funx
+import ujson as json
+import argparse as ap
+import multiprocessing as mp
+import results_store as rstore
+import accession_index as accidx
+import assay_partitions as aparts
+import genome_dedup as gdedup
+import assay_sum_table as assum
+import genome_manifest as gman
+import newer_tnt_parse_oldtnt as nuparse
+
+
+''' Methods '''
+
+def write_dict_to_json(Full_Dict, results_file):
+    print("\nWriting results to", results_file)
+    with open(results_file, 'w') as file_handle:
+        print(
+            json.dumps(
+                Full_Dict, sort_keys=True, indent=4
+            ), file=file_handle
+        )
+    print("Wrote file:", results_file)
+
+
+def write_checkpoint(Full_Dict, file_ns, stage_name):
+    if file_ns.checkpoint_dir:
+        checkpoint_store = os.path.join(
+            file_ns.checkpoint_dir, stage_name + rstore.store_suffix)
+        rstore.write_results_store(Full_Dict, checkpoint_store)
+
+
+def parse_incremental(file_ns, accession_list, iso_acc_dict, iso_idx,
+                      num_of_procs):
+    ''' Run tntblast on new and changed genomes only; merge their hits
+        with the cached True Positives of the Parsed checkpoint '''
+    # run_tnt.py reads variable_config.py; only needed to run tntblast
+    import run_tnt
+
+    assay_hash = gman.hash_assay_file(
+            file_ns.assay_file, run_tnt.get_tnt_settings(run_tnt.var_conf))
+    seq_hashes = gman.hash_fasta_records(file_ns.sequence_file)
+    manifest = gman.load_manifest(file_ns.manifest_file)
+    parsed_store = os.path.join(
+            file_ns.checkpoint_dir, "Parsed" + rstore.store_suffix)
+
+    cached_dict = None
+    if manifest is None or not rstore.is_results_store(parsed_store):
+        print("No previous incremental run found; evaluating all genomes")
+    elif manifest["assay_hash"] != assay_hash:
+        print("Assay set or tntblast settings changed; "
+              "evaluating all genomes")
+    else:
+        cached_dict = rstore.read_results_store(
+                parsed_store, [rstore.positives_type])
+
+    if cached_dict is None:
+        delta_positions = list(range(len(accession_list)))
+        stale_accessions = set()
+    else:
+        delta_positions, stale_accessions = gman.find_changed_genomes(
+                manifest, accession_list, seq_hashes)
+    print("{} of {} genomes new or changed, {} cached results stale".format(
+        len(delta_positions), len(accession_list), len(stale_accessions)))
+
+    # Run tntblast on the delta and parse its hits
+    delta_dict = {nuparse.assay: []}
+    if delta_positions:
+        tnt_ns = ap.Namespace()
+        tnt_ns.assay_file = file_ns.assay_file
+        tnt_ns.tnt_dir = file_ns.tnt_dir
+        tnt_ns.shard_dir = os.path.join(file_ns.tnt_dir, "shards")
+        if len(delta_positions) == len(accession_list):
+            tnt_ns.combined_fasta = file_ns.sequence_file
+        else:
+            tnt_ns.combined_fasta = file_ns.delta_sequence_file
+            gman.write_delta_fasta(file_ns.sequence_file,
+                                   file_ns.delta_sequence_file,
+                                   delta_positions)
+
+        tnt_result = run_tnt.run_tntblast(
+                tnt_ns, run_tnt.var_conf, num_of_procs)
+        # The delta is not deduplicated; a members file left by an earlier
+        # run_tnt.py -D run next to tnt_result does not apply to it
+        delta_dict = nuparse.brute_parse_tnt_results(
+                tnt_result, iso_acc_dict, iso_idx, num_of_procs, {})
+
+    if cached_dict is None:
+        Full_Dict = delta_dict
+    else:
+        Full_Dict = gman.merge_parsed_results(
+                cached_dict, delta_dict, stale_accessions,
+                run_tnt.get_assay_order(file_ns.assay_file))
+
+    return Full_Dict, assay_hash, seq_hashes
+
+
+def print_time(tic, msg):
+    toc = time.perf_counter()
+    elapsed_time = toc-tic
+    hours = int(elapsed_time / 3600)
+    minutes = int(elapsed_time / 60 - hours * 60)
+    secs = elapsed_time - minutes * 60 - hours * 3600
+    print(
+        f"{msg} Runtime: {hours} hours, {minutes} minutes, {secs} seconds"
+    )
+    print()
+
+
+def create_filename_namespace(args):
+    filenames_ns = ap.Namespace()
+
+    resource_dir = args.resource_directory
+    results_dir = args.results_directory
+    fasta_directory = args.fasta_directory
+    tnt_dir = args.tnt_results_directory
+
+    # Filenames
+    gisaid_filename = "sequences.fasta"
+    genbank_filename = "All_Seqs.fasta"
+    if args.use_gisaid:
+        sequence_filename = gisaid_filename
+        tnt_resultname = "sequences_results.out"
+    else:
+        sequence_filename = genbank_filename
+        tnt_resultname = "All_Seqs_results.out"
+    meta_filename = "metadata.tsv"
+    assay_filename = "assays.txt"
+    accession_filename = "accessions.txt"
+    results_filename = "Assay_Results.json"
+    results_store_name = "Assay_Results" + rstore.store_suffix
+    three_prime_filename = "del_ct_table.txt"
+    sum_table_name = "summary_table.json"
+    checkpoint_dirname = "checkpoints"
+    delta_sequence_filename = "{}_delta.fasta".format(
+            sequence_filename.split(".")[0])
+
+    # Paths
+    filenames_ns.resource_dir = args.resource_directory
+    filenames_ns.results_dir = args.results_directory
+    filenames_ns.fasta_directory = args.fasta_directory
+    filenames_ns.tnt_dir = args.tnt_results_directory
+    if args.checkpoint or args.incremental:
+        filenames_ns.checkpoint_dir = os.path.join(
+                results_dir, checkpoint_dirname)
+    else:
+        filenames_ns.checkpoint_dir = None
+
+    # Files
+    filenames_ns.metafile = os.path.join(
+            resource_dir, meta_filename)
+    filenames_ns.assay_file = os.path.join(
+            resource_dir, assay_filename)
+    filenames_ns.sequence_file = os.path.join(
+            fasta_directory, sequence_filename)
+    filenames_ns.delta_sequence_file = os.path.join(
+            tnt_dir, delta_sequence_filename)
+    filenames_ns.manifest_file = os.path.join(
+            results_dir, gman.manifest_filename)
+    filenames_ns.tnt_partition_dir = os.path.join(
+            tnt_dir, aparts.partition_dirname)
+    filenames_ns.partition_dir = os.path.join(
+            results_dir, aparts.partition_dirname)
+    filenames_ns.tnt_result = os.path.join(tnt_dir, tnt_resultname)
+    filenames_ns.members_file = gdedup.get_members_path(
+            filenames_ns.tnt_result)
+    filenames_ns.accession_file = os.path.join(
+            results_dir, accession_filename)
+    filenames_ns.results_json = os.path.join(
+            results_dir, results_filename)
+    filenames_ns.results_store = os.path.join(
+            results_dir, results_store_name)
+    filenames_ns.three_prime_table = os.path.join(
+            resource_dir, three_prime_filename)
+    filenames_ns.sum_table_file = os.path.join(
+            results_dir, sum_table_name)
+
+    # GISAID flag
+    filenames_ns.use_gisaid = args.use_gisaid
+
+    return filenames_ns
+
+
+def get_arguments():
+    parser = ap.ArgumentParser(prog=sys.argv[0].split('/')[-1])
+
+    parser.add_argument('-G', '--use_gisaid', action='store_true',
+                        help="Use GISAID metadata file.  If not " +
+                        "present or using GenBank, omit flag.")
+    parser.add_argument('-r', '--resource_directory', metavar='[STR]',
+                        type=str,required=True,
+                        help="resource files directory")
+    parser.add_argument('-R', '--results_directory', metavar='[STR]',
+                        type=str, required=True,
+                        help="results files directory")
+    parser.add_argument('-f', '--fasta_directory', metavar='[STR]',
+                        type=str, required=True,
+                        help="location of fasta files")
+    parser.add_argument('-t', '--tnt_results_directory',
+                        metavar='[STR]', type=str, required=True,
+                        help="location of tnt results")
+    parser.add_argument('-p', '--procnum',
+                        metavar='[INT]', type=int, default=mp.cpu_count(),
+                        help="Number of processors to use for parallel " +
+                        "tnt output parsing (and tntblast with -i). " +
+                        "Default is the number of CPUs.")
+    parser.add_argument('-d', '--del_ct_threshhold',
+                        metavar='[FLOAT]', type=float, default=2.0,
+                        help="Delta Ct value to use as threshold in " +
+                        "determining thermo mismatches in the three " +
+                        "prime filter. Default value is 2.0.")
+    parser.add_argument('-J', '--write_json', action='store_true',
+                        help="Also write full results as " +
+                        "Assay_Results.json (compatibility output).")
+    parser.add_argument('-c', '--checkpoint', action='store_true',
+                        help="Write the results store after every stage " +
+                        "to the checkpoints directory.")
+    incremental_grp = parser.add_mutually_exclusive_group()
+    incremental_grp.add_argument('-i', '--incremental', action='store_true',
+                        help="Run tntblast on only new or changed " +
+                        "genomes and reuse the cached results of the " +
+                        "others.")
+    incremental_grp.add_argument('-P', '--assay_partitions',
+                        action='store_true',
+                        help="Read tntblast output per assay (run_tnt.py " +
+                        "-P) and reuse the cached results of unchanged " +
+                        "assays.")
+    parser.add_argument('-b', '--binary_match_table', action='store_true',
+                        help="Also write the match table as a binary " +
+                        "int8 matrix (match_table.npz).")
+    return parser.parse_args()
+
+
+
+def main():
+    print("\nRunning:", sys.argv[0].split('/')[-1])
+    big_tic = time.perf_counter()
+
+    # Get command line arguments and generate filename namespace
+    args = get_arguments()
+    file_ns = create_filename_namespace(args)
+
+    # Variables
+    del_ct_threshhold = args.del_ct_threshhold
+    num_of_procs = args.procnum
+    if args.use_gisaid:
+        iso_idx = 0
+    else:
+        iso_idx = 1
+
+
+    ''' ###################### Accession List ###################### '''
+    tic = time.perf_counter()
+    aux_funx.generate_accession_file(file_ns, iso_idx)
+    with open(file_ns.accession_file) as acc_file:
+        accession_list = [ line.strip() for line in acc_file ]
+    print_time(tic, "Accession Listmake")
+    ''' #################### End Accession List #################### '''
+
+
+
+    ''' ################### TNT_BLAST Parsing ###################### '''
+    tic = time.perf_counter()
+
+    # Per assay partitions: tntblast output and cached results
+    partition_cache = None
+    assay_keys = None
+    if args.assay_partitions:
+        tnt_cache = aparts.PartitionCache(file_ns.tnt_partition_dir)
+        assays = aparts.read_assays(file_ns.assay_file)
+        assay_keys = { name: key for name, key, _ in assays }
+        partition_cache = aparts.PartitionCache(
+                file_ns.partition_dir,
+                aparts.hash_values([
+                    tnt_cache.source_key, del_ct_threshhold,
+                    aparts.file_key(file_ns.three_prime_table,
+                                    file_ns.metafile,
+                                    file_ns.members_file)]))
+        partition_cache.save()
+
+    # Prepare isolate to accession mapping
+    if args.use_gisaid:
+        iso_acc_dict = nuparse.get_acc_list(file_ns)
+    else:
+        iso_acc_dict = { accession: accession
+                         for accession in accession_list }
+
+    # Duplicate genomes left out of tntblast by run_tnt.py -D
+    members = gdedup.load_members(file_ns.members_file)
+    if members and not args.incremental:
+        print("Copying hits of {} deduplicated sequences to {} genomes".format(
+            len(members), sum(len(each) for each in members.values())))
+
+    # Parse tnt output into multi-level dict of true positives
+    print("\nParsing TNT Output into Metadata Dictionary...")
+    if args.incremental:
+        Full_Dict, assay_hash, seq_hashes = parse_incremental(
+                file_ns, accession_list, iso_acc_dict, iso_idx,
+                num_of_procs)
+    elif args.assay_partitions:
+        Full_Dict = nuparse.parse_tnt_partitions(
+                tnt_cache, partition_cache, assays, iso_acc_dict, iso_idx,
+                num_of_procs, members)
+    else:
+        Full_Dict = nuparse.brute_parse_tnt_results(
+                file_ns.tnt_result, iso_acc_dict, iso_idx, num_of_procs,
+                members)
+    write_checkpoint(Full_Dict, file_ns, "Parsed")
+
+    # Manifest matches the Parsed checkpoint just written
+    if args.incremental:
+        gman.write_manifest(
+                file_ns.manifest_file, assay_hash, accession_list,
+                seq_hashes)
+
+    print_time(tic, "Parsing")
+    ''' ################# End TNT_BLAST Parsing #################### '''
+
+
+
+    ''' ############### Determine False Negatives ################## '''
+    tic = time.perf_counter()
+    Full_Dict = nuparse.determine_negatives(
+            accession_list, Full_Dict,
+            "True Positives", "False Negatives")
+    write_checkpoint(Full_Dict, file_ns, "Negatives")
+
+    print_time(tic, "Determine Negatives")
+    ''' ################## End Determine Negatives ################# '''
+
+
+
+    ''' #################### Three Prime Filter #################### '''
+    tic = time.perf_counter()
+
+    # Move 3' MMs (above del_Ct threshold) from TP to FN (one batch)
+    Full_Dict = nuparse.filter_three_prime_vectorized(
+            Full_Dict, file_ns.three_prime_table, del_ct_threshhold)
+
+    print_time(tic, "Three Prime Filter")
+    ''' ################# End Three Prime Filter ################### '''
+
+
+
+    ''' ##################### Write Results ######################## '''
+    tic = time.perf_counter()
+    rstore.write_results_store(Full_Dict, file_ns.results_store)
+    if args.write_json:
+        write_dict_to_json(
+                accidx.expand_negatives(Full_Dict), file_ns.results_json)
+
+    print_time(tic, "Writing")
+    ''' ################### End Write Results ###################### '''
+
+
+
+    ''' ################### Create Summary Table ################### '''
+    tic = time.perf_counter()
+
+    # Generate summary from the mismatch columns of the results store
+    table_dict = assum.generate_table_from_store(
+            file_ns.results_store, partition_cache, assay_keys)
+
+    # Output results as json file
+    write_dict_to_json(table_dict, file_ns.sum_table_file)
+
+    print_time(tic, "Summary Table")
+    ''' ################# End Create Summary Table ################# '''
+
+
+
+    ''' #################### Create Match Table #################### '''
+    tic = time.perf_counter()
+
+    match_table = nuparse.build_match_table(Full_Dict, accession_list)
+    nuparse.write_match_table(
+            match_table, accession_list, file_ns.results_dir,
+            args.binary_match_table)
+
+    print_time(tic, "Match Table")
+    ''' ################## End Create Match Table ################## '''
+
+
+
+    big_toc = time.perf_counter()
+    elapsed_time = big_toc - big_tic
+    hours = int(elapsed_time / 3600)
+    minutes = int(elapsed_time / 60 - hours * 60)
+    seconds = elapsed_time - minutes * 60 - hours * 3600
+    print("\nFinished")
+    print(
+        "Total Elapsed Time: {} hours, {} minutes, {} seconds".format(
+            hours, minutes, seconds))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 20:41:09 2026
+
+Per-assay result partitions.
+
+    Each assay's results are cached in a partition keyed by a hash of its
+    oligo triple (forward primer, reverse primer, probe), so adding or
+    editing a line of assays.txt only recomputes that assay; renaming an
+    assay reuses its partition.  A partition cache is a directory of
+    <key><suffix> files (e.g. tntblast output, parsed hits, summary
+    tallies) plus partitions.json, which holds the source key the cache
+    was built for and the assay name each partition was created under.
+
+    The source key covers everything other than the assay that the
+    partitions depend on (sequence file, tntblast settings, ...).  Opening
+    a cache with a different source key clears it.
+"""
+import os
+import json
+from glob import glob
+from file_keys import hash_values, file_key
+
+
+''' 'Global' Variables '''
+partition_dirname = "assay_partitions"
+manifest_filename = "partitions.json"
+
+
+''' Methods '''
+
+def assay_key(oligos):
+    ''' Partition key of an assay: hash of its (upper case) oligos '''
+    return hash_values([ oligo.upper() for oligo in oligos ])
+
+
+def read_assays(assay_file):
+    ''' (name, partition key, line) of each assay in assays.txt '''
+    assays = []
+    with open(assay_file, 'r') as read_file:
+        for line in read_file:
+            fields = line.split()
+            if fields:
+                assays.append((fields[0], assay_key(fields[1:4]), line))
+    return assays
+
+
+class PartitionCache(object):
+    """ Directory of per-assay partitions.
+
+    :param cache_dir: The partition cache directory
+    :type cache_dir: str
+    :param source_key: Key of the inputs the partitions are built from;
+        None opens the cache as is
+    :type source_key: str
+    """
+
+    def __init__(self, cache_dir, source_key=None):
+        self.cache_dir = cache_dir
+        self.manifest_file = os.path.join(cache_dir, manifest_filename)
+        os.makedirs(cache_dir, exist_ok=True)
+
+        manifest = {}
+        if os.path.isfile(self.manifest_file):
+            with open(self.manifest_file, 'r') as read_file:
+                manifest = json.load(read_file)
+
+        if source_key is not None and \
+                manifest.get("source_key") != source_key:
+            if manifest:
+                print("Inputs changed; clearing", cache_dir)
+            for partition_file in glob(os.path.join(cache_dir, "*")):
+                os.remove(partition_file)
+            manifest = {"source_key": source_key, "names": {}}
+
+        self.source_key = manifest.get("source_key")
+        self.names = manifest.get("names", {})
+
+    def path(self, key, suffix):
+        return os.path.join(self.cache_dir, key + suffix)
+
+    def has(self, key, suffix):
+        return os.path.isfile(self.path(key, suffix))
+
+    def reset(self, key):
+        ''' Remove all files of a partition '''
+        for partition_file in glob(self.path(key, ".*")):
+            os.remove(partition_file)
+        self.names.pop(key, None)
+
+    def read_json(self, key, suffix):
+        with open(self.path(key, suffix), 'r') as read_file:
+            return json.load(read_file)
+
+    def write_json(self, key, suffix, data):
+        with open(self.path(key, suffix), 'w') as write_file:
+            json.dump(data, write_file)
+
+    def save(self):
+        manifest = {"source_key": self.source_key, "names": self.names}
+        with open(self.manifest_file, 'w') as write_file:
+            json.dump(manifest, write_file)
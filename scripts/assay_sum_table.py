@@ -5,8 +5,10 @@ Created on Thu Apr  9 14:36:54 2020
 
 @author: adanm
 """
+import numpy as np
 from datetime import datetime
 import multiprocessing as mp
+import results_store as rstore
 
 ''' 'Global' Variables '''
 # Dictionary Labels
@@ -18,6 +20,9 @@ Pr = "Probe"
 gp = "gaps"
 mm = "mismatches"
 
+# Partition file of True Positive tallies (see assay_partitions.py)
+tally_suffix = ".tallies.json"
+
 
 ''' Methods '''
 
@@ -36,34 +41,66 @@ def set_queues_for_table_gen(TP_list_generator, FN_list_generator, procnum):
     return pos_dict, neg_dict
 
 
-def generate_table_parallel(full_dict, procnum):
+def get_cached_tallies(full_dict, partition_cache, assay_keys):
+    ''' TP tallies of the assays with a cached partition, by name '''
+    cached_tallies = {}
+    if partition_cache is None:
+        return cached_tallies
+    for assay_dict in full_dict[assay]:
+        key = assay_keys.get(assay_dict[assay_name])
+        if key is not None and partition_cache.has(key, tally_suffix):
+            cached_tallies[assay_dict[assay_name]] = \
+                partition_cache.read_json(key, tally_suffix)
+    return cached_tallies
+
+
+def cache_tallies(pos_dict, partition_cache, assay_keys):
+    if partition_cache is None:
+        return
+    for asy_name, TP_tally in pos_dict.items():
+        key = assay_keys.get(asy_name)
+        if key is not None:
+            partition_cache.write_json(
+                key, tally_suffix, [ int(tally) for tally in TP_tally ])
+
+
+def generate_table_parallel(full_dict, procnum, partition_cache=None,
+                            assay_keys=None):
 
     print("\nCreating summary table from json source:")
 
+    # Reuse TP tallies of unchanged assay partitions
+    cached_tallies = get_cached_tallies(full_dict, partition_cache, assay_keys)
+
     # loop through all assays in assay results dict, making generator
     TP_list_generator = (  # of tuples with
         (assay_dict["Name"],  # Assay name
         assay_dict["True Positives"])  # list of True Positives
         for assay_dict in full_dict[assay]
+        if assay_dict["Name"] not in cached_tallies
     )
 
 
     # loop through all assays in assay results dict, making generator
     FN_list_generator = (  # of tuples containing
         (assay_dict["Name"],  # Assay name
-        assay_dict["False Negatives"])  # list of False Negatives
+        range(len(assay_dict["False Negatives"])))  # one per False Negative
         for assay_dict in full_dict[assay]
     )
 
     # Generate tallies of TPs and FNs from each assay in parallel
     pos_dict, neg_dict = set_queues_for_table_gen(
             TP_list_generator, FN_list_generator, procnum)
+    cache_tallies(pos_dict, partition_cache, assay_keys)
+    pos_dict.update(cached_tallies)
 
 
     # Populate list with summary data from each assay
     data_list = []
-    for asy_name,TP_tally in pos_dict.items():
-        stats_dict = calculate_recall(asy_name, TP_tally, neg_dict[asy_name])
+    for assay_dict in full_dict[assay]:
+        asy_name = assay_dict["Name"]
+        stats_dict = calculate_recall(
+                asy_name, pos_dict[asy_name], neg_dict[asy_name])
         data_list.append(stats_dict)
     
     # Add data to table dictionary
@@ -75,6 +112,72 @@ def generate_table_parallel(full_dict, procnum):
     return table_dict
 
 
+def positives_tallies_from_columns(columns, start, end):
+    ''' Mismatch tallies for a block of True Positive rows of a store '''
+    mismatches_fp = np.asarray(columns["fp_mismatches"][start:end])
+    mismatches_rp = np.asarray(columns["rp_mismatches"][start:end])
+    mismatches_pr = np.asarray(columns["pr_mismatches"][start:end])
+
+    # Missing primer values count as eliminated; missing probe counts as 0
+    valid = (mismatches_fp >= 0) & (mismatches_rp >= 0)
+    mismatches = np.maximum(
+        np.maximum(mismatches_fp, np.maximum(mismatches_pr, 0)),
+        mismatches_rp)[valid]
+
+    # counts[8] holds all hits with 8 or more mismatches
+    counts = np.bincount(np.minimum(mismatches, 8), minlength=9)
+    counts = [int(count) for count in counts]
+    pos_elims = int((~valid).sum())
+
+    return [counts[0], sum(counts[0:3]), counts[1], counts[2],
+            sum(counts[2:]), counts[3], sum(counts[3:]), counts[4],
+            counts[5], counts[6], counts[7], counts[8], counts[8],
+            0, pos_elims, 0]
+
+
+def negatives_tallies_from_count(FN_count):
+    ''' Tallies for a number of False Negatives '''
+    return [0, 0, 0, 0, 0, 0, FN_count, 0, 0, 0, 0, 0, FN_count,
+            FN_count, 0, 0]
+
+
+def generate_table_from_store(store_dir, partition_cache=None,
+                              assay_keys=None):
+
+    print("\nCreating summary table from results store:")
+
+    # Only the mismatch columns are read; hit records are never decoded
+    meta, columns = rstore.load_columns(store_dir)
+
+    # Populate list with summary data from each assay
+    data_list = []
+    for assay_num, asy_name in enumerate(meta["assays"]):
+        TP_start, TP_end = meta["rows"][rstore.positives_type][assay_num]
+
+        # Reuse TP tallies of unchanged assay partitions
+        key = assay_keys.get(asy_name) if assay_keys else None
+        if key is not None and partition_cache.has(key, tally_suffix):
+            TP_tally = partition_cache.read_json(key, tally_suffix)
+        else:
+            TP_tally = positives_tallies_from_columns(
+                    columns, TP_start, TP_end)
+            if key is not None:
+                partition_cache.write_json(
+                    key, tally_suffix, [ int(tally) for tally in TP_tally ])
+        FN_tally = negatives_tallies_from_count(
+                rstore.count_results(meta, rstore.negatives_type, assay_num))
+        stats_dict = calculate_recall(asy_name, TP_tally, FN_tally)
+        data_list.append(stats_dict)
+
+    # Add data to table dictionary
+    table_dict = { "data": data_list }
+
+    # Add timestamp
+    table_dict["Timestamp"] = str(datetime.now())
+
+    return table_dict
+
+
 def positives_stats(argument):
     this_assay, TP_list = argument
 
@@ -1,4 +1,5 @@
-import re
+import fasta_index as fidx
+import metadata_index as midx
 
 def get_vname_generator_from(sequence_file, iso_idx):
     if iso_idx == 0: # case gisaid
@@ -6,79 +7,35 @@ def get_vname_generator_from(sequence_file, iso_idx):
     else:            # case genbank
         start_idx = 0 # don't trim accession number
 
-    with open(sequence_file, 'r') as read_file:
-        gis_lines = read_file.readlines()
-
+    # Headers are streamed, from the fasta index if there is one
     return (
         line.strip().split("|")[iso_idx][start_idx:]
-        for line in gis_lines
-        if line[0] == ">"
+        for line in fidx.iter_fasta_headers(sequence_file)
     )
 
 
 def virus_acc_map_from(metafile):
-
-    # String methods needed by this method: #
-    def virus_name(metaline, idx):
-        metaline_fields = metaline.strip().split('\t')
-        return metaline_fields[idx]
-
-    def virus_name_spaceless(metaline, idx):
-        metaline_fields = metaline.strip().split('\t')
-        return re.sub(r"\s+", "", metaline_fields[idx])
-
-    def gisaid_accession(metaline, idx):
-        metaline_fields = metaline.strip().split('\t')
-        return metaline_fields[idx]
-
-    # Begin this method: #
-    with open(metafile, 'r') as read_meta:
-        # Read column header and get indices for V_name and accession
-        column_headers = read_meta.readline().strip().split('\t')
-        v_name_idx = column_headers.index("Virus name")
-        acc_idx = column_headers.index("Accession ID")
-
-        # Load remainder of file
-        meta_lines = read_meta.readlines()
-
-    # Generate virus_name: accession mapping
-    virus_acc_map = {
-        virus_name(metaline, v_name_idx): gisaid_accession(metaline, acc_idx)
-        for metaline in meta_lines
-    }
-    # Generate spaceless virus_name: accession mapping
-    spaceless_virus_acc_map = {
-        virus_name_spaceless(metaline, v_name_idx
-            ): gisaid_accession(metaline, acc_idx)
-        for metaline in meta_lines
-    }
-    # Join dicts
-    virus_acc_map.update(spaceless_virus_acc_map)
-   
-    return virus_acc_map
-
-
-def create_accession_list(vname_generator, vname_acc_map):
-    return [
-        vname_acc_map[vname]
-        for vname in vname_generator
-    ]
+    # Virus name (and spaceless virus name): accession mapping, from the
+    # metadata index (see metadata_index.py)
+    return midx.load_name_acc_map(metafile)
 
 
-def write_acc_list(accession_list, accession_file):
-    with open(accession_file, 'w') as write_file:
-        for accession in accession_list:
-            print(accession, file=write_file)
-
-
-def generate_accession_file(file_ns, iso_idx):
-    # Get list of virus names from gisaid file
+def iter_accessions(file_ns, iso_idx):
+    # Get virus names from gisaid file, one header at a time
     vname_generator = get_vname_generator_from(file_ns.sequence_file, iso_idx)
     if iso_idx == 0: # Do this only for gisaid metadata
         # Map virus names to accessions using metadata
         vname_acc_map = virus_acc_map_from(file_ns.metafile)
-        # Create accession list and write to file
-        accession_list = create_accession_list(vname_generator, vname_acc_map)
+        return (vname_acc_map[vname] for vname in vname_generator)
     else:
-        accession_list = list(vname_generator)
-    write_acc_list(accession_list, file_ns.accession_file)
\ No newline at end of file
+        return vname_generator
+
+
+def generate_accession_file(file_ns, iso_idx):
+    # Write accessions to file as they are read; returns their count
+    count = 0
+    with open(file_ns.accession_file, 'w') as write_file:
+        for accession in iter_accessions(file_ns, iso_idx):
+            print(accession, file=write_file)
+            count += 1
+    return count
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 21:17:36 2026
+
+Download manifest for NCBI records.
+
+    An SQLite table with one row per NCBI UID, holding the record's
+    accession.version, its update date and its fetch status ("pending"
+    or "fetched").  The esummary of a search is diffed against it, so
+    only records that are new, updated, not yet fetched or missing from
+    the download directory are efetched.  Batches are marked "fetched" as
+    they finish, so a rerun after a crash picks up with the remaining ones.
+"""
+import sqlite3
+import threading
+
+
+''' 'Global' Variables '''
+manifest_filename = "download_manifest.sqlite"
+pending_status = "pending"
+fetched_status = "fetched"
+
+
+''' Methods '''
+
+class DownloadManifest(object):
+    """ SQLite record of downloaded NCBI records; safe to share between
+    threads.
+
+    :param manifest_file: The SQLite database file
+    :type manifest_file: str
+    """
+
+    def __init__(self, manifest_file):
+        self.manifest_file = manifest_file
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(manifest_file,
+                                          check_same_thread=False)
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS records ("
+                "uid TEXT PRIMARY KEY, accession_version TEXT, "
+                "update_date TEXT, status TEXT)")
+
+    def find_updates(self, summaries, downloaded):
+        """ UIDs of the summaries that need to be (re)fetched
+
+        :param summaries: (uid, accession.version, update date) of each
+            record found by the search
+        :type summaries: list
+        :param downloaded: Accessions (without version) present in the
+            download directory or genome store
+        :type downloaded: set
+        """
+        with self.lock:
+            known = { uid: (accession_version, update_date, status)
+                      for uid, accession_version, update_date, status in
+                      self.connection.execute("SELECT * FROM records") }
+
+        update_list = []
+        for uid, accession_version, update_date in summaries:
+            accession = accession_version.split('.')[0]
+            if known.get(uid) != (accession_version, update_date,
+                                  fetched_status) \
+                    or accession not in downloaded:
+                update_list.append(uid)
+        return update_list
+
+    def record_pending(self, summaries):
+        """ Store the summaries as not yet fetched """
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?)",
+                [ (uid, accession_version, update_date, pending_status)
+                  for uid, accession_version, update_date in summaries ])
+
+    def mark_fetched(self, uid_list):
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "UPDATE records SET status = ? WHERE uid = ?",
+                [ (fetched_status, uid) for uid in uid_list ])
+
+    def close(self):
+        self.connection.close()
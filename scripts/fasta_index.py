@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 01:12:40 2026
+
+Record index of a combined fasta file.
+
+    <fasta>.idx.npy holds, for each record in fasta order, its accession
+    (field key_field of the "|" separated header), the byte offset of its
+    ">", the length of its header line and the length of its sequence.
+    <fasta>.idx.keys.npy holds the same accessions, sorted, with the row
+    of each in the index (the first, for an accession in several
+    records), for binary search.  Both are written when the fasta is
+    combined and read with mmap, as is the fasta, so headers and lengths
+    are looked up without reading any sequence.  An index older than its
+    fasta is not used.
+
+    Run as a script, prints the header lines of the fasta (building the
+    index if needed):
+        fasta_index.py <fasta>
+"""
+import os
+import sys
+import mmap
+import contextlib
+import numpy as np
+import argparse as ap
+
+
+''' 'Global' Variables '''
+index_suffix = ".idx.npy"
+keys_suffix = ".idx.keys.npy"
+key_field = 1
+
+
+''' Methods '''
+
+def get_index_path(fasta_file):
+    return fasta_file + index_suffix
+
+
+def get_keys_path(fasta_file):
+    return fasta_file + keys_suffix
+
+
+def has_index(fasta_file):
+    fasta_mtime = os.path.getmtime(fasta_file)
+    return all(os.path.isfile(index_file) and
+               os.path.getmtime(index_file) >= fasta_mtime
+               for index_file in (get_keys_path(fasta_file),
+                                  get_index_path(fasta_file)))
+
+
+def get_accession(header):
+    ''' Accession of a header line '''
+    fields = header.strip().lstrip(">").split("|")
+    return fields[key_field] if len(fields) > key_field else fields[0]
+
+
+def iter_record_spans(fasta_mm):
+    ''' (record start, header end, record end) of each record of a
+        memory-mapped fasta, found without reading sequence lines '''
+    file_size = len(fasta_mm)
+    start = fasta_mm.find(b"\n>")
+    if fasta_mm[:1] == b">":
+        start = 0
+    elif start != -1:
+        start += 1
+
+    while start != -1:
+        next_record = fasta_mm.find(b"\n>", start)
+        end = file_size if next_record == -1 else next_record + 1
+        header_end = fasta_mm.find(b"\n", start, end)
+        if header_end == -1:
+            header_end = end
+        yield start, header_end, end
+        start = -1 if next_record == -1 else end
+
+
+def iter_fasta_headers(fasta_file):
+    ''' Header lines (with the leading ">") of a fasta, in order, from
+        its index if it has one, else from a scan of the mapped file '''
+    if has_index(fasta_file):
+        fasta_index = FastaIndex(fasta_file)
+        try:
+            yield from fasta_index.iter_headers()
+        finally:
+            fasta_index.close()
+        return
+
+    if not os.path.getsize(fasta_file):
+        return
+    with open(fasta_file, 'rb') as read_file, \
+            mmap.mmap(read_file.fileno(), 0,
+                      access=mmap.ACCESS_READ) as fasta_mm:
+        for start, header_end, end in iter_record_spans(fasta_mm):
+            yield fasta_mm[start:header_end].decode()
+
+
+def build_fasta_index(fasta_file):
+    ''' Scan fasta_file once and write its record index '''
+    accessions = []
+    offsets = []
+    header_lengths = []
+    sequence_lengths = []
+
+    if os.path.getsize(fasta_file):
+        with open(fasta_file, 'rb') as read_file, \
+                mmap.mmap(read_file.fileno(), 0,
+                          access=mmap.ACCESS_READ) as fasta_mm:
+            for start, header_end, end in iter_record_spans(fasta_mm):
+                header = fasta_mm[start:header_end].decode()
+                body = fasta_mm[header_end:end]
+
+                accessions.append(get_accession(header).encode())
+                offsets.append(start)
+                header_lengths.append(header_end - start)
+                sequence_lengths.append(len(body) - body.count(b"\n")
+                                        - body.count(b"\r"))
+
+    key_width = max([ len(accession) for accession in accessions ] + [1])
+    records = np.zeros(len(accessions), dtype=[
+        ("accession", "S{}".format(key_width)), ("offset", "<u8"),
+        ("header_length", "<u4"), ("sequence_length", "<u8")])
+    records["accession"] = accessions
+    records["offset"] = offsets
+    records["header_length"] = header_lengths
+    records["sequence_length"] = sequence_lengths
+
+    # Stable, so the first row of a repeated accession sorts first
+    sorted_rows = np.argsort(records["accession"], kind="stable")
+    keys = np.zeros(len(records), dtype=[
+        ("accession", records.dtype["accession"]), ("row", "<u8")])
+    keys["accession"] = records["accession"][sorted_rows]
+    keys["row"] = sorted_rows
+
+    # The record index last; has_index needs both
+    for index_file, array in ((get_keys_path(fasta_file), keys),
+                              (get_index_path(fasta_file), records)):
+        with open(index_file + ".tmp", 'wb') as write_file:
+            np.save(write_file, array)
+        os.replace(index_file + ".tmp", index_file)
+    print("Indexed {} records of {}".format(len(records), fasta_file))
+
+
+class FastaIndex(object):
+    """ Header and length lookups on an indexed fasta file.
+
+    :param fasta_file: The fasta file; its index must exist
+    :type fasta_file: str
+    """
+
+    def __init__(self, fasta_file):
+        self.fasta_file = fasta_file
+        self.records = np.load(get_index_path(fasta_file), mmap_mode='r')
+        self.keys = np.load(get_keys_path(fasta_file), mmap_mode='r')
+        self.read_file = open(fasta_file, 'rb')
+        self.fasta_mm = None
+        if os.path.getsize(fasta_file):
+            self.fasta_mm = mmap.mmap(self.read_file.fileno(), 0,
+                                      access=mmap.ACCESS_READ)
+
+    def __len__(self):
+        return len(self.records)
+
+    def _row(self, accession):
+        ''' Index row of accession, by binary search of the sorted keys '''
+        key = accession.encode()
+        sorted_keys = self.keys["accession"]
+        if len(key) <= sorted_keys.dtype.itemsize:
+            position = int(np.searchsorted(sorted_keys, key))
+            if position < len(sorted_keys) and sorted_keys[position] == key:
+                return int(self.keys["row"][position])
+        raise KeyError(accession)
+
+    def __contains__(self, accession):
+        try:
+            self._row(accession)
+        except KeyError:
+            return False
+        return True
+
+    def accessions(self):
+        ''' Accessions, in fasta order '''
+        return [ key.decode() for key in self.records["accession"] ]
+
+    def header_at(self, row):
+        ''' Header line (with the leading ">") of the row-th record '''
+        offset = int(self.records["offset"][row])
+        header_length = int(self.records["header_length"][row])
+        return self.fasta_mm[offset:offset + header_length].decode()
+
+    def get_header(self, accession):
+        return self.header_at(self._row(accession))
+
+    def get_length(self, accession):
+        return int(self.records["sequence_length"][self._row(accession)])
+
+    def iter_headers(self):
+        ''' Header lines, in fasta order '''
+        for row in range(len(self.records)):
+            yield self.header_at(row)
+
+    def close(self):
+        if self.fasta_mm is not None:
+            self.fasta_mm.close()
+            self.fasta_mm = None
+        self.read_file.close()
+        self.records = None
+        self.keys = None
+
+
+def get_arguments():
+    parser = ap.ArgumentParser(prog=sys.argv[0].split('/')[-1])
+    parser.add_argument('fasta_file', metavar='[FASTA]', type=str,
+                        help="Fasta file to print the headers of")
+    return parser.parse_args()
+
+
+def main():
+    args = get_arguments()
+    if not has_index(args.fasta_file):
+        # Keep stdout to the headers
+        with contextlib.redirect_stdout(sys.stderr):
+            build_fasta_index(args.fasta_file)
+
+    fasta_index = FastaIndex(args.fasta_file)
+    for header in fasta_index.iter_headers():
+        print(header)
+    fasta_index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 03:10:52 2026
+
+Hash keys of values and files, for caches that are rebuilt when their
+    inputs change.  A file's key covers its path, size and modification
+    time, so a file is not read to be keyed.
+"""
+import os
+import hashlib
+
+
+''' 'Global' Variables '''
+hash_digest_size = 16
+
+
+''' Methods '''
+
+def hash_values(values):
+    key_hash = hashlib.blake2b(digest_size=hash_digest_size)
+    for value in values:
+        key_hash.update(str(value).encode() + b"\n")
+    return key_hash.hexdigest()
+
+
+def file_key(*file_paths):
+    ''' Source key part for files: path, size and modification time '''
+    values = []
+    for file_path in file_paths:
+        if os.path.isfile(file_path):
+            file_stat = os.stat(file_path)
+            values += [os.path.abspath(file_path), file_stat.st_size,
+                       file_stat.st_mtime_ns]
+        else:
+            values += [os.path.abspath(file_path), None, None]
+    return hash_values(values)
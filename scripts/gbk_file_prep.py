@@ -7,12 +7,42 @@ Created on Tue Mar 30 17:22:40 2021
 """
 import re
 import os
+import shutil
 import db_stats
+import fasta_index as fidx
+import genome_store as gstore
 import seq_db_filter_funx as filt_db
 
 
+''' 'Global' Variables '''
+copy_buffer_size = 1 << 20
+
+
 ''' Methods '''
 
+def append_file(read_handle, write_handle):
+    ''' Append a whole file in bulk (os.sendfile where the platform has
+        it), ending it with a newline if it lacks one '''
+    in_fd = read_handle.fileno()
+    out_fd = write_handle.fileno()
+    file_size = os.fstat(in_fd).st_size
+    if file_size == 0:
+        return
+
+    if hasattr(os, "sendfile"):
+        offset = 0
+        while offset < file_size:
+            sent = os.sendfile(out_fd, in_fd, offset, file_size - offset)
+            if sent == 0:
+                break
+            offset += sent
+    else:
+        shutil.copyfileobj(read_handle, write_handle, copy_buffer_size)
+
+    if os.pread(in_fd, 1, file_size - 1) != b"\n":
+        write_handle.write(b"\n")
+
+
 def generate_fna_lists(fasta_dir):
 
     ''' Get list of all genbank files '''
@@ -23,7 +53,7 @@ def generate_fna_lists(fasta_dir):
     return indiv_file_list
 
 
-def prep_gbk(filenames_ns, minimum_file_length_considered):
+def prep_gbk(filenames_ns, minimum_file_length_considered, procnum=1):
     
     fasta_dir = filenames_ns.fasta_dir
     combined_fasta = filenames_ns.combined_fasta
@@ -32,6 +62,10 @@ def prep_gbk(filenames_ns, minimum_file_length_considered):
     accession_list_file = filenames_ns.accession_list_file
     
     
+    if gstore.has_store(fasta_dir):
+        prep_gbk_from_store(filenames_ns, minimum_file_length_considered)
+        return
+
     ''' ####################### Generate Databases ######################### '''
 
     genbank_file_list = generate_fna_lists(fasta_dir)
@@ -40,21 +74,23 @@ def prep_gbk(filenames_ns, minimum_file_length_considered):
 
     print("Filtering GenBank...")
     file_list, genbank_tallies, total_list_len = filt_db.filter_len_et_orgs(
-        genbank_file_list, minimum_file_length_considered)
+        genbank_file_list, minimum_file_length_considered, procnum)
 
     ''' ##################### Combine Sequence Files ####################### '''
 
     ''' Combine fna sequence files into single fasta file '''
+    # fna files are copied whole, in file_list (accession list) order;
+    # unbuffered, so bulk copies and newline writes stay in order
     print("Combining target fna files from database into one fasta...")
     accession_list = []
-    with open(combined_fasta, 'w') as write_combine:
+    with open(combined_fasta, 'wb', buffering=0) as write_combine:
         for fna_file in file_list:
             accession = fna_file.split('/')[-1].split('.')[0]
 
-            with open(fna_file, 'r') as read_fna:
-                for line in read_fna.readlines():
-                    print(line.strip(), file=write_combine)
+            with open(fna_file, 'rb') as read_fna:
+                append_file(read_fna, write_combine)
             accession_list.append(accession)
+    fidx.build_fasta_index(combined_fasta)
             
     ''' ##################### Output Accession List ######################## '''
     with open(accession_list_file, 'w') as write_file:
@@ -70,3 +106,37 @@ def prep_gbk(filenames_ns, minimum_file_length_considered):
     return
 
 
+def prep_gbk_from_store(filenames_ns, minimum_file_length_considered):
+    ''' prep_gbk for genomes downloaded into a genome store '''
+
+    genome_store = gstore.GenomeStore(
+        gstore.get_store_dir(filenames_ns.fasta_dir))
+
+    ''' ######################## Filter Databases ########################## '''
+
+    print("Filtering GenBank...")
+    accession_list, genbank_tallies, total_list_len = \
+        filt_db.filter_store_len_et_orgs(genome_store,
+                                         minimum_file_length_considered)
+
+    ''' ##################### Combine Sequence Files ####################### '''
+
+    print("Combining target genomes from genome store into one fasta...")
+    with open(filenames_ns.combined_fasta, 'w',
+              buffering=copy_buffer_size) as write_combine:
+        for accession, header, sequence in \
+                genome_store.iter_records(accession_list):
+            write_combine.write(header + "\n" + sequence + "\n")
+    genome_store.close()
+    fidx.build_fasta_index(filenames_ns.combined_fasta)
+
+    ''' ##################### Output Accession List ######################## '''
+    with open(filenames_ns.accession_list_file, 'w') as write_file:
+        for line in accession_list:
+            print(line, file=write_file)
+
+    ''' ##################### Output DB Stats Files ######################## '''
+    db_stats.generate_db_stats(genbank_tallies, total_list_len,
+        filenames_ns.db_stats_file, filenames_ns.db_totals_file)
+
+    return
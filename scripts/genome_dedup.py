@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 23:12:19 2026
+
+Sequence level deduplication of the combined fasta.
+
+    Many genomes are byte-identical under different accessions.  Only the
+    first genome of each distinct sequence (the representative) is sent
+    to tntblast; the others (its members) get copies of the
+    representative's hits when the tnt output is parsed, so results are
+    as if every genome had been evaluated.  Sequences are compared by a
+    hash of the sequence with line breaks and case removed.
+
+    The members map is a JSON file next to the tnt results file:
+        {<representative header>: [<member header>, ...], ...}
+    with headers as tntblast reports them (">" and whitespace stripped).
+    Representatives without members are not listed.
+"""
+import os
+import json
+import filecmp
+import hashlib
+
+
+''' 'Global' Variables '''
+members_suffix = "_members.json"
+dedup_suffix = "_dedup.fasta"
+hash_digest_size = 16
+
+
+''' Methods '''
+
+def get_members_path(tnt_results_path):
+    return tnt_results_path.rsplit(".", 1)[0] + members_suffix
+
+
+def get_dedup_path(tnt_dir, fasta_file):
+    fasta_prefix = os.path.basename(fasta_file).split(".")[0]
+    return os.path.join(tnt_dir, fasta_prefix + dedup_suffix)
+
+
+def load_members(members_file):
+    if not os.path.isfile(members_file):
+        return {}
+    with open(members_file, 'r') as read_file:
+        return json.load(read_file)
+
+
+def replace_if_changed(new_file, old_file):
+    ''' Move new_file to old_file unless their contents are equal; an
+        unchanged file keeps its modification time (and cache keys) '''
+    if os.path.isfile(old_file) and filecmp.cmp(new_file, old_file, False):
+        os.remove(new_file)
+    else:
+        os.replace(new_file, old_file)
+
+
+def iter_fasta_records(read_file):
+    ''' (header line, record lines) of each record of a binary fasta '''
+    header = None
+    lines = []
+    for line in read_file:
+        if line.startswith(b">"):
+            if header is not None:
+                yield header, lines
+            header = line
+            lines = []
+        elif header is not None:
+            lines.append(line)
+    if header is not None:
+        yield header, lines
+
+
+def dedup_fasta(fasta_file, dedup_file, members_file):
+    """ Write the representative of each distinct sequence to dedup_file,
+    in fasta order, and the members map to members_file
+
+    :param fasta_file: The combined fasta
+    :type fasta_file: str
+    """
+    representatives = {}
+    members = {}
+    num_genomes = 0
+    with open(fasta_file, 'rb') as read_file, \
+            open(dedup_file + ".tmp", 'wb') as write_file:
+        for header, lines in iter_fasta_records(read_file):
+            num_genomes += 1
+            seq_hash = hashlib.blake2b(digest_size=hash_digest_size)
+            for line in lines:
+                seq_hash.update(line.strip().upper())
+            seq_hash = seq_hash.digest()
+
+            header_text = header[1:].decode().strip()
+            representative = representatives.get(seq_hash)
+            if representative is None:
+                representatives[seq_hash] = header_text
+                write_file.write(header)
+                write_file.writelines(lines)
+            else:
+                members.setdefault(representative, []).append(header_text)
+
+    with open(members_file + ".tmp", 'w') as write_file:
+        json.dump(members, write_file)
+
+    replace_if_changed(dedup_file + ".tmp", dedup_file)
+    replace_if_changed(members_file + ".tmp", members_file)
+    print("{} distinct sequences in {} genomes; wrote {}".format(
+        len(representatives), num_genomes, dedup_file))
+
+    return members
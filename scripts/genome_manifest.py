@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 19:02:44 2026
+
+Genome manifest for incremental assay evaluation.
+
+    The manifest records, for the last evaluated run, the hash of the
+    assay set and tntblast settings and a hash of the sequence of every
+    genome (by accession).
+    Comparing the current sequence file against it gives the genomes
+    that are new or changed; only these need to go through tntblast.
+    Their hits are then merged with the cached True Positives of the
+    unchanged genomes.  A changed assay set, or a changed tntblast
+    setting (variable_config.py), invalidates the whole cache.
+
+    The manifest is a JSON file:
+        {"assay_hash": <hex>, "Timestamp": <str>,
+         "genomes": {<accession>: <sequence hash hex>, ...}}
+"""
+import os
+import json
+import hashlib
+from datetime import datetime
+
+
+''' 'Global' Variables '''
+# Dictionary Labels
+assay = "Assay"
+assay_name = "Name"
+positives_type = "True Positives"
+negatives_type = "False Negatives"
+
+# Manifest
+manifest_filename = "genome_manifest.json"
+hash_digest_size = 16
+
+
+''' Methods '''
+
+def hash_assay_file(assay_file, tnt_settings=()):
+    ''' Hash of the assay set and the tntblast settings it is run with;
+        independent of line order and spacing of the assay file '''
+    assay_lines = []
+    with open(assay_file, 'r') as read_file:
+        for line in read_file:
+            fields = line.split()
+            if fields:
+                assay_lines.append(" ".join(fields))
+
+    assay_hash = hashlib.blake2b(digest_size=hash_digest_size)
+    for line in sorted(assay_lines):
+        assay_hash.update(line.encode() + b"\n")
+    assay_hash.update(json.dumps(list(tnt_settings)).encode())
+    return assay_hash.hexdigest()
+
+
+def hash_fasta_records(fasta_file):
+    ''' Sequence hash of each fasta record, in file order '''
+    seq_hashes = []
+    seq_hash = None
+    with open(fasta_file, 'rb') as read_file:
+        for line in read_file:
+            if line.startswith(b">"):
+                if seq_hash is not None:
+                    seq_hashes.append(seq_hash.hexdigest())
+                seq_hash = hashlib.blake2b(digest_size=hash_digest_size)
+            elif seq_hash is not None:
+                # Line wrapping does not change the hash
+                seq_hash.update(line.strip())
+    if seq_hash is not None:
+        seq_hashes.append(seq_hash.hexdigest())
+    return seq_hashes
+
+
+def load_manifest(manifest_file):
+    if not os.path.isfile(manifest_file):
+        return None
+    with open(manifest_file, 'r') as read_file:
+        return json.load(read_file)
+
+
+def write_manifest(manifest_file, assay_hash, accession_list, seq_hashes):
+    manifest = {
+        "assay_hash": assay_hash,
+        "Timestamp": str(datetime.now()),
+        "genomes": dict(zip(accession_list, seq_hashes)),
+    }
+    with open(manifest_file, 'w') as write_file:
+        json.dump(manifest, write_file)
+    print("Wrote file:", manifest_file)
+
+
+def find_changed_genomes(manifest, accession_list, seq_hashes):
+    ''' Record positions of new or changed genomes, and the accessions
+        whose cached hits are stale (changed or no longer present) '''
+    cached_hashes = manifest["genomes"]
+
+    delta_positions = []
+    stale_accessions = set()
+    for position, (accession, seq_hash) in enumerate(
+            zip(accession_list, seq_hashes)):
+        cached_hash = cached_hashes.get(accession)
+        if cached_hash != seq_hash:
+            delta_positions.append(position)
+            if cached_hash is not None:
+                stale_accessions.add(accession)
+
+    stale_accessions.update(set(cached_hashes) - set(accession_list))
+
+    return delta_positions, stale_accessions
+
+
+def write_delta_fasta(fasta_file, delta_file, delta_positions):
+    ''' Write the fasta records at the given positions to delta_file '''
+    delta_positions = set(delta_positions)
+    position = -1
+    keep = False
+    with open(fasta_file, 'rb') as read_file, \
+            open(delta_file, 'wb') as write_file:
+        for line in read_file:
+            if line.startswith(b">"):
+                position += 1
+                keep = position in delta_positions
+            if keep:
+                write_file.write(line)
+    print("Wrote {} genomes to {}".format(len(delta_positions), delta_file))
+
+
+def merge_parsed_results(cached_dict, delta_dict, stale_accessions,
+                         assay_order):
+    ''' Cached True Positives of unchanged genomes plus the new hits, per
+        assay, with assays in assays file order '''
+    assay_dicts = {}
+    for assay_dict in cached_dict[assay]:
+        name = assay_dict[assay_name]
+        kept_hits = [ hit for hit in assay_dict[positives_type]
+                      if hit["Accession"] not in stale_accessions ]
+        assay_dicts[name] = {
+            assay_name: name, positives_type: kept_hits, negatives_type: []}
+
+    for assay_dict in delta_dict[assay]:
+        name = assay_dict[assay_name]
+        merged_dict = assay_dicts.setdefault(name, {
+            assay_name: name, positives_type: [], negatives_type: []})
+        merged_dict[positives_type].extend(assay_dict[positives_type])
+
+    order = { name: i for i, name in enumerate(assay_order) }
+    names = sorted(assay_dicts, key=lambda name: order.get(name, len(order)))
+
+    # As in a full parse, assays without any hits are not listed
+    return {
+        assay: [ assay_dicts[name] for name in names
+                 if assay_dicts[name][positives_type] ],
+        "Timestamp": str(datetime.now()),
+    }
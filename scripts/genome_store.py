@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 22:05:48 2026
+
+Sharded, block gzipped (BGZF) genome store.
+
+    Instead of one <accession>.fna file per genome, downloaded genomes
+    are appended to the store in shards (e.g. one per efetch batch).
+    Each shard is a BGZF compressed fasta file with single line
+    sequences, plus
+        <shard>.fai     samtools faidx index: accession, sequence length,
+                        sequence offset, line bases, line width
+        <shard>.gzi     BGZF block index (compressed and uncompressed
+                        offset of every block but the first)
+    so any genome can be read without decompressing the whole shard.
+    Only the max_open_readers most recently read shards are kept open.
+    The header of a record starts where the previous record ends, so the
+    .fai also gives the header offsets.
+
+    A shard is written to a temporary file, renamed once complete, and
+    the .fai is written last; a shard without it (e.g. from an
+    interrupted run) is ignored.  An accession in several shards
+    (a re-downloaded genome) is read from the newest one.
+"""
+import os
+import struct
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+from glob import glob
+from Bio import bgzf
+
+
+''' 'Global' Variables '''
+store_dirname = "genome_store"
+shard_prefix = "shard_"
+shard_suffix = ".fna.gz"
+# Shard readers kept open at once (least recently used are closed)
+max_open_readers = 32
+
+
+''' Methods '''
+
+def get_store_dir(fasta_dir):
+    return os.path.join(fasta_dir, store_dirname)
+
+
+def has_store(fasta_dir):
+    return bool(glob(os.path.join(get_store_dir(fasta_dir),
+                                  "*" + shard_suffix + ".fai")))
+
+
+def shard_number(shard_file):
+    return int(os.path.basename(shard_file)[len(shard_prefix):-len(shard_suffix)])
+
+
+def write_gzi(shard_file, gzi_file):
+    ''' BGZF block index of shard_file, as written by bgzip -i '''
+    with open(shard_file, 'rb') as read_file:
+        blocks = [ (start, data_start) for start, raw_len, data_start, data_len
+                   in bgzf.BgzfBlocks(read_file) if data_len ][1:]
+    with open(gzi_file, 'wb') as write_file:
+        write_file.write(struct.pack("<Q", len(blocks)))
+        for start, data_start in blocks:
+            write_file.write(struct.pack("<QQ", start, data_start))
+
+
+def read_gzi(gzi_file):
+    ''' (uncompressed block starts, compressed block starts) '''
+    with open(gzi_file, 'rb') as read_file:
+        count = struct.unpack("<Q", read_file.read(8))[0]
+        entries = struct.unpack("<{}Q".format(2 * count),
+                                read_file.read(16 * count))
+    return [0] + list(entries[1::2]), [0] + list(entries[0::2])
+
+
+def write_shard(shard_file, records):
+    """ Write records to a shard with its .gzi and .fai; returns the
+    index entries of GenomeStore.  Records are written as they come, to
+    a temporary file renamed to shard_file once all are written; if
+    records raises (e.g. a download cut off), or yields none, no shard
+    is left behind.
+
+    :param records: (accession, header line, sequence) of each genome
+    :type records: iterable
+    """
+    shard = shard_number(shard_file)
+    temp_file = shard_file + ".tmp"
+    fai_lines = []
+    entries = []
+    offset = 0
+    try:
+        with bgzf.BgzfWriter(temp_file, 'wb') as write_file:
+            for accession, header, sequence in records:
+                header = header.encode()
+                sequence = sequence.encode()
+                seq_offset = offset + len(header) + 1
+                write_file.write(header + b"\n" + sequence + b"\n")
+                fai_lines.append("{}\t{}\t{}\t{}\t{}\n".format(
+                    accession, len(sequence), seq_offset, len(sequence),
+                    len(sequence) + 1))
+                entries.append((accession, (shard, offset, seq_offset,
+                                            len(sequence))))
+                offset = seq_offset + len(sequence) + 1
+    except BaseException:
+        if os.path.isfile(temp_file):
+            os.remove(temp_file)
+        raise
+
+    if not entries:
+        os.remove(temp_file)
+        return entries
+
+    os.replace(temp_file, shard_file)
+    write_gzi(shard_file, shard_file + ".gzi")
+    with open(shard_file + ".fai.tmp", 'w') as write_file:
+        write_file.writelines(fai_lines)
+    os.replace(shard_file + ".fai.tmp", shard_file + ".fai")
+
+    return entries
+
+
+class GenomeStore(object):
+    """ Sharded BGZF genome store with random access by accession.
+
+    :param store_dir: The store directory (created if missing)
+    :type store_dir: str
+    """
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        os.makedirs(store_dir, exist_ok=True)
+        self.lock = threading.Lock()
+        self.index = {}
+        # shard -> (BgzfReader, block index), least recently used first
+        self.readers = OrderedDict()
+
+        shard_files = sorted(glob(os.path.join(store_dir, "*" + shard_suffix)),
+                             key=shard_number)
+        self.next_shard = shard_number(shard_files[-1]) + 1 if shard_files else 0
+        for shard_file in shard_files:
+            if os.path.isfile(shard_file + ".fai"):
+                self._load_fai(shard_number(shard_file), shard_file + ".fai")
+
+    def _load_fai(self, shard, fai_file):
+        header_offset = 0
+        with open(fai_file, 'r') as read_file:
+            for line in read_file:
+                accession, length, seq_offset, line_bases, line_width = \
+                    line.split('\t')
+                length = int(length)
+                seq_offset = int(seq_offset)
+                self.index[accession] = (shard, header_offset, seq_offset,
+                                         length)
+                header_offset = seq_offset + length + 1
+
+    def shard_path(self, shard):
+        return os.path.join(self.store_dir, "{}{:06d}{}".format(
+            shard_prefix, shard, shard_suffix))
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, accession):
+        return accession in self.index
+
+    def accessions(self):
+        ''' All accessions, in the order of the sorted .fna file names they
+            replace '''
+        return sorted(self.index, key=lambda accession: accession + ".fna")
+
+    def reserve_shards(self, count):
+        ''' First of count new shard numbers, for shards written with
+            write_shard (e.g. by other processes) '''
+        with self.lock:
+            shard = self.next_shard
+            self.next_shard += count
+        return shard
+
+    def add_entries(self, entries):
+        ''' Index the entries write_shard returned '''
+        with self.lock:
+            self.index.update(entries)
+
+    def add_shard(self, records):
+        """ Write records to a new shard; returns their accessions
+
+        :param records: (accession, header line, sequence) of each genome
+        :type records: iterable
+        """
+        shard_file = self.shard_path(self.reserve_shards(1))
+        entries = write_shard(shard_file, records)
+        self.add_entries(entries)
+        return [ accession for accession, entry in entries ]
+
+    def _get_reader(self, shard):
+        if shard in self.readers:
+            self.readers.move_to_end(shard)
+            return self.readers[shard]
+        if len(self.readers) >= max_open_readers:
+            old_shard, (old_reader, _) = self.readers.popitem(last=False)
+            old_reader.close()
+        shard_file = self.shard_path(shard)
+        self.readers[shard] = (bgzf.BgzfReader(shard_file, 'rb'),
+                               read_gzi(shard_file + ".gzi"))
+        return self.readers[shard]
+
+    def _read(self, shard, offset, size):
+        reader, (data_starts, starts) = self._get_reader(shard)
+        block = bisect_right(data_starts, offset) - 1
+        reader.seek(bgzf.make_virtual_offset(starts[block],
+                                             offset - data_starts[block]))
+        return reader.read(size)
+
+    def get_length(self, accession):
+        return self.index[accession][3]
+
+    def get_header(self, accession):
+        ''' Header line (with the leading ">") of a genome '''
+        shard, header_offset, seq_offset, length = self.index[accession]
+        return self._read(shard, header_offset,
+                          seq_offset - header_offset - 1).decode()
+
+    def get_sequence(self, accession):
+        shard, header_offset, seq_offset, length = self.index[accession]
+        return self._read(shard, seq_offset, length).decode()
+
+    def iter_records(self, accession_list=None):
+        ''' (accession, header line, sequence) of each genome '''
+        if accession_list is None:
+            accession_list = self.accessions()
+        for accession in accession_list:
+            shard, header_offset, seq_offset, length = self.index[accession]
+            record = self._read(shard, header_offset,
+                                seq_offset - header_offset + length).decode()
+            header, sequence = record.split("\n", 1)
+            yield accession, header, sequence
+
+    def close(self):
+        for reader, _ in self.readers.values():
+            reader.close()
+        self.readers = OrderedDict()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 02:03:27 2026
+
+Virus name to accession index of a GISAID metadata.tsv.
+
+    Only the "Virus name" and "Accession ID" columns are parsed, once,
+    with pandas.  Each accession is keyed by the virus name and by the
+    virus name without whitespace (as the isolate appears in fasta
+    headers); a spaceless name shared with an exact name maps to the
+    accession of the spaceless one.  The map is pickled next to the
+    metafile as <metafile>.name_acc.pkl with the metafile's path, size
+    and modification time, and reused until the metafile changes.
+"""
+import os
+import csv
+import pickle
+import pandas as pd
+import file_keys as fkeys
+
+
+''' 'Global' Variables '''
+index_suffix = ".name_acc.pkl"
+name_column = "Virus name"
+accession_column = "Accession ID"
+
+
+''' Methods '''
+
+def get_index_path(metafile):
+    return metafile + index_suffix
+
+
+def read_name_acc_map(metafile):
+    ''' {virus name: accession} of metafile, with spaceless names '''
+    meta_df = pd.read_csv(metafile, sep="\t",
+                          usecols=[name_column, accession_column],
+                          dtype=str, keep_default_na=False,
+                          quoting=csv.QUOTE_NONE)
+    names = meta_df[name_column]
+    accessions = meta_df[accession_column].tolist()
+
+    name_acc_map = dict(zip(names.tolist(), accessions))
+    name_acc_map.update(zip(
+        names.str.replace(r"\s+", "", regex=True).tolist(), accessions))
+    return name_acc_map
+
+
+def load_name_acc_map(metafile):
+    """ {virus name: accession} of metafile, from its index if it is
+    current, else parsed and saved to the index
+
+    :param metafile: The GISAID metadata.tsv
+    :type metafile: str
+    """
+    index_file = get_index_path(metafile)
+    source_key = fkeys.file_key(metafile)
+
+    if os.path.isfile(index_file):
+        with open(index_file, 'rb') as read_file:
+            index_key, name_acc_map = pickle.load(read_file)
+        if index_key == source_key:
+            return name_acc_map
+
+    name_acc_map = read_name_acc_map(metafile)
+    with open(index_file + ".tmp", 'wb') as write_file:
+        pickle.dump((source_key, name_acc_map), write_file,
+                    protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(index_file + ".tmp", index_file)
+    print("Wrote metadata index:", index_file)
+
+    return name_acc_map
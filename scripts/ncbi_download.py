@@ -6,7 +6,12 @@ Created on Sat Apr 25 13:42:33 2020
 @author: adanm
 """
 import os
+import time
 import requests
+import threading
+from multiprocessing.pool import ThreadPool
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import HTTPError as StreamError
 import xml.etree.ElementTree as ET
 
 
@@ -25,13 +30,111 @@ return_mode = 'xml'
 
 max_returned_recs = 99999
 split_size = 200
+history_page_size = 500
+summary_batch_size = 500
 date_type = 'pdat'
 
+# Request rate limits (requests per second) allowed by NCBI
+requests_per_second = 3
+api_key_requests_per_second = 10
+
+# Retries of failed requests, with exponential backoff (seconds)
+max_retries = 5
+backoff_seconds = 1.0
+request_timeout = 300
+retry_status_codes = (429, 500, 502, 503, 504)
+
 
 
 ''' Methods '''
 
-def run_esearch(query, search_results_file, email, tool, min_date, max_date):
+class TokenBucket(object):
+    """ Thread-safe token bucket limiting the rate of requests.
+
+    :param rate: Requests allowed per second
+    :type rate: float
+    :param capacity: Requests allowed in a burst
+    :type capacity: int
+    """
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.last_time = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        ''' Block until a request may be sent '''
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity,
+                    self.tokens + (now - self.last_time) * self.rate)
+                self.last_time = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait_time = (1 - self.tokens) / self.rate
+            time.sleep(wait_time)
+
+
+def make_rate_limiter(api_key=None):
+    if api_key:
+        return TokenBucket(api_key_requests_per_second)
+    return TokenBucket(requests_per_second)
+
+
+def make_session(pool_size=api_key_requests_per_second):
+    ''' Keep-alive HTTP session shared by all requests (and threads) '''
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def get_with_retries(url, session=None, limiter=None, stream=False):
+    ''' GET url within the rate limit, retrying failures with backoff;
+        with stream=True the body is left unread on the response '''
+    if session is None:
+        session = requests
+    for attempt in range(max_retries + 1):
+        if limiter is not None:
+            limiter.acquire()
+        try:
+            response = session.get(url, timeout=request_timeout,
+                                   stream=stream)
+            if response.status_code not in retry_status_codes:
+                response.raise_for_status()
+                return response
+            response.close()
+            error = "HTTP {}".format(response.status_code)
+        except requests.ConnectionError as exception:
+            error = exception
+        except requests.Timeout as exception:
+            error = exception
+
+        if attempt == max_retries:
+            break
+        wait_time = backoff_seconds * 2 ** attempt
+        print("Request failed ({}); retrying in {} seconds...".format(
+            error, wait_time))
+        time.sleep(wait_time)
+
+    raise requests.RequestException(
+        "Request failed after {} retries ({}): {}".format(
+            max_retries, error, url))
+
+
+def add_api_key(url, api_key):
+    if api_key:
+        url = url + "&api_key={}".format(api_key)
+    return url
+
+
+def run_esearch(query, search_results_file, email, tool, min_date, max_date,
+                session=None, limiter=None, api_key=None):
 
     # assemble the esearch URL
     url = base_url + "esearch.fcgi?db={}&term={}&usehistory={}&retmax={}".format(
@@ -42,7 +145,8 @@ def run_esearch(query, search_results_file, email, tool, min_date, max_date):
     #post the esearch URL
     print("\nPosting following search:")
     print(url, "\n")
-    search_results = requests.get(url)
+    url = add_api_key(url, api_key)
+    search_results = get_with_retries(url, session, limiter)
 
     # Write to file
     with open(search_results_file, 'w') as file_handle:
@@ -52,6 +156,40 @@ def run_esearch(query, search_results_file, email, tool, min_date, max_date):
     return
 
 
+def run_esearch_history(query, search_results_file, email, tool, min_date,
+                        max_date, session=None, limiter=None, api_key=None):
+    ''' esearch that keeps the results on the NCBI history server; no ids
+        are returned, so the result count is not capped at retmax '''
+
+    # assemble the esearch URL
+    url = base_url + "esearch.fcgi?db={}&term={}&usehistory=y&retmax=0".format(
+            db, query)
+    url = url + "&mindate={}&maxdate={}&datetype={}".format(min_date, max_date, date_type)
+    url = url + "&tool={}&email={}".format(tool, email)
+
+    #post the esearch URL
+    print("\nPosting following search:")
+    print(url, "\n")
+    url = add_api_key(url, api_key)
+    search_results = get_with_retries(url, session, limiter)
+
+    # Write to file
+    with open(search_results_file, 'w') as file_handle:
+        file_handle.write(search_results.text)
+
+    print("eSearch completed")
+    return
+
+
+def get_history(search_results_file):
+    ''' Result count, WebEnv and query_key of a history esearch '''
+    root = ET.parse(search_results_file).getroot()
+    count = int(root.findtext('Count'))
+    web_env = root.findtext('WebEnv')
+    query_key = root.findtext('QueryKey')
+    return count, web_env, query_key
+
+
 def get_id_list(search_results_file):
     # parse results file for IDs
     tree = ET.parse(search_results_file)
@@ -92,7 +230,89 @@ def split_id_list(id_list, index_pair):
     return id_list_string
 
 
-def run_efetch(id_list_string, fna_download_path, data_file, email, tool):
+def run_esummary(id_list_string, email, tool, session=None, limiter=None,
+                 api_key=None):
+    ''' (uid, accession.version, update date) of each id '''
+
+    #assemble the esummary URL
+    url = base_url + "esummary.fcgi?db={}&id={}".format(db, id_list_string)
+    url = url + "&tool={}&email={}".format(tool, email)
+    url = add_api_key(url, api_key)
+    data = get_with_retries(url, session, limiter)
+
+    root = ET.fromstring(data.content)
+    summaries = []
+    for doc_sum in root.iter("DocSum"):
+        items = { item.get("Name"): item.text for item in doc_sum.iter("Item") }
+        summaries.append((doc_sum.findtext("Id"), items["AccessionVersion"],
+                          items["UpdateDate"]))
+    return summaries
+
+
+def summarize_batch(argument):
+    (id_list_string, email, tool, session, limiter, api_key) = argument
+    return run_esummary(id_list_string, email, tool, session, limiter,
+                        api_key)
+
+
+def run_esummary_parallel(id_list, email, tool, api_key=None,
+                          num_threads=None):
+    ''' Summaries of all ids in summary_batch_size batches, in id order '''
+    if not id_list:
+        return []
+
+    limiter = make_rate_limiter(api_key)
+    if num_threads is None:
+        num_threads = int(limiter.rate)
+    session = make_session(num_threads)
+
+    gen_of_batches = (
+        (",".join(id_list[start:start + summary_batch_size]), email, tool,
+         session, limiter, api_key)
+        for start in range(0, len(id_list), summary_batch_size)
+    )
+
+    print("Getting summaries of {} records...".format(len(id_list)))
+    pool = ThreadPool(processes=num_threads)
+    batch_summaries = pool.map_async(summarize_batch, gen_of_batches).get()
+    pool.close()
+    pool.join()
+    session.close()
+
+    return [ summary for summaries in batch_summaries for summary in summaries ]
+
+
+def fetch_insdseq_write_fna(url, sequence_dir, session=None, limiter=None,
+                           genome_store=None):
+    ''' Stream an INSDSeq efetch response straight into the parser and
+        write its fna files (or a genome store shard); a response cut off
+        mid-stream is fetched and parsed again, its partial shard having
+        been discarded '''
+    for attempt in range(max_retries + 1):
+        response = get_with_retries(url, session, limiter, stream=True)
+        response.raw.decode_content = True
+        try:
+            return read_efetch_write_fna(response.raw, sequence_dir,
+                                         genome_store)
+        except (StreamError, ET.ParseError) as exception:
+            error = exception
+        finally:
+            response.close()
+
+        if attempt == max_retries:
+            break
+        wait_time = backoff_seconds * 2 ** attempt
+        print("Reading response failed ({}); retrying in {} seconds...".format(
+            error, wait_time))
+        time.sleep(wait_time)
+
+    raise requests.RequestException(
+        "Reading response failed after {} retries ({}): {}".format(
+            max_retries, error, url))
+
+
+def run_efetch(id_list_string, fna_download_path, email, tool,
+               session=None, limiter=None, api_key=None, genome_store=None):
 
     #assemble the efetch URL
     url = base_url + "efetch.fcgi?db={}&id={}".format(db, id_list_string)
@@ -103,94 +323,163 @@ def run_efetch(id_list_string, fna_download_path, data_file, email, tool):
     #post the efetch URL
     print("Posting following fetch from NCBI:")
     print(url, "\n")
-    data = requests.get(url)
+    url = add_api_key(url, api_key)
+    return fetch_insdseq_write_fna(url, fna_download_path, session, limiter,
+                                   genome_store)
 
-    # Write fetched data to file
-    with open(data_file, 'w') as file_handle:
-        file_handle.write(data.text)
-
-
-def read_efetch_write_fna_legacy(data_file, sequence_dir):
-
-    # Parse INSD xml file
-    tree = ET.parse(data_file)
-    root = tree.getroot()
 
-    ''' Get Metadata and sequence for a single sequence from INSD xml file '''
-    file_list = []
-    # Initial Metadata
-    for node in root.iter("INSDSeq"):
-        locus = node.find("INSDSeq_locus").text
-
-        seq_length =  node.find("INSDSeq_length").text
-        create_date = node.find("INSDSeq_create-date").text
-        accession_number = node.find("INSDSeq_primary-accession").text
-        isolate = ""
-        country = ""
-        col_date = ""
-        comment = ""
+def run_efetch_history(web_env, query_key, retstart, retmax, sequence_dir,
+                       email, tool, session=None, limiter=None, api_key=None,
+                       genome_store=None):
+    ''' efetch one page (retstart, retmax) of a history server result '''
 
-        comment_node = node.find("INSDSeq_comment")
-        if comment_node is not None:
-            comment = comment_node.text
+    #assemble the efetch URL
+    url = base_url + "efetch.fcgi?db={}&WebEnv={}&query_key={}".format(
+            db, web_env, query_key)
+    url += "&retstart={}&retmax={}".format(retstart, retmax)
+    url += "&rettype={}&retmode={}".format(return_type, return_mode)
+    url = url + "&tool={}&email={}".format(tool, email)
 
-        # Feature Table metadata
-        feature_table = node.find("INSDSeq_feature-table")
-        # Interval
-        for feature_node in feature_table.iter("INSDFeature"):
-            feat_key = feature_node.find("INSDFeature_key").text
-            if feat_key == "source":
-                interval_node = feature_node.find("INSDFeature_intervals")
-                next_node = interval_node.find("INSDInterval")
-                int_start = next_node.find("INSDInterval_from").text
-                int_end = next_node.find("INSDInterval_to").text
-        # Other Metadata
-        for qualifier_node in feature_table.iter("INSDQualifier"):
-            qual_name = qualifier_node.find("INSDQualifier_name").text
-            qual_value_node = qualifier_node.find("INSDQualifier_value")
-            if qual_value_node is not None:
-                qual_value = qual_value_node.text
-            else:
-                print(locus, qual_name, "has no information, skipping...")
+    print("Fetching records {} to {} from NCBI history...".format(
+        retstart, retstart + retmax))
+    url = add_api_key(url, api_key)
+    return fetch_insdseq_write_fna(url, sequence_dir, session, limiter,
+                                   genome_store)
 
-            if qual_name == "isolate":
-                isolate = qual_value
-            if qual_name == "country":
-                country = qual_value
-            if qual_name == "collection_date":
-                col_date = qual_value
 
-        # Sequence
-        sequence_text_node = node.find("INSDSeq_sequence")
-        if sequence_text_node is not None:
-            sequence_text = sequence_text_node.text
-        else:
-            sequence_text = ""
-            print("No sequence in ", locus, "#######################################################")
+def load_done_offsets(progress_file, search_signature):
+    ''' Page offsets finished by an earlier run of the same search '''
+    if not os.path.isfile(progress_file):
+        return set()
+    with open(progress_file, 'r') as read_file:
+        if read_file.readline().strip() != search_signature:
+            return set()
+        return { int(line) for line in read_file if line.strip() }
 
 
-        # Create header using metadata
-        header_text = ">{}|{}|{}|{}|{}|{}|{}|{}|{}".format(
-            isolate, locus, col_date, create_date, country, seq_length,
-            int_start, int_end, comment)
+def fetch_history_page(argument):
+    ''' Fetch one history page, write its fna files, record the offset '''
+    (web_env, query_key, retstart, retmax, sequence_dir, email, tool,
+        session, limiter, api_key, progress, genome_store) = argument
 
-        # Write to fna file
-        output_fna_file = os.path.join(sequence_dir, "{}.fna".format(accession_number))
-        write_fna(output_fna_file, header_text, sequence_text.upper())
-        file_list.append(output_fna_file)
+    file_list = run_efetch_history(web_env, query_key, retstart, retmax,
+                                   sequence_dir, email, tool, session,
+                                   limiter, api_key, genome_store)
 
+    progress_file, progress_lock = progress
+    with progress_lock:
+        with open(progress_file, 'a') as write_file:
+            print(retstart, file=write_file)
     return file_list
 
 
-def read_efetch_write_fna(data_file, sequence_dir):
+def run_efetch_history_parallel(search_results_file, sequence_dir, data_dir,
+                                email, tool, search_signature, api_key=None,
+                                num_threads=None, genome_store=None):
+    ''' Fetch all records of a history esearch in history_page_size pages
+        from a pool of threads; pages finished by an interrupted run of the
+        same search are skipped.  Returns the fna files written. '''
+    count, web_env, query_key = get_history(search_results_file)
+
+    # Signature includes the count, so a changed result set starts over
+    search_signature = "{}\t{}".format(search_signature, count)
+    progress_file = os.path.join(data_dir, "efetch_progress.txt")
+    done_offsets = load_done_offsets(progress_file, search_signature)
+    if not done_offsets:
+        with open(progress_file, 'w') as write_file:
+            print(search_signature, file=write_file)
+
+    offsets = [ retstart for retstart in range(0, count, history_page_size)
+                if retstart not in done_offsets ]
+    print("{} records, {} pages to fetch ({} already fetched)".format(
+        count, len(offsets), len(done_offsets)))
+    if not offsets:
+        return []
+
+    limiter = make_rate_limiter(api_key)
+    if num_threads is None:
+        num_threads = int(limiter.rate)
+    session = make_session(num_threads)
+    progress = (progress_file, threading.Lock())
+
+    gen_of_pages = (
+        (web_env, query_key, retstart, history_page_size, sequence_dir,
+         email, tool, session, limiter, api_key, progress, genome_store)
+        for retstart in offsets
+    )
+
+    pool = ThreadPool(processes=num_threads)
+    page_files = pool.map_async(fetch_history_page, gen_of_pages).get()
+    pool.close()
+    pool.join()
+    session.close()
+
+    return [ fna_file for file_list in page_files for fna_file in file_list ]
+
+
+def fetch_batch(argument):
+    ''' Fetch one batch of ids and write its fna files '''
+    (id_list_string, sequence_dir, email, tool, session, limiter,
+        api_key, manifest, genome_store) = argument
+
+    file_list = run_efetch(id_list_string, sequence_dir, email, tool,
+                           session, limiter, api_key, genome_store)
+    if manifest is not None:
+        manifest.mark_fetched(id_list_string.split(','))
+    return file_list
 
-    # Parse INSD xml file
-    tree = ET.parse(data_file)
-    root = tree.getroot()
 
-    ''' Get Metadata and sequence for a single sequence from INSD xml file '''
-    file_list = []
-    for node in root.iter("INSDSeq"):
+def run_efetch_parallel(id_list, sequence_dir, email, tool,
+                        api_key=None, num_threads=None, manifest=None,
+                        genome_store=None):
+    ''' Fetch all ids in split_size batches from a pool of threads sharing
+        one session and rate limit; returns the fna files (or, with a
+        genome store, the accessions stored), in id order.
+        Finished batches are marked fetched in the manifest, if given. '''
+    if not id_list:
+        return []
+
+    limiter = make_rate_limiter(api_key)
+    if num_threads is None:
+        num_threads = int(limiter.rate)
+    session = make_session(num_threads)
+
+    gen_of_batches = (
+        (split_id_list(id_list, index_pair), sequence_dir, email, tool,
+         session, limiter, api_key, manifest, genome_store)
+        for index_pair in split_indices(id_list)
+    )
+
+    pool = ThreadPool(processes=num_threads)
+    batch_files = pool.map_async(fetch_batch, gen_of_batches).get()
+    pool.close()
+    pool.join()
+    session.close()
+
+    return [ fna_file for file_list in batch_files for fna_file in file_list ]
+
+
+def iter_insdseq(source):
+    ''' Incrementally parse INSD xml (a file name or a file object),
+        yielding each complete INSDSeq element; an element is cleared
+        once the caller is done with it, so only one record is held in
+        memory at a time '''
+    root = None
+    for event, elem in ET.iterparse(source, events=("start", "end")):
+        if root is None:
+            root = elem
+        if event == "end" and elem.tag == "INSDSeq":
+            yield elem
+            elem.clear()
+            root.clear()
+
+
+def iter_efetch_records(source):
+
+    ''' Get Metadata and sequence for a single sequence from INSD xml file;
+        yields (accession, header line, sequence) of each one as it is
+        parsed '''
+    for node in iter_insdseq(source):
 
         # Initialize
         segment = ""
@@ -307,9 +596,21 @@ def read_efetch_write_fna(data_file, sequence_dir):
             country_exposure, division_exposure, segment, host, age, sex,
             originating_lab, submitting_lab, authors, title, comment)
 
-        # Write to fna file
+        yield accession_number, header_text, sequence_text.upper()
+
+
+def read_efetch_write_fna(source, sequence_dir, genome_store=None):
+    ''' Write each genome of INSD xml to an fna file, or stream them all
+        into one new shard of the genome store; returns the fna files (or
+        accessions) written '''
+    records = iter_efetch_records(source)
+    if genome_store is not None:
+        return genome_store.add_shard(records)
+
+    file_list = []
+    for accession_number, header_text, sequence_text in records:
         output_fna_file = os.path.join(sequence_dir, "{}.fna".format(accession_number))
-        write_fna(output_fna_file, header_text, sequence_text.upper())
+        write_fna(output_fna_file, header_text, sequence_text)
         file_list.append(output_fna_file)
 
     return file_list
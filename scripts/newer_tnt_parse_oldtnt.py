@@ -8,11 +8,23 @@ Created on Mon Apr 13 16:19:40 2020
 
 import re
 import os
+import copy
 import json
+import mmap
+import time
 from glob import glob
+import numpy as np
 import pandas as pd
 from datetime import datetime
 import multiprocessing as mp
+import results_store as rstore
+import genome_store as gstore
+import fasta_index as fidx
+import genome_dedup as gdedup
+import metadata_index as midx
+from accession_index import AccessionIndex, NegativesList
+from itertools import chain, groupby
+from operator import itemgetter
 
 
 # Dictionary Labels
@@ -26,6 +38,34 @@ mm = "mismatches"
 positives_type = "True Positives"
 negatives_type = "False Negatives"
 
+# Delta Ct table row/column for each dinucleotide
+dinucleotide_codes = {
+    first + second: 4 * i + j
+    for i, first in enumerate("ACGT")
+    for j, second in enumerate("ACGT")
+}
+
+# Base codes for vectorized lookups (A, C, G, T = 0-3; all else N = 4)
+base_codes = np.full(256, 4, dtype=np.uint8)
+for code, base in enumerate("ACGT"):
+    base_codes[ord(base)] = code
+    base_codes[ord(base.lower())] = code
+
+# Size of reads from tnt output file (bytes)
+tnt_chunk_size = 1 << 22
+
+# Records per worker task (and genome store shard) when splitting GISAID
+gisaid_batch_size = 2000
+
+# Size of the blocks scanned for fasta record starts (bytes)
+fasta_scan_chunk_size = 1 << 26
+
+# Partition file of parsed True Positives (see assay_partitions.py)
+parsed_suffix = ".parsed.json"
+
+# Match table cell for genomes an assay was not evaluated on ("None")
+match_table_none = np.iinfo(np.int8).min
+
 
 def get_isolate(proto_isolate):
     isolate = proto_isolate.strip().strip('>')
@@ -41,27 +81,9 @@ def get_acc_list(file_ns):
     iso_acc_dict = {}
 
     if use_gisaid:
-        with open(metafile, 'r') as read_meta:
-            # Get column headers for "field names"
-            column_headers = read_meta.readline().strip().split('\t')
-
-            # Read through remainder of metafile
-            for metaline in read_meta.readlines():
-                # Assign each column value to appropriate field name in dict
-                metaline_fields = metaline.strip().split('\t')
-                meta_dict = {
-                    column_headers[i]: metaline_fields[i]
-                    for i in range(len(metaline_fields))
-                }
-
-                # Add iso-acc pair to dict
-                isolate = meta_dict["Virus name"]
-                accession = meta_dict["Accession ID"]
-                iso_acc_dict[isolate] = accession
-
-                # Add iso-acc pair for isolates with no spaces
-                spaceless_isolate = re.sub(r"\s+", "", isolate)
-                iso_acc_dict[spaceless_isolate] = accession
+        # Parsed once and reused from the metadata index (see
+        # metadata_index.py)
+        iso_acc_dict = midx.load_name_acc_map(metafile)
     else:
         with open(accessions_file, 'r') as read_accs:
             for acc_line in read_accs.readlines():
@@ -91,111 +113,208 @@ def return_accession(proto_isolate, iso_acc_dict, iso_idx):
     
     
     
-def get_header(isolate, metafile):
+def format_meta_header(header_dict):
+    ''' (accession, fna header) of a metadata.tsv row, as a dict keyed
+        by column; raises KeyError if a column is missing '''
+    isolate = header_dict["strain"]
+    virus = header_dict["virus"]
+    accession = header_dict["gisaid_epi_isl"]
+    collection_date = header_dict["date"]
+    region = header_dict["region"]
+    country = header_dict["country"]
+    division = header_dict["division"]
+    location = header_dict["location"]
+    region_exposure = header_dict["region_exposure"]
+    country_exposure = header_dict["country_exposure"]
+    division_exposure = header_dict["division_exposure"]
+    segment = header_dict["segment"]
+    length = header_dict["length"]
+    host = header_dict["host"]
+    age = header_dict["age"]
+    sex = header_dict["sex"]
+    originating_lab = header_dict["originating_lab"]
+    submitting_lab = header_dict["submitting_lab"]
+    authors = header_dict["authors"]
+    url = header_dict["url"]
+    title  = header_dict["title"]
+    paper_url = header_dict["paper_url"]
+    date_submitted = header_dict["date_submitted"]
+
+    if virus == "ncov":
+        viral_prefix = "hCoV-19/"
+    else:
+        viral_prefix = ""
+
+    header = ">{}{}|{}|{}|{}|{}: {}|{}|{}|{}|{}/{}/{}|{}/{}/{}/{}|{}|{}|{}|{}|{}|{}|{}|{}".format(viral_prefix, isolate, accession, collection_date, date_submitted, country, division,length, "", "", region, country, division, location, region_exposure, country_exposure, division_exposure, segment, host, age, sex, originating_lab, submitting_lab, authors, title)
+    # header = ">{}{}|{}|{}".format(viral_prefix, isolate, accession, collection_date)
 
-    header_dict = {}
+    return accession, header
+
+
+def get_header(isolate, metafile):
+    ''' (accession, fna header) of one isolate, scanning the whole
+        metafile; use load_meta_headers for more than a few isolates '''
 
     with open(metafile, 'r') as read_meta:
         column_headers = read_meta.readline().strip().split('\t')
 
-        for metaline in read_meta.readlines():
+        for metaline in read_meta:
             metaline_fields = metaline.strip().split('\t')
-            # print(metaline_fields)
             if isolate in metaline_fields:
-                for i in range(len(column_headers)):
-                    header_dict[column_headers[i]] = metaline_fields[i]
-
+                header_dict = dict(zip(column_headers, metaline_fields))
                 try:
-
-                    isolate = header_dict["strain"]
-                    virus = header_dict["virus"]
-                    accession = header_dict["gisaid_epi_isl"]
-                    collection_date = header_dict["date"]
-                    region = header_dict["region"]
-                    country = header_dict["country"]
-                    division = header_dict["division"]
-                    location = header_dict["location"]
-                    region_exposure = header_dict["region_exposure"]
-                    country_exposure = header_dict["country_exposure"]
-                    division_exposure = header_dict["division_exposure"]
-                    segment = header_dict["segment"]
-                    length = header_dict["length"]
-                    host = header_dict["host"]
-                    age = header_dict["age"]
-                    sex = header_dict["sex"]
-                    originating_lab = header_dict["originating_lab"]
-                    submitting_lab = header_dict["submitting_lab"]
-                    authors = header_dict["authors"]
-                    url = header_dict["url"]
-                    title  = header_dict["title"]
-                    paper_url = header_dict["paper_url"]
-                    date_submitted = header_dict["date_submitted"]
-                    break
-                except:
+                    return format_meta_header(header_dict)
+                except KeyError:
                     print(isolate, "######################################################")
 
-    try:
-        if virus == "ncov":
-            viral_prefix = "hCoV-19/"
-        else:
-            viral_prefix = ""
-
-        header = ">{}{}|{}|{}|{}|{}: {}|{}|{}|{}|{}/{}/{}|{}/{}/{}/{}|{}|{}|{}|{}|{}|{}|{}|{}".format(viral_prefix, isolate, accession, collection_date, date_submitted, country, division,length, "", "", region, country, division, location, region_exposure, country_exposure, division_exposure, segment, host, age, sex, originating_lab, submitting_lab, authors, title)
-        # header = ">{}{}|{}|{}".format(viral_prefix, isolate, accession, collection_date)
-
-        return accession, header
-
-    except:
-        print(isolate, "not found in metafile")
-        return None, None
-    
-    
-    
-def split_gisaid_file_with_meta(gisaid_file, download_dir, metafile, limit_gisaid):
-    ''' ################################################ XXXX ### '''
+    print(isolate, "not found in metafile")
+    return None, None
 
-    with open(gisaid_file, 'r') as read_gisaid:
-        line = read_gisaid.readline()
-        isolate = get_isolate(line)
-        line2 = []
-        accession, header = get_header(isolate, metafile)
 
-        if not accession == None:
-            filename = accession + ".fna"
-            output_path = os.path.join(download_dir, filename)
-            with open(output_path, "w") as write_handle:
-                print(header, file=write_handle)
-            # print(line.strip())
+def load_meta_headers(metafile):
+    ''' (accession, fna header) of every metadata.tsv row, read once and
+        keyed by strain, by strain without spaces (as get_isolate gives
+        it) and by accession; the first row of a key wins '''
+    meta_headers = {}
 
+    with open(metafile, 'r') as read_meta:
+        column_headers = read_meta.readline().strip().split('\t')
 
-        for line in read_gisaid.readlines():
-            if line[0] == ">":
-                # print(line.strip())
-                line2_str = "".join(line2)
-
-                if not accession == None:
-                    with open(output_path, "a") as write_handle:
-                        print(line2_str.strip(), file=write_handle)
-
-                isolate = get_isolate(line)
-                line2 = []
-                accession, header = get_header(isolate, metafile)
-
-                if not accession == None:
-                    filename = accession + ".fna"
-                    output_path = os.path.join(download_dir, filename)
-                    with open(output_path, "w") as write_handle:
-                        print(header, file=write_handle)
-            else:
-                # print(line[0:40])
-                line2.append(line.strip())
+        for metaline in read_meta:
+            header_dict = dict(zip(column_headers,
+                                   metaline.strip().split('\t')))
+            try:
+                accession, header = format_meta_header(header_dict)
+            except KeyError:
+                print(header_dict.get("strain"), "######################################################")
+                continue
 
+            strain = header_dict["strain"]
+            for key in (strain, re.sub(r"\s+", "", strain), accession):
+                meta_headers.setdefault(key, (accession, header))
+
+    return meta_headers
+
+
+def find_fasta_record_offsets(fasta_mm, chunk_size=fasta_scan_chunk_size):
+    ''' Offsets of the ">" starting each record of a memory-mapped fasta '''
+    fasta_bytes = np.frombuffer(fasta_mm, dtype=np.uint8)
+    offset_list = []
+    for start in range(0, len(fasta_bytes), chunk_size):
+        chunk = fasta_bytes[start:start + chunk_size]
+        offset_list.append(np.flatnonzero(chunk == ord(">")) + start)
+    offsets = np.concatenate(offset_list) if offset_list else \
+        np.zeros(0, dtype=np.int64)
+
+    # Only a ">" at the start of a line starts a record
+    at_line_start = (offsets == 0) | (fasta_bytes[offsets - 1] == ord("\n"))
+    return offsets[at_line_start].tolist()
+
+
+def init_gisaid_split_worker(meta_headers):
+    ''' Give each worker process its own copy of the metadata headers '''
+    global split_meta_headers
+    split_meta_headers = meta_headers
+
+
+def split_gisaid_batch(argument):
+    ''' Write a batch of GISAID fasta records, given by their offsets, to
+        .fna files in download_dir, or to genome store shard_file; returns
+        the genome store entries and the number of records not in the
+        metafile '''
+    gisaid_file, offsets, end, download_dir, shard_file = argument
+
+    records = []
+    missing = 0
+    with open(gisaid_file, 'rb') as read_gisaid, \
+            mmap.mmap(read_gisaid.fileno(), 0,
+                      access=mmap.ACCESS_READ) as gisaid_mm:
+        for start, stop in zip(offsets, offsets[1:] + [end]):
+            header_end = gisaid_mm.find(b"\n", start, stop)
+            if header_end == -1:
+                header_end = stop
+            isolate = get_isolate(gisaid_mm[start:header_end].decode())
+            accession, header = split_meta_headers.get(isolate, (None, None))
+            if accession is None:
+                print(isolate, "not found in metafile")
+                missing += 1
+                continue
+            sequence = gisaid_mm[header_end:stop].translate(
+                None, b" \t\r\n").decode()
+            records.append((accession, header, sequence))
+
+    if shard_file is not None:
+        return gstore.write_shard(shard_file, records), missing
+
+    for accession, header, sequence in records:
+        output_path = os.path.join(download_dir, accession + ".fna")
+        with open(output_path, "w") as write_handle:
+            write_handle.write(header + "\n" + sequence + "\n")
+    return [], missing
+
+
+def split_gisaid_file_with_meta(gisaid_file, download_dir, metafile,
+                                limit_gisaid, procnum=1, genome_store=None):
+    """ Split a GISAID fasta into one single-line genome per isolate found
+    in the metafile, named by accession and headed from its metadata.
+
+    The fasta is memory-mapped and scanned for record starts, and batches
+    of gisaid_batch_size records are split in procnum processes, each
+    batch written at once to .fna files in download_dir or, given a
+    genome_store.GenomeStore, to one store shard.
+
+    :param procnum: Number of processes
+    :type procnum: int
+    """
+    tic = time.perf_counter()
+    meta_headers = load_meta_headers(metafile)
+
+    gisaid_size = os.path.getsize(gisaid_file)
+    if gisaid_size == 0:
+        return
+    with open(gisaid_file, 'rb') as read_gisaid, \
+            mmap.mmap(read_gisaid.fileno(), 0,
+                      access=mmap.ACCESS_READ) as gisaid_mm:
+        offsets = find_fasta_record_offsets(gisaid_mm)
+
+    batches = [ offsets[i:i + gisaid_batch_size]
+                for i in range(0, len(offsets), gisaid_batch_size) ]
+    batch_ends = [ batch[0] for batch in batches[1:] ] + [gisaid_size]
+    if genome_store is not None:
+        first_shard = genome_store.reserve_shards(len(batches))
+        shard_files = [ genome_store.shard_path(first_shard + i)
+                        for i in range(len(batches)) ]
+    else:
+        shard_files = [None] * len(batches)
+
+    arguments = [ (gisaid_file, batch, batch_end, download_dir, shard_file)
+                  for batch, batch_end, shard_file in
+                  zip(batches, batch_ends, shard_files) ]
+    print("Splitting {} records of {} in {} batches with {} processes...".format(
+        len(offsets), gisaid_file, len(batches), procnum))
+
+    if procnum > 1:
+        pool = mp.Pool(processes=procnum, initializer=init_gisaid_split_worker,
+                       initargs=(meta_headers,))
+        batch_results = pool.map_async(split_gisaid_batch, arguments,
+                                       chunksize=1).get()
+        pool.close()
+        pool.join()
+    else:
+        init_gisaid_split_worker(meta_headers)
+        batch_results = [ split_gisaid_batch(argument)
+                          for argument in arguments ]
 
-        line2_str = "".join(line2)
+    missing = 0
+    for entries, batch_missing in batch_results:
+        if genome_store is not None:
+            genome_store.add_entries(entries)
+        missing += batch_missing
 
-        if not accession == None:
-            with open(output_path, "a") as write_handle:
-                print(line2_str.strip(), file=write_handle)
+    elapsed_time = time.perf_counter() - tic
+    print("Split {} of {} records ({} not in metafile) in {:.1f} s: "
+          "{:.3f} GB/s".format(len(offsets) - missing, len(offsets), missing,
+                               elapsed_time, gisaid_size / elapsed_time / 1e9))
 
 
 def next_fields(tnt_lines):
@@ -350,43 +469,53 @@ def fill_seq_dict(tnt_lines, iso_acc_dict, iso_idx):
     sequence_dict["Accession"] = accession
 
     ''' Run out remainder of lines for this entry '''
-    line = next(tnt_lines)
-    line = next(tnt_lines)
+    line = next(tnt_lines, "")
+    line = next(tnt_lines, "")
 
     return sequence_dict
 
 
-def assay_pos_list(tnt_lines, iso_acc_dict, iso_idx):
-    positives_list = []
-    while line := next(tnt_lines, False):
-        if line.strip() == ("###########################################"
-                            + "##########################################"):
-            break
+def read_tnt_lines(tnt_result):
+    ''' Generator of tnt file lines, streamed from disk '''
+    with open(tnt_result, 'r') as file_handle:
+        yield from file_handle
+
+
+def iter_tnt_hits(tnt_lines, iso_acc_dict, iso_idx):
+    ''' Yield (assay name, sequence dict) for each hit in tnt output '''
+    for line in tnt_lines:
         fields = line.strip().split(" ")
-        name = fields[2]
-        
-        sequence_dict = fill_seq_dict(tnt_lines, iso_acc_dict, iso_idx)
+        # Each hit record starts with "name = <assay>"; skip separators
+        if fields[0] == "name" and len(fields) >= 3:
+            yield fields[2], fill_seq_dict(tnt_lines, iso_acc_dict, iso_idx)
 
-        ''' Add this sequence dict to positives list '''
-        positives_list.append(sequence_dict)
-    return positives_list, name, line
 
+def expand_duplicate_hits(tnt_hits, members, iso_acc_dict, iso_idx):
+    ''' After each hit on a representative genome, yield a copy for each
+        of its duplicate members (see genome_dedup.py) '''
+    for name, sequence_dict in tnt_hits:
+        yield name, sequence_dict
+        for member in members.get(sequence_dict["Common Name"], []):
+            member_dict = copy.deepcopy(sequence_dict)
+            member_dict["Common Name"] = member
+            member_dict["Accession"] = return_accession(
+                member, iso_acc_dict, iso_idx)
+            yield name, member_dict
 
-def make_assay_list(tnt_lines, iso_acc_dict, iso_idx):
 
-    # Get first line and discard
-    line = next(tnt_lines)
-    if line.strip() == (
-            "###########################################" +
-            "##########################################"):
-        pass
+def assay_pos_list(assay_hits):
+    ''' Collect the hits of a single assay into its positives list '''
+    return [ sequence_dict for _, sequence_dict in assay_hits ]
+
+
+def make_assay_list(tnt_hits):
 
     # Initialize assay list (for assay dicts)
     assay_list = []
 
-    # Loop while lines exist and create assay dicts, add these to list
-    while line:
-        positives_list, name, line = assay_pos_list(tnt_lines, iso_acc_dict, iso_idx)
+    # Hits arrive grouped by assay; create assay dicts, add these to list
+    for name, assay_hits in groupby(tnt_hits, key=itemgetter(0)):
+        positives_list = assay_pos_list(assay_hits)
 
         # Add positives to new assay dict (append to assay list)
         assay_dict = { assay_name : name }
@@ -397,18 +526,108 @@ def make_assay_list(tnt_lines, iso_acc_dict, iso_idx):
     return assay_list
 
 
-def brute_parse_tnt_results(tnt_result, iso_acc_dict, iso_idx):
-    ''' Parse tnt file for positive assays and relevant info '''
+def is_tnt_boundary(line):
+    ''' True if line (bytes) starts a hit record or an assay block '''
+    return line.startswith(b"name = ") or line.startswith(b"#####")
 
-    # Read tnt results file
-    with open(tnt_result, 'r') as file_handle:
-        tnt_lines_list = file_handle.readlines()
 
-    # Convert tnt file lines to generator
-    tnt_lines = (line for line in tnt_lines_list)
+def find_tnt_shard_ranges(tnt_result, num_shards):
+    ''' Split tnt file into byte ranges that start on record boundaries '''
+    file_size = os.path.getsize(tnt_result)
+    offsets = [0]
+
+    with open(tnt_result, 'rb') as file_handle:
+        for i in range(1, num_shards):
+            target = int(i * file_size / num_shards)
+            if target <= offsets[-1]:
+                continue
+
+            # Move to start of next full line, then to next boundary
+            file_handle.seek(target)
+            position = target + len(file_handle.readline())
+            while line := file_handle.readline():
+                if is_tnt_boundary(line):
+                    break
+                position += len(line)
+
+            if offsets[-1] < position < file_size:
+                offsets.append(position)
+
+    offsets.append(file_size)
+    return list(zip(offsets[:-1], offsets[1:]))
+
+
+def read_tnt_shard_lines(tnt_result, start, end):
+    ''' Generator of tnt file lines between two byte offsets '''
+    with open(tnt_result, 'rb', buffering=tnt_chunk_size) as file_handle:
+        file_handle.seek(start)
+        position = start
+        while position < end and (line := file_handle.readline()):
+            position += len(line)
+            yield line.decode()
+
+
+def init_tnt_shard_worker(iso_acc_dict, iso_idx):
+    ''' Give each worker process its own copy of the accession lookup '''
+    global shard_iso_acc_dict, shard_iso_idx
+    shard_iso_acc_dict = iso_acc_dict
+    shard_iso_idx = iso_idx
+
+
+def parse_tnt_shard(argument):
+    tnt_result, start, end = argument
+    tnt_lines = read_tnt_shard_lines(tnt_result, start, end)
+    return list(iter_tnt_hits(tnt_lines, shard_iso_acc_dict, shard_iso_idx))
+
+
+def parse_tnt_hits_parallel(tnt_result, iso_acc_dict, iso_idx, procnum):
+    ''' Parse byte ranges of tnt file in worker processes, in file order '''
+
+    # Several shards per process to even out uneven assay blocks
+    shard_ranges = find_tnt_shard_ranges(tnt_result, procnum * 4)
+    print("Parsing {} shards of {} with {} processes...".format(
+        len(shard_ranges), tnt_result, procnum))
+
+    gen_of_shards = (
+        (tnt_result, start, end)
+        for start, end in shard_ranges
+    )
+
+    pool = mp.Pool(processes=procnum, initializer=init_tnt_shard_worker,
+                   initargs=(iso_acc_dict, iso_idx))
+    try:
+        # Shards are returned in order; only finished shards are held
+        for shard_hits in pool.imap(parse_tnt_shard, gen_of_shards):
+            yield from shard_hits
+    finally:
+        pool.close()
+        pool.join()
+
+
+def brute_parse_tnt_results(tnt_result, iso_acc_dict, iso_idx, procnum=1,
+                            members=None):
+    ''' Parse tnt file for positive assays and relevant info; hits of
+        deduplicated representatives are copied to their members, read
+        from the members file next to tnt_result unless given '''
+
+    if procnum > 1:
+        # Parse shards of tnt results file in parallel
+        tnt_hits = parse_tnt_hits_parallel(
+            tnt_result, iso_acc_dict, iso_idx, procnum)
+    else:
+        # Stream tnt results file; only one hit record is held at a time
+        tnt_lines = read_tnt_lines(tnt_result)
+        tnt_hits = iter_tnt_hits(tnt_lines, iso_acc_dict, iso_idx)
+
+    # Duplicate genomes left out of tntblast by run_tnt.py -D
+    if members is None:
+        members = gdedup.load_members(gdedup.get_members_path(tnt_result))
+    if members:
+        tnt_hits = expand_duplicate_hits(
+            tnt_hits, members, iso_acc_dict, iso_idx)
 
     # Create list of assay dicts containing tnt results
-    assay_list = make_assay_list(tnt_lines, iso_acc_dict, iso_idx)
+    assay_list = make_assay_list(tnt_hits)
 
     # Add assay list as dictionary entry
     full_dictionary = {assay : assay_list}
@@ -419,6 +638,33 @@ def brute_parse_tnt_results(tnt_result, iso_acc_dict, iso_idx):
     return full_dictionary
 
 
+def parse_tnt_partitions(tnt_cache, results_cache, assays, iso_acc_dict,
+                         iso_idx, procnum=1, members=None):
+    ''' Full_Dict from per-assay tnt partitions; parsed partitions in
+        results_cache are reused, the others are parsed and cached '''
+    assay_list = []
+    for name, key, _ in assays:
+        if results_cache.has(key, parsed_suffix):
+            positives_list = results_cache.read_json(key, parsed_suffix)
+        else:
+            partition_dict = brute_parse_tnt_results(
+                tnt_cache.path(key, ".out"), iso_acc_dict, iso_idx, procnum,
+                members)
+            positives_list = list(chain.from_iterable(
+                assay_dict[positives_type]
+                for assay_dict in partition_dict[assay]))
+            results_cache.write_json(key, parsed_suffix, positives_list)
+
+        # As in a full parse, assays without any hits are not listed
+        if positives_list:
+            assay_list.append({
+                assay_name: name,
+                positives_type: positives_list,
+                negatives_type: []})
+
+    return {assay: assay_list, "Timestamp": str(datetime.now())}
+
+
 def parse_tnt_results(tnt_result, iso_acc_dict, iso_idx):
     ''' Parse tnt file for positive assays and relevant info '''
 
@@ -626,21 +872,24 @@ def determine_negatives(
 
     print("\nDetermining Negatives and Adding To Metadata Dictionary...")
 
+    # Index all accessions once; shared by every assay
+    if isinstance(accession_list, AccessionIndex):
+        accession_index = accession_list
+    else:
+        accession_index = AccessionIndex(accession_list)
+
     assay_list = full_dictionary[assay]
 
     for assay_dictionary in assay_list:
         positives_list = assay_dictionary[positives_type]
 
-        pos_accs = [ acc_dictionary['Accession'] 
-            for acc_dictionary in positives_list ]
-
-        neg_accs = set(accession_list) - set(pos_accs)
+        pos_idx = accession_index.encode(
+            acc_dictionary['Accession'] for acc_dictionary in positives_list)
 
-        neg_dict = [
-            {"Accession": neg_acc}
-            for neg_acc in neg_accs
-        ]
-        assay_dictionary[negatives_type] = neg_dict
+        # Negatives stay an int array; dicts are made only when iterated
+        neg_idx = accession_index.complement(pos_idx)
+        assay_dictionary[negatives_type] = NegativesList(
+            accession_index, neg_idx)
 
     # Add timestamp
     full_dictionary.update({ "Timestamp" : str(datetime.now()) })
@@ -663,7 +912,99 @@ def get_working_assays(assay_dict, positives_type, negatives_type):
     return positives, negatives
 
 
-def create_match_tables_reduced(in_file, results_path, seq_file, short_assay_list_file):
+def max_oligo_mismatches(seq_entry):
+    values = seq_entry["Values"]
+    mismatches_fp = int(values["Forward Primer"]['mismatches'])
+    mismatches_pr = int(values["Probe"].get('mismatches', 0))
+    mismatches_rp = int(values["Reverse Primer"]['mismatches'])
+    return max(mismatches_fp, mismatches_pr, mismatches_rp)
+
+
+def build_match_table(full_dict, seq_list, short_assay_list=None):
+    ''' Match table rows (assay name -> int8 array over seq_list):
+        max oligo mismatches for True Positives, -1 for False Negatives
+        and match_table_none where the genome was not evaluated '''
+
+    # Column of each accession (first occurrence, as list.index)
+    seq_col = {}
+    for col, acc in enumerate(seq_list):
+        seq_col.setdefault(acc, col)
+
+    if short_assay_list is not None:
+        short_assay_list = set(short_assay_list)
+
+    match_table = {}
+    pass_tally = []
+    for assay_dict in full_dict[assay]:
+        this_assay = assay_dict[assay_name]
+        if short_assay_list is not None and this_assay not in short_assay_list:
+            continue
+
+        table_line = np.full(len(seq_list), match_table_none, dtype=np.int8)
+
+        for seq_entry in assay_dict[positives_type]:
+            col = seq_col.get(seq_entry["Accession"])
+            try:
+                mismatches = max_oligo_mismatches(seq_entry)
+            except (KeyError, TypeError, ValueError):
+                col = None
+            if col is None:
+                pass_tally.append("pass pos")
+            else:
+                table_line[col] = mismatches
+
+        negatives = assay_dict[negatives_type]
+        if isinstance(negatives, NegativesList):
+            neg_accessions = negatives.accession_list()
+        else:
+            neg_accessions = [ acc_entry["Accession"]
+                               for acc_entry in negatives ]
+        neg_cols = np.fromiter(
+                (seq_col.get(acc, -1) for acc in neg_accessions),
+                dtype=np.int64, count=len(neg_accessions))
+        found = neg_cols >= 0
+        table_line[neg_cols[found]] = -1
+        pass_tally.extend(["pass neg"] * int(np.count_nonzero(~found)))
+
+        match_table.update({this_assay : table_line})
+
+    if pass_tally:
+        with open("tnt_pass_tally_file.txt", 'a') as err_file:
+            print("\n".join(pass_tally), file=err_file)
+
+    return match_table
+
+
+def write_match_table(match_table, seq_list, results_path,
+                      write_binary=False):
+    # Cell text for every int8 value; the sentinel prints as None
+    cell_text = np.array(
+            [ str(value) for value in range(-128, 128) ], dtype=object)
+    cell_text[match_table_none + 128] = "None"
+
+    match_table_file = os.path.join(results_path, "match_table.csv")
+    with open(match_table_file, 'w') as file_handle:
+        text_lines = [ " ," + ",".join([ str(item) for item in seq_list ]) ]
+        for key,val in match_table.items():
+            cells = cell_text[val.astype(np.int16) + 128]
+            text_lines.append(key + "," + ",".join(cells))
+        file_handle.write("\n".join(text_lines) + "\n")
+
+    print("Wrote file:", match_table_file)
+
+    if write_binary:
+        binary_file = os.path.join(results_path, "match_table.npz")
+        np.savez(
+            binary_file,
+            table=np.array(list(match_table.values()), dtype=np.int8
+                           ).reshape(len(match_table), len(seq_list)),
+            assays=np.array(list(match_table.keys()), dtype=str),
+            accessions=np.array(seq_list, dtype=str))
+        print("Wrote file:", binary_file)
+
+
+def create_match_tables_reduced(in_file, results_path, seq_file,
+                                short_assay_list_file, write_binary=False):
 
     ''' Get short assay list '''
     short_assay_list = []
@@ -680,64 +1021,10 @@ def create_match_tables_reduced(in_file, results_path, seq_file, short_assay_lis
         for line in lines:
             seq_list.append(line.strip())
 
-    length = len(seq_list)
-    dict_of_success = {}
-    dict_of_fail = {}
-    dict_of_both = {}
 #    json_file_path = os.path.join(results_path, in_file)
-    with open(in_file) as json_file:
-        full_dict = json.load(json_file)
-        for assay_dict in full_dict[assay]:
-            this_assay = assay_dict[assay_name]
-            if this_assay in short_assay_list:
-
-                positives, negatives = get_working_assays(assay_dict, "True Positives", "False Negatives")
-                table_line = [None]*(length)
-                for acc in positives:
-                    try:
-                        idx = seq_list.index(acc)
-                        mismatches = 0
-                        for seq_entry in assay_dict["True Positives"]:
-                            if seq_entry["Accession"] == acc:
-
-                                mismatches_fp = int(seq_entry["Values"]["Forward Primer"]['mismatches'])
-                                if 'mismatches' in seq_entry["Values"]["Probe"].keys():
-                                    mismatches_pr = int(seq_entry["Values"]["Probe"]['mismatches'])
-                                else:
-                                    mismatches_pr = 0
-                                mismatches_rp = int(seq_entry["Values"]["Reverse Primer"]['mismatches'])
-                                mismatches = max(mismatches_fp, mismatches_pr, mismatches_rp)
-
-    #                    print(idx, seq_list[idx])
-                        table_line[idx] = mismatches
-                    except:
-                        with open("tnt_pass_tally_file.txt", 'a') as err_file:
-                            print("pass pos", file=err_file)
-
-
-                for acc in negatives:
-                    try:
-                        idx = seq_list.index(acc)
-    #                    print(idx, seq_list[idx])
-                        table_line[idx] = -1
-                    except:
-                        with open("tnt_pass_tally_file.txt", 'a') as err_file:
-                            print("pass neg", file=err_file)
-    #            print(table_line)
-                dict_of_success.update({this_assay : positives})
-                dict_of_fail.update({this_assay : negatives})
-                dict_of_both.update({this_assay : table_line})
-
-    with open(os.path.join(results_path, "match_table.csv"), 'w') as file_handle:
-        text_line = " ," + ",".join([ str(item) for item in seq_list ])
-        print(text_line, file=file_handle)
-
-        for key,val in dict_of_both.items():
-
-            text_line = key + "," + ",".join([ str(item) for item in val ])
-            print(text_line, file=file_handle)
-
-    print("Wrote file: {}match_table.csv".format(results_path))
+    full_dict = rstore.load_results(in_file)
+    match_table = build_match_table(full_dict, seq_list, short_assay_list)
+    write_match_table(match_table, seq_list, results_path, write_binary)
 
 
 def make_sequence_list_file(seq_file, target_fna_file_path):
@@ -772,17 +1059,21 @@ def complement(sequence):
     return ''.join([give_complement_base(base) for base in sequence])
 
 
-def get_del_ct(primer_bases, target_bases, three_prime_table):
+def load_del_ct_table(three_prime_table):
+    ''' Read delta Ct table once into a 16x16 array by dinucleotide code '''
     table = pd.read_table(three_prime_table, index_col='Row')
-    return table.loc[primer_bases, target_bases]
+    dinucleotides = list(dinucleotide_codes)
+    return table.loc[dinucleotides, dinucleotides].to_numpy(dtype=float)
 
 
-def is_fatal_terminal_mismatch(primer_bases, target_bases, three_prime_table, del_ct_thresh):
+def get_del_ct(primer_bases, target_bases, del_ct_table):
+    return del_ct_table[dinucleotide_codes[primer_bases],
+                        dinucleotide_codes[target_bases]]
+
+
+def is_fatal_terminal_mismatch(primer_bases, target_bases, del_ct_table, del_ct_thresh):
     primer_bases, target_bases = process_Ns(primer_bases, target_bases)
-    result = get_del_ct(primer_bases, target_bases, three_prime_table)
-    # if result != 0.0:
-    #     print(result)
-    return get_del_ct(primer_bases, target_bases, three_prime_table) > del_ct_thresh
+    return get_del_ct(primer_bases, target_bases, del_ct_table) > del_ct_thresh
 
 
 def process_Ns(primer_bases, target_bases):
@@ -810,10 +1101,13 @@ def set_queues_for_three_prime(
     print("\nRemoving 3' mismatches over threshold from True Positives...")
     assay_dict_list = Full_Dict["Assay"]
 
+    # Read table once; workers get the small array, not the file name
+    del_ct_table = load_del_ct_table(three_prime_table)
+
     gen_of_TP_lists = (
         (each_assay["Name"], # Tuple with assay name, and...
             each_assay["True Positives"], # TP_list in each_assay, and...
-            three_prime_table, del_ct_thresh # other needed args
+            del_ct_table, del_ct_thresh # other needed args
         )
         for each_assay in Full_Dict["Assay"] # for each_assay in assay list
     )
@@ -837,7 +1131,7 @@ def set_queues_for_three_prime(
 
 def filter_three_prime_parallel(argument):
     
-    assay_name, TP_list, three_prime_table, del_ct_thresh = argument
+    assay_name, TP_list, del_ct_table, del_ct_thresh = argument
 
     new_TP_list = []
     new_FN_list = []
@@ -865,9 +1159,9 @@ def filter_three_prime_parallel(argument):
 
         ''' If terminal MM put in False Negative List; else put in new TP list '''
         if is_fatal_terminal_mismatch(for_seq, for_targ_seq, 
-                                        three_prime_table, del_ct_thresh) or \
+                                        del_ct_table, del_ct_thresh) or \
             is_fatal_terminal_mismatch(rev_seq, rev_targ_seq, 
-                                        three_prime_table, del_ct_thresh):
+                                        del_ct_table, del_ct_thresh):
                 print("False Negative due to terminal MM failure!")
                 print(assay_name)
                 print(each_pos["Accession"])
@@ -884,6 +1178,7 @@ def filter_three_prime(Full_Dict, three_prime_table, del_ct_thresh):
 
     print("\nRemoving 3' mismatches over threshold from True Positives...")
     assay_dict_list = Full_Dict["Assay"]
+    del_ct_table = load_del_ct_table(three_prime_table)
     for each_assay in assay_dict_list:
         FN_list = each_assay["False Negatives"]
         TP_list = each_assay["True Positives"]
@@ -911,8 +1206,8 @@ def filter_three_prime(Full_Dict, three_prime_table, del_ct_thresh):
             rev_targ_seq = complement(rev_targ_seq)
 
             ''' If terminal MM put in False Negative List; else put in new TP list '''
-            if is_fatal_terminal_mismatch(for_seq, for_targ_seq, three_prime_table, del_ct_thresh) or \
-                is_fatal_terminal_mismatch(rev_seq, rev_targ_seq, three_prime_table, del_ct_thresh):
+            if is_fatal_terminal_mismatch(for_seq, for_targ_seq, del_ct_table, del_ct_thresh) or \
+                is_fatal_terminal_mismatch(rev_seq, rev_targ_seq, del_ct_table, del_ct_thresh):
                     print("False Negative due to terminal MM failure!")
                     print(each_assay["Name"])
                     print(each_pos["Accession"])
@@ -930,10 +1225,96 @@ def filter_three_prime(Full_Dict, three_prime_table, del_ct_thresh):
     return Full_Dict
 
 
+def terminal_base_codes(sequences, complement_bases=False):
+    ''' Codes (ACGT = 0-3, anything else N = 4) of last two bases, (n, 2) '''
+    terminal_bases = "".join(
+        sequence[-2:].rjust(2, "N") for sequence in sequences)
+    codes = base_codes[
+        np.frombuffer(terminal_bases.encode(), dtype=np.uint8)
+    ].reshape(-1, 2)
+    if complement_bases:
+        # A<->T and C<->G are 0<->3 and 1<->2
+        codes = np.where(codes < 4, 3 - codes, 4).astype(np.uint8)
+    return codes
+
+
+def process_N_codes(primer_codes, target_codes):
+    ''' Vectorized process_Ns: an N takes the base from the other strand '''
+    primer_codes = np.where(primer_codes == 4, target_codes, primer_codes)
+    target_codes = np.where(target_codes == 4, primer_codes, target_codes)
+    return primer_codes, target_codes
+
+
+def pad_del_ct_table(del_ct_table):
+    ''' 25x25 version of the table over ACGTN; pairs with an N get 0 '''
+    padded = np.zeros((5, 5, 5, 5))
+    padded[:4, :4, :4, :4] = del_ct_table.reshape(4, 4, 4, 4)
+    return padded.reshape(25, 25)
+
+
+def three_prime_fatal_mask(for_prims, for_targs, rev_prims, rev_targs,
+                           del_ct_table, del_ct_thresh):
+    ''' True for each hit with a terminal mismatch over the threshold '''
+    lookup = pad_del_ct_table(del_ct_table)
+
+    fatal = np.zeros(len(for_prims), dtype=bool)
+    for prims, targs in ((for_prims, for_targs), (rev_prims, rev_targs)):
+        primer_codes = terminal_base_codes(prims)
+        target_codes = terminal_base_codes(targs, complement_bases=True)
+        primer_codes, target_codes = process_N_codes(
+            primer_codes, target_codes)
+
+        # Delta Ct of every hit in one fancy-indexing lookup
+        del_cts = lookup[5 * primer_codes[:, 0] + primer_codes[:, 1],
+                         5 * target_codes[:, 0] + target_codes[:, 1]]
+        fatal |= del_cts > del_ct_thresh
+
+    return fatal
+
+
+def filter_three_prime_vectorized(Full_Dict, three_prime_table, del_ct_thresh):
+
+    print("\nRemoving 3' mismatches over threshold from True Positives...")
+    assay_dict_list = Full_Dict["Assay"]
+    del_ct_table = load_del_ct_table(three_prime_table)
+
+    # All True Positives of all assays, in one batch
+    TP_list = [
+        each_pos
+        for each_assay in assay_dict_list
+        for each_pos in each_assay["True Positives"]
+    ]
+    alignments = [ each_pos["Alignments"] for each_pos in TP_list ]
+    fatal = three_prime_fatal_mask(
+        [ alignment[FP]["5'"] for alignment in alignments ],
+        [ alignment[FP]["3'"] for alignment in alignments ],
+        [ alignment[RP]["5'"] for alignment in alignments ],
+        [ alignment[RP]["3'"] for alignment in alignments ],
+        del_ct_table, del_ct_thresh)
+
+    # Partition each assay's slice of the batch into TP and FN
+    start = 0
+    for each_assay in assay_dict_list:
+        end = start + len(each_assay["True Positives"])
+        assay_fatal = fatal[start:end]
+        if assay_fatal.any():
+            print("{}: {} False Negatives due to terminal MM failure".format(
+                each_assay["Name"], int(assay_fatal.sum())))
+            each_assay["False Negatives"].extend(
+                TP_list[i] for i in np.flatnonzero(assay_fatal) + start)
+            each_assay["True Positives"] = [
+                TP_list[i] for i in np.flatnonzero(~assay_fatal) + start ]
+        start = end
+
+    # Add timestamp
+    Full_Dict.update({ "Timestamp" : str(datetime.now()) })
+
+    return Full_Dict
+
+
 def make_negatives_list(in_file, out_file):
 
-    with open(in_file) as json_file:
-        full_dict = json.load(json_file)
+    full_dict = rstore.load_results(in_file)
 
     with open(out_file, 'w') as write_file:
         for assay_dict in full_dict[assay]:
@@ -947,22 +1328,35 @@ def make_negatives_list(in_file, out_file):
             print("{}\t{}".format(this_assay, acc_string), file=write_file)
 
 
-def make_negatives_list(in_file, out_file, fasta_dir):
+def make_negatives_list(in_file, out_file, fasta_dir, sequence_file=None):
+
+    full_dict = rstore.load_results(in_file)
 
-    with open(in_file) as json_file:
-        full_dict = json.load(json_file)
+    # Headers come from the record index of the combined fasta, or else
+    # from the genome store, if genomes were downloaded to one
+    header_index = None
+    if sequence_file is not None and fidx.has_index(sequence_file):
+        header_index = fidx.FastaIndex(sequence_file)
+    elif gstore.has_store(fasta_dir):
+        header_index = gstore.GenomeStore(gstore.get_store_dir(fasta_dir))
 
     assays_list = []
     for assay_dict in full_dict[assay]:
         this_assay = assay_dict[assay_name]
         FN_list = assay_dict[negatives_type]
+        if isinstance(FN_list, NegativesList):
+            # Accessions straight from the int array; no dicts are made
+            FN_accessions = FN_list.accession_list()
+        else:
+            FN_accessions = [ negative["Accession"] for negative in FN_list ]
         acc_list = []
-        for negative in FN_list:
-            seq_accesion = negative["Accession"]
-            file = os.path.join(fasta_dir, "{}.fna".format(seq_accesion))
-
-            with open(file, 'r') as read_file:
-                header = read_file.readline().strip().strip('>')
+        for seq_accesion in FN_accessions:
+            if header_index is not None:
+                header = header_index.get_header(seq_accesion).strip().strip('>')
+            else:
+                file = os.path.join(fasta_dir, "{}.fna".format(seq_accesion))
+                with open(file, 'r') as read_file:
+                    header = read_file.readline().strip().strip('>')
             header_fields = header.split('|')
             isolate = header_fields[0]
             accession = header_fields[1]
@@ -986,6 +1380,8 @@ def make_negatives_list(in_file, out_file, fasta_dir):
             acc_list.append({"Accession": seq_accesion, "Metadata": metadata_list})
         assay_fails = { "Assay": this_assay, "Accession_List": acc_list}
         assays_list.append(assay_fails)
+    if header_index is not None:
+        header_index.close()
 
     print("Writing {}...".format(out_file))
     with open(out_file, 'w') as write_file:
@@ -16,8 +16,9 @@ This script generates files necessary for the pipeline-downstream module
     all the sequences in the location indicated.  If "--use_genbank_data" is
     indicated then it will be assumed that multiple fasta files (with .fna
     affix) for each individual sequence will be present in the indicated 
-    directory.  In this case, these files will be assembled into a single
-    large fasta.  If the "--use_tax_tree" option is indicated, it will be 
+    directory, or a genome store (genome_store/, as written by
+    am_download.py) within it.  In this case, these genomes will be
+    assembled into a single large fasta.  If the "--use_tax_tree" option is indicated, it will be 
     assumed that there is a directory-based taxonomic tree with its root at
     the location indicated.  The reponse to this has not yet been implemented.
     
@@ -35,6 +36,7 @@ Dependencies:
     seq_db_filter_funx.py
     config_prep.py
     gbk_file_prep.py
+    genome_store.py
     
     
 This script requires the following arguments:
@@ -90,6 +92,10 @@ This script has the following optional arguments:
     [--best_match]
             If set, only save the best match, in Tm, between a query and target.
 
+    (-p [INT], --procnum [INT])
+            Number of processors to use for filtering GenBank fasta files.
+            Default is the number of CPUs.
+
     [--tntblast_location [STR]]
             path to tntblast if system can't find it
 
@@ -100,8 +106,10 @@ import sys
 import time
 import global_txt
 import config_prep
+import fasta_index as fidx
 import gbk_file_prep
 import argparse as ap
+import multiprocessing as mp
 
 ''' Methods '''
 
@@ -145,10 +153,12 @@ def create_filename_namespace(args):
 def prep_sequence_file(args, filenames_ns):
     
     if args.use_gisaid_data:
-        print("...Using GISAID single download file.  No prep necessary")
+        print("...Using GISAID single download file.  Indexing headers")
+        fidx.build_fasta_index(filenames_ns.combined_fasta)
         
     elif args.use_genbank_data:
-        gbk_file_prep.prep_gbk(filenames_ns, args.minimum_target_length)
+        gbk_file_prep.prep_gbk(filenames_ns, args.minimum_target_length,
+                               args.procnum)
         
     elif args.use_tax_tree:
         print("Tax tree directory:", args.use_tax_tree)
@@ -199,6 +209,10 @@ def get_arguments():
                         required=True, help="location of fasta files")
     parser.add_argument('-t', '--tnt_results_directory', metavar='[STR]', type=str,
                         required=True, help="location of tnt results")
+    parser.add_argument('-p', '--procnum', metavar='[INT]', type=int,
+                        default=mp.cpu_count(), help="Number of processors " +
+                        "to use for filtering GenBank fasta files. " +
+                        "Default is the number of CPUs.")
     parser.add_argument('--tntblast_location', metavar='[STR]', type=str,
                         help="path to tntblast if system can't find it")
     return parser.parse_args()
@@ -6,9 +6,13 @@ import json
 import logging
 from PhyHeatmap import PhyXML, Metadata
 from AssayResult import AssayResult
+import assay_partitions as aparts
 
 __version__='0.0.12'
 
+# Cached heatmap rows, kept apart from assay_monitor.py's partitions
+heatmap_partition_dirname = "heatmap_partitions"
+
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s [%(levelname)s] %(message)s',
@@ -41,7 +45,13 @@ def parse_params():
 
     p.add_argument('-r', '--resultjson',
                    metavar='[FILE]', type=str, required=False,
-                   help="Assay results in JSON format")
+                   help="Assay results store directory (or JSON file)")
+
+    p.add_argument('-P', '--assay_partitions',
+                   action='store_true', default=False,
+                   help="Reuse the heatmap rows of unchanged assays " +
+                   "(cached in heatmap_partitions/ next to the output XML); " +
+                   "needs the match table from assay_monitor.py -P")
 
     p.add_argument('-ncb', '--not-collapse-by-branch',
                    action='store_true', default=False, dest='ncb',
@@ -92,7 +102,33 @@ def main():
 
     # prepare graphics dom
     # title = os.path.basename(argvs.primer)
-    g_dom = phyxml.add_graph_validation_heatmap(argvs.primer, "Validation result")
+    partition_cache = None
+    if argvs.assay_partitions:
+        # Rows depend on the assay and on the inputs of assay_monitor.py's
+        # partitions (next to the match table), as its summary tallies do
+        results_partition_dir = os.path.join(
+            os.path.dirname(argvs.primer), aparts.partition_dirname)
+        if not os.path.isfile(os.path.join(results_partition_dir,
+                                           aparts.manifest_filename)):
+            logging.info("No assay partitions next to the match table; "
+                         "transforming every heatmap row")
+        else:
+            results_cache = aparts.PartitionCache(results_partition_dir)
+            with open(argvs.primer, 'r') as read_file:
+                genome_columns = read_file.readline()
+            partition_cache = aparts.PartitionCache(
+                os.path.join(os.path.dirname(argvs.outfile),
+                             heatmap_partition_dirname),
+                aparts.hash_values([results_cache.source_key,
+                                    genome_columns]))
+            partition_cache.save()
+    if partition_cache is not None:
+        assay_keys = { name: key for name, key, _
+                       in aparts.read_assays(argvs.assayseq) }
+        g_dom = phyxml.add_graph_validation_heatmap(
+            argvs.primer, "Validation result", partition_cache, assay_keys)
+    else:
+        g_dom = phyxml.add_graph_validation_heatmap(argvs.primer, "Validation result")
     g_dom_list.append(g_dom)
 
     logging.info("Adding graphics...")
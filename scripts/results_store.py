@@ -0,0 +1,469 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 09:12:51 2026
+
+Columnar on-disk store for assay results (replaces the monolithic
+    Assay_Results.json between stages).
+
+    A store is a directory.  Each column is a NumPy array saved as its
+    own .npy file and opened memory-mapped, so a stage only pages in the
+    columns it uses.
+
+    False Negatives that only carry an accession (the int arrays of a
+    NegativesList) are kept as the int32 "negatives" accession column
+    alone.  Every other entry is a hit row; hit rows are assay by assay,
+    True Positives first, then the remaining False Negatives.
+
+    The summary columns of hit rows (mismatches, gaps, tm, dG, amplicon
+    range) are typed numeric arrays.  So that a store reads back to
+    exactly the Full_Dict that was written, every leaf of a hit dict also
+    gets a field column, stored sparsely: the hit rows that have the
+    leaf, a type code array (str, None, {}, [], int, float, bool) and a
+    string column (one bytes file plus an offsets array) of its values.
+
+    meta.json holds the assay names, the accession table the accession
+    columns index into, the key path of each field column, per assay hit
+    row and negatives ranges and the timestamp.
+"""
+import os
+import json
+import numpy as np
+from array import array
+from accession_index import AccessionIndex, NegativesList
+
+
+''' 'Global' Variables '''
+# Dictionary Labels
+assay = "Assay"
+assay_name = "Name"
+FP = "Forward Primer"
+RP = "Reverse Primer"
+Pr = "Probe"
+positives_type = "True Positives"
+negatives_type = "False Negatives"
+result_types = (positives_type, negatives_type)
+
+# Store files
+meta_filename = "meta.json"
+store_suffix = ".store"
+
+# Numeric columns: name -> dtype.  Missing values are -1 (int) or nan.
+numeric_columns = {
+    "assay": np.int16,
+    "accession": np.int32,
+    "status": np.int8,
+    "fp_mismatches": np.int16,
+    "rp_mismatches": np.int16,
+    "pr_mismatches": np.int16,
+    "fp_gaps": np.int16,
+    "rp_gaps": np.int16,
+    "pr_gaps": np.int16,
+    "fp_tm": np.float32,
+    "rp_tm": np.float32,
+    "pr_tm": np.float32,
+    "fp_dG": np.float32,
+    "rp_dG": np.float32,
+    "pr_dG": np.float32,
+    "amplicon_start": np.int32,
+    "amplicon_end": np.int32,
+}
+
+# Accession column of the accession-only False Negatives
+negatives_column = "negatives"
+negatives_filename = negatives_column + ".npy"
+
+# Field columns: <field_prefix><number>, with the key path in meta
+field_prefix = "field"
+rows_suffix = ".rows.npy"
+types_suffix = ".types.npy"
+
+# Field type codes
+str_type = 1
+none_type = 2
+empty_dict_type = 3
+empty_list_type = 4
+int_type = 5
+float_type = 6
+bool_type = 7
+
+
+''' Methods '''
+
+def is_results_store(path):
+    return os.path.isfile(os.path.join(path, meta_filename))
+
+
+def to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return -1
+
+
+def to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def hit_fields(hit):
+    ''' Pull the columnar fields out of one hit dict '''
+    values = hit.get("Values", {})
+    thermo = hit.get("Thermo", {})
+    amp_range = hit.get("Composition", {}).get("amplicon range", [None, None])
+
+    return [
+        to_int(values.get(FP, {}).get("mismatches")),
+        to_int(values.get(RP, {}).get("mismatches")),
+        to_int(values.get(Pr, {}).get("mismatches")),
+        to_int(values.get(FP, {}).get("gaps")),
+        to_int(values.get(RP, {}).get("gaps")),
+        to_int(values.get(Pr, {}).get("gaps")),
+        to_float(values.get(FP, {}).get("tm")),
+        to_float(values.get(RP, {}).get("tm")),
+        to_float(values.get(Pr, {}).get("tm")),
+        to_float(thermo.get(FP, {}).get("dG")),
+        to_float(thermo.get(RP, {}).get("dG")),
+        to_float(thermo.get(Pr, {}).get("dG")),
+        to_int(amp_range[0]),
+        to_int(amp_range[1]),
+    ]
+
+
+def flatten_value(value, path):
+    ''' (key path, type code, string) of each leaf of a hit value; list
+        indices in a path are ints, dict keys strs '''
+    if isinstance(value, dict):
+        if not value:
+            yield path, empty_dict_type, ""
+        for key, item in value.items():
+            yield from flatten_value(item, path + (key,))
+    elif isinstance(value, list):
+        if not value:
+            yield path, empty_list_type, ""
+        for index, item in enumerate(value):
+            yield from flatten_value(item, path + (index,))
+    elif value is None:
+        yield path, none_type, ""
+    elif isinstance(value, bool):
+        yield path, bool_type, str(value)
+    elif isinstance(value, int):
+        yield path, int_type, str(value)
+    elif isinstance(value, float):
+        yield path, float_type, repr(value)
+    else:
+        yield path, str_type, str(value)
+
+
+def flatten_hit(hit):
+    ''' Leaves of a hit dict, except its accession (the accession column) '''
+    for key, value in hit.items():
+        if key != "Accession":
+            yield from flatten_value(value, (key,))
+
+
+def decode_value(type_code, string):
+    if type_code == str_type:
+        return string
+    if type_code == int_type:
+        return int(string)
+    if type_code == float_type:
+        return float(string)
+    if type_code == bool_type:
+        return string == "True"
+    if type_code == empty_dict_type:
+        return {}
+    if type_code == empty_list_type:
+        return []
+    return None
+
+
+def set_path(hit, path, value):
+    ''' Set value at a key path of hit, adding the dicts and lists on
+        the way '''
+    node = hit
+    for depth, key in enumerate(path):
+        if depth + 1 == len(path):
+            child = value
+        elif isinstance(path[depth + 1], int):
+            child = []
+        else:
+            child = {}
+        if isinstance(node, list):
+            node.extend([None] * (key + 1 - len(node)))
+            if node[key] is None:
+                node[key] = child
+            node = node[key]
+        else:
+            node = node.setdefault(key, child)
+
+
+def get_field_name(field_num):
+    return "{}{:04d}".format(field_prefix, field_num)
+
+
+def add_field_value(fields, path, hit_row, type_code, string):
+    ''' Append a value to the (sparse) field column of a key path '''
+    field = fields.get(path)
+    if field is None:
+        field = fields[path] = (array('q'), array('b'), array('q', [0]),
+                                bytearray())
+    rows, type_codes, offsets, blob = field
+    rows.append(hit_row)
+    type_codes.append(type_code)
+    blob += string.encode()
+    offsets.append(len(blob))
+
+
+def write_field_columns(fields, store_dir):
+    ''' Write each field column: hit rows, type codes and a string
+        column (one bytes file plus an offsets array) '''
+    for field_num, (rows, type_codes, offsets, blob) in enumerate(
+            fields.values()):
+        name = get_field_name(field_num)
+        np.save(os.path.join(store_dir, name + rows_suffix),
+                np.frombuffer(rows, dtype=np.int64))
+        np.save(os.path.join(store_dir, name + types_suffix),
+                np.frombuffer(type_codes, dtype=np.int8))
+        np.save(os.path.join(store_dir, name + ".offsets.npy"),
+                np.frombuffer(offsets, dtype=np.int64))
+        with open(os.path.join(store_dir, name + ".bin"), 'wb') as write_file:
+            write_file.write(blob)
+
+
+def split_negatives(hits, accession_idx):
+    ''' (accession column values of the leading accession-only entries,
+        the remaining entries) of a False Negatives list '''
+    if isinstance(hits, NegativesList):
+        return hits.idx, hits.extra
+
+    num_plain = 0
+    for hit in hits:
+        if len(hit) != 1 or hit.get("Accession") is None:
+            break
+        num_plain += 1
+    acc_nums = [ accession_idx.setdefault(hit["Accession"], len(accession_idx))
+                 for hit in hits[:num_plain] ]
+    return np.array(acc_nums, dtype=np.int32), hits[num_plain:]
+
+
+def write_results_store(Full_Dict, store_dir):
+    ''' Write Full_Dict to a columnar results store directory '''
+    print("\nWriting results store", store_dir)
+    os.makedirs(store_dir, exist_ok=True)
+
+    assay_names = []
+    accession_idx = {}
+    row_ranges = {result_type: [] for result_type in result_types}
+    negative_ranges = []
+
+    columns = {name: [] for name in numeric_columns}
+    # Key path -> (hit rows, type codes, offsets, bytes) of its values
+    fields = {}
+    negatives = []
+    num_negatives = 0
+    hit_columns = list(numeric_columns)[3:]
+    row = 0
+
+    # Seed with the shared accession index so NegativesList int arrays
+    # are already accession column values
+    for assay_dict in Full_Dict[assay]:
+        assay_negatives = assay_dict.get(negatives_type)
+        if isinstance(assay_negatives, NegativesList):
+            accession_idx = dict(assay_negatives.accession_index.index)
+            break
+
+    for assay_num, assay_dict in enumerate(Full_Dict[assay]):
+        assay_names.append(assay_dict[assay_name])
+
+        for result_type in result_types:
+            status = int(result_type == positives_type)
+            start = row
+            hits = assay_dict[result_type]
+            if result_type == negatives_type:
+                # Accession-only negatives are just the accession column
+                acc_nums, hits = split_negatives(hits, accession_idx)
+                negatives.append(np.asarray(acc_nums, dtype=np.int32))
+                negative_ranges.append(
+                    [num_negatives, num_negatives + len(acc_nums)])
+                num_negatives += len(acc_nums)
+            for hit in hits:
+                accession = hit.get("Accession")
+                if accession is None:
+                    acc_num = -1
+                else:
+                    acc_num = accession_idx.setdefault(
+                        accession, len(accession_idx))
+
+                columns["assay"].append(assay_num)
+                columns["accession"].append(acc_num)
+                columns["status"].append(status)
+                for name, value in zip(hit_columns, hit_fields(hit)):
+                    columns[name].append(value)
+
+                for path, type_code, string in flatten_hit(hit):
+                    add_field_value(fields, path, row, type_code, string)
+                row += 1
+            row_ranges[result_type].append([start, row])
+
+    for name, dtype in numeric_columns.items():
+        np.save(os.path.join(store_dir, name + ".npy"),
+                np.array(columns[name], dtype=dtype))
+    np.save(os.path.join(store_dir, negatives_filename),
+            np.concatenate(negatives + [np.zeros(0, dtype=np.int32)]))
+    write_field_columns(fields, store_dir)
+
+    meta = {
+        "assays": assay_names,
+        "accessions": list(accession_idx),
+        "fields": [ list(path) for path in fields ],
+        "rows": row_ranges,
+        "negatives": negative_ranges,
+        "num_rows": row,
+        "num_negatives": num_negatives,
+        "Timestamp": Full_Dict.get("Timestamp", ""),
+    }
+    with open(os.path.join(store_dir, meta_filename), 'w') as write_file:
+        json.dump(meta, write_file)
+
+    print("Wrote store:", store_dir)
+
+
+class StringColumn(object):
+    """ Read-only view of a string column in a results store.
+
+    :param store_dir: The results store directory
+    :type store_dir: str
+    :param name: The column name
+    :type name: str
+    """
+
+    def __init__(self, store_dir, name):
+        self.offsets = np.load(
+            os.path.join(store_dir, name + ".offsets.npy"), mmap_mode='r')
+        blob_file = os.path.join(store_dir, name + ".bin")
+        if os.path.getsize(blob_file):
+            self.blob = np.memmap(blob_file, dtype=np.uint8, mode='r')
+        else:
+            self.blob = np.zeros(0, dtype=np.uint8)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def get_bytes(self, row):
+        return self.blob[self.offsets[row]:self.offsets[row + 1]].tobytes()
+
+    def __getitem__(self, row):
+        return self.get_bytes(row).decode()
+
+    def get_range(self, start, end):
+        ''' Strings of rows start to end, from one read of the blob '''
+        offsets = self.offsets[start:end + 1].tolist()
+        if not offsets:
+            return []
+        blob = self.blob[offsets[0]:offsets[-1]].tobytes()
+        base = offsets[0]
+        return [ blob[offsets[i] - base:offsets[i + 1] - base].decode()
+                 for i in range(end - start) ]
+
+
+def load_columns(store_dir):
+    ''' Open a results store; columns are memory-mapped, not read '''
+    with open(os.path.join(store_dir, meta_filename)) as read_file:
+        meta = json.load(read_file)
+
+    columns = {
+        name: np.load(os.path.join(store_dir, name + ".npy"), mmap_mode='r')
+        for name in numeric_columns
+    }
+    columns[negatives_column] = np.load(
+        os.path.join(store_dir, negatives_filename), mmap_mode='r')
+    for field_num in range(len(meta["fields"])):
+        name = get_field_name(field_num)
+        for suffix in (rows_suffix, types_suffix):
+            columns[name + suffix] = np.load(
+                os.path.join(store_dir, name + suffix), mmap_mode='r')
+        columns[name] = StringColumn(store_dir, name)
+
+    return meta, columns
+
+
+def count_results(meta, result_type, assay_num):
+    ''' Number of results of a type for an assay '''
+    start, end = meta["rows"][result_type][assay_num]
+    count = end - start
+    if result_type == negatives_type:
+        neg_start, neg_end = meta["negatives"][assay_num]
+        count += neg_end - neg_start
+    return count
+
+
+def get_records(meta, columns, start, end):
+    ''' Rebuild the hit dicts stored at hit rows start to end '''
+    hits = [ {} for row in range(start, end) ]
+
+    for field_num, path in enumerate(meta["fields"]):
+        name = get_field_name(field_num)
+        field_rows = columns[name + rows_suffix]
+        first, last = np.searchsorted(field_rows, [start, end]).tolist()
+        if first == last:
+            continue
+        strings = columns[name].get_range(first, last)
+        for hit_row, type_code, string in zip(
+                field_rows[first:last].tolist(),
+                columns[name + types_suffix][first:last].tolist(), strings):
+            set_path(hits[hit_row - start], path,
+                     decode_value(type_code, string))
+
+    accessions = meta["accessions"]
+    for hit, acc_num in zip(
+            hits, columns["accession"][start:end].tolist()):
+        hit["Accession"] = accessions[acc_num] if acc_num >= 0 else None
+
+    return hits
+
+
+def get_negatives(meta, columns, assay_num, accession_index):
+    ''' False Negatives of an assay: a NegativesList over its accession
+        column, with its hits as the appended entries '''
+    neg_start, neg_end = meta["negatives"][assay_num]
+    # Copied out of the map, as the store may be rewritten in place
+    negatives = NegativesList(accession_index, np.array(
+        columns[negatives_column][neg_start:neg_end], dtype=np.int32))
+    start, end = meta["rows"][negatives_type][assay_num]
+    negatives.extend(get_records(meta, columns, start, end))
+    return negatives
+
+
+def read_results_store(store_dir, result_types=result_types):
+    ''' Read a results store back into a Full_Dict '''
+    meta, columns = load_columns(store_dir)
+    accession_index = AccessionIndex(meta["accessions"])
+
+    assay_list = []
+    for assay_num, name in enumerate(meta["assays"]):
+        assay_dict = {assay_name: name}
+        if positives_type in result_types:
+            start, end = meta["rows"][positives_type][assay_num]
+            assay_dict[positives_type] = get_records(
+                meta, columns, start, end)
+        else:
+            assay_dict[positives_type] = []
+        if negatives_type in result_types:
+            assay_dict[negatives_type] = get_negatives(
+                meta, columns, assay_num, accession_index)
+        else:
+            assay_dict[negatives_type] = []
+        assay_list.append(assay_dict)
+
+    return {assay: assay_list, "Timestamp": meta["Timestamp"]}
+
+
+def load_results(results_path, result_types=result_types):
+    ''' Load Full_Dict from a results store or a legacy JSON file '''
+    if is_results_store(results_path):
+        return read_results_store(results_path, result_types)
+    with open(results_path) as json_file:
+        return json.load(json_file)
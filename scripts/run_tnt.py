@@ -11,6 +11,37 @@ This script is a basic wrapper for ThermonucleotideBLAST (TNTBLAST).
     config file).  This will be modified to receive files from upstream 
     in the BioAI pipline at some point.
 
+    The combined sequence file is split into contiguous shards and
+    tntblast is run on the shards in parallel, each as a managed
+    subprocess: progress lines are streamed with the shard name, exit
+    codes are checked and failed shards are rerun.  The per-shard
+    outputs are then merged into the single results file the parser
+    expects, with the hits of each assay in one block, in shard order.
+
+    Optional arguments:
+        '-p', '--procnum'       tntblast processes to run at once
+                                (default: number of CPUs)
+        '-n', '--num_shards'    shards to split the sequence file into
+                                (default: procnum; 1 runs unsharded)
+        '--retries'             reruns of a failed shard (default: 2)
+        '-k', '--keep_shards'   keep shard fastas and outputs
+        '-P', '--assay_partitions'
+                                cache the output of each assay in the
+                                "assay_partitions" directory of the tnt
+                                results directory (see assay_partitions.py)
+                                and run only new or modified assays
+        '-D', '--dedup'         run tntblast on one genome per distinct
+                                sequence; the members of each
+                                representative are listed in
+                                <results>_members.json for the parser
+                                (see genome_dedup.py)
+        '-W', '--amplicon_windows'
+                                run tntblast, per assay, on a window
+                                around the amplicon region of each genome
+                                rather than the whole genome; genomes
+                                without a window are searched in full
+                                (see amplicon_windows.py)
+
 
 This script calls ThermonucleotideBLAST (TNTBLAST) which was created by 
     Jason Gans at Los Alamos National Laboratory with the BSD 3-Clause 
@@ -58,10 +89,25 @@ CDC-2019-nCoV_N1 GACCCCAAAATCAGCGAAAT TCTGGTTACTGCCAGTTGAATCTG \
 import os
 import sys
 import time
+import shutil
+import subprocess
 import argparse as ap
+import multiprocessing as mp
+from multiprocessing.pool import ThreadPool
+import assay_partitions as aparts
+import amplicon_windows as awin
+import genome_dedup as gdedup
 import variable_config as var_conf 
 
 
+''' 'Global' Variables '''
+# Separator written before each assay block of merged tnt output
+tnt_separator = b"#" * 85 + b"\n"
+
+# Size of copies between shard and merged files (bytes)
+copy_chunk_size = 1 << 22
+
+
 ''' Methods '''
 
 def create_filename_namespace(var_conf):
@@ -72,6 +118,10 @@ def create_filename_namespace(var_conf):
     filenames_ns.results_dir = var_conf.results_directory
     filenames_ns.tnt_dir = var_conf.tnt_results_directory
     filenames_ns.fasta_dir = var_conf.fasta_directory
+    filenames_ns.shard_dir = os.path.join(
+        var_conf.tnt_results_directory, "shards")
+    filenames_ns.partition_dir = os.path.join(
+        var_conf.tnt_results_directory, aparts.partition_dirname)
     
     # Files
     filenames_ns.assay_file = var_conf.assay_file
@@ -80,60 +130,468 @@ def create_filename_namespace(var_conf):
     return filenames_ns
 
 
-def prep_tnt_command(path_ns, var_ns):
-    
-    assay_file_arg = " -i {}".format(path_ns.assay_file)
-    seq_file_arg = " -d {}".format(path_ns.combined_fasta)
-    
+def get_tnt_results_path(path_ns):
     seq_file_prefix = path_ns.combined_fasta.split(".")[0]
     seq_acc = seq_file_prefix.split("/")[-1]
     tnt_results_file = "{}_results.out".format(seq_acc)
-    tnt_results_path = os.path.join(path_ns.tnt_dir, tnt_results_file)
-    output = " -o {}".format(tnt_results_path)
-    
-    runline_fields = []
-    runline_fields.append(os.path.join(var_ns.tntblast_location, "tntblast") 
-                            if var_ns.tntblast_location else "tntblast")
-    runline_fields.append(" -A {}".format(var_ns.assay_type) 
-                            if var_ns.assay_type else "")
-    runline_fields.append(assay_file_arg)
-    runline_fields.append(seq_file_arg)
-    runline_fields.append(" -e {}".format(var_ns.min_primer_Tm) 
-                            if var_ns.min_primer_Tm else "")
-    runline_fields.append(" -E {}".format(var_ns.min_probe_Tm) 
-                            if var_ns.min_probe_Tm else "")
-    runline_fields.append(" -l {}".format(var_ns.max_amplicon_length) 
-                            if var_ns.max_amplicon_length else "")
-    runline_fields.append(output)
-    runline_fields.append(" --best-match" if var_ns.best_match else "")
-
-    tnt_runline = "".join(runline_fields)
-
-    # return tnt_runline, tnt_results_path
-    return tnt_runline
-
-
-def run_tntblast_cmd(tnt_runline):
-    os.system("{}".format(tnt_runline))
-
-
-def run_tntblast(path_ns, var_ns):
-
-    tnt_runline = prep_tnt_command(path_ns, var_ns)
-    run_tntblast_cmd(tnt_runline)
-
-
-    # tnt_results_list = []
-    # tnt_runline, tnt_results = prep_tnt_command(path_ns, var_ns)
-    # run_tntblast_cmd(tnt_runline)
-    # tnt_results_list.append(tnt_results)
-    
-    # ''' ############### Output TNT Results List ################## '''
-    # if args.use_gisaid_data:
-    #     with open(tnt_results_list_file, 'w') as write_file:
-    #         for line in tnt_results_list:
-    #             print(line, file=write_file)
-    return
+    return os.path.join(path_ns.tnt_dir, tnt_results_file)
+
+
+def prep_tnt_command(path_ns, var_ns, seq_file=None, tnt_results_path=None):
+    ''' tntblast argument list; defaults to the whole combined fasta '''
+    if seq_file is None:
+        seq_file = path_ns.combined_fasta
+    if tnt_results_path is None:
+        tnt_results_path = get_tnt_results_path(path_ns)
+
+    tnt_args = []
+    tnt_args.append(os.path.join(var_ns.tntblast_location, "tntblast") 
+                    if var_ns.tntblast_location else "tntblast")
+    if var_ns.assay_type:
+        tnt_args += ["-A", str(var_ns.assay_type)]
+    tnt_args += ["-i", path_ns.assay_file]
+    tnt_args += ["-d", seq_file]
+    if var_ns.min_primer_Tm:
+        tnt_args += ["-e", str(var_ns.min_primer_Tm)]
+    if var_ns.min_probe_Tm:
+        tnt_args += ["-E", str(var_ns.min_probe_Tm)]
+    if var_ns.max_amplicon_length:
+        tnt_args += ["-l", str(var_ns.max_amplicon_length)]
+    tnt_args += ["-o", tnt_results_path]
+    if var_ns.best_match:
+        tnt_args.append("--best-match")
+
+    return tnt_args
+
+
+def copy_byte_range(read_handle, write_handle, start, end):
+    read_handle.seek(start)
+    remaining = end - start
+    while remaining > 0:
+        chunk = read_handle.read(min(copy_chunk_size, remaining))
+        if not chunk:
+            break
+        write_handle.write(chunk)
+        remaining -= len(chunk)
+
+
+def find_fasta_shard_ranges(fasta_file, num_shards):
+    ''' Split fasta into contiguous byte ranges starting on records '''
+    file_size = os.path.getsize(fasta_file)
+    offsets = [0]
+
+    with open(fasta_file, 'rb') as file_handle:
+        for i in range(1, num_shards):
+            target = int(i * file_size / num_shards)
+            if target <= offsets[-1]:
+                continue
+
+            # Move to start of next full line, then to next header
+            file_handle.seek(target)
+            position = target + len(file_handle.readline())
+            while line := file_handle.readline():
+                if line.startswith(b">"):
+                    break
+                position += len(line)
+
+            if offsets[-1] < position < file_size:
+                offsets.append(position)
+
+    offsets.append(file_size)
+    return list(zip(offsets[:-1], offsets[1:]))
+
+
+def write_fasta_shards(fasta_file, shard_dir, num_shards):
+    ''' Write contiguous shards of fasta_file; returns shard paths '''
+    os.makedirs(shard_dir, exist_ok=True)
+    seq_acc = os.path.basename(fasta_file).split(".")[0]
+
+    shard_files = []
+    with open(fasta_file, 'rb') as read_handle:
+        shard_ranges = find_fasta_shard_ranges(fasta_file, num_shards)
+        for shard_num, (start, end) in enumerate(shard_ranges):
+            shard_file = os.path.join(
+                shard_dir, "{}_shard{:04d}.fasta".format(seq_acc, shard_num))
+            with open(shard_file, 'wb') as write_handle:
+                copy_byte_range(read_handle, write_handle, start, end)
+            shard_files.append(shard_file)
+
+    print("Wrote {} fasta shards to {}".format(len(shard_files), shard_dir))
+    return shard_files
+
+
+def run_tntblast_cmd(tnt_args, label="tntblast"):
+    ''' Run tntblast, streaming its progress lines; returns exit code '''
+    try:
+        process = subprocess.Popen(
+            tnt_args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+            text=True, bufsize=1)
+    except OSError as error:
+        print("[{}] Could not start tntblast: {}".format(label, error))
+        return -1
+
+    for line in process.stdout:
+        print("[{}] {}".format(label, line.rstrip()), flush=True)
+
+    return process.wait()
+
+
+def run_tnt_shard(argument):
+    ''' Run tntblast on one shard, retrying failed runs '''
+    tnt_args, tnt_results_path, label, retries = argument
+
+    for attempt in range(1 + retries):
+        if os.path.exists(tnt_results_path):
+            os.remove(tnt_results_path)
+
+        return_code = run_tntblast_cmd(tnt_args, label)
+        if return_code == 0 and os.path.isfile(tnt_results_path):
+            print("[{}] Finished".format(label), flush=True)
+            return label, 0
+
+        print("[{}] Failed with exit code {} (attempt {} of {})".format(
+            label, return_code, attempt + 1, 1 + retries), flush=True)
+
+    return label, return_code
+
+
+def get_assay_order(assay_file):
+    assay_order = []
+    with open(assay_file, 'r') as read_file:
+        for line in read_file:
+            fields = line.split()
+            if fields:
+                assay_order.append(fields[0])
+    return assay_order
+
+
+def find_tnt_assay_segments(tnt_file):
+    ''' Byte ranges of runs of hits of the same assay in a tnt file '''
+    segments = []
+    current_assay = None
+    start = 0
+    position = 0
+
+    with open(tnt_file, 'rb') as file_handle:
+        for line in file_handle:
+            if line.startswith(b"#####"):
+                if current_assay is not None:
+                    segments.append((current_assay, start, position))
+                current_assay = None
+            elif line.startswith(b"name = "):
+                assay_name = line.split(b"=", 1)[1].strip().decode()
+                if assay_name != current_assay:
+                    if current_assay is not None:
+                        segments.append((current_assay, start, position))
+                    current_assay = assay_name
+                    start = position
+            position += len(line)
+
+    if current_assay is not None:
+        segments.append((current_assay, start, position))
+
+    return segments
+
+
+def copy_tnt_segment(read_handle, write_handle, start, end):
+    copy_byte_range(read_handle, write_handle, start, end)
+
+    # Hits end with a blank line; keep it across joins
+    read_handle.seek(max(start, end - 2))
+    if not read_handle.read(2).endswith(b"\n\n"):
+        write_handle.write(b"\n")
+
+
+def merge_tnt_outputs(shard_results, tnt_results_path, assay_order):
+    ''' Merge per-shard tnt outputs into one file, one block per assay '''
+    assay_segments = {assay: [] for assay in assay_order}
+    for shard_result in shard_results:
+        for assay_name, start, end in find_tnt_assay_segments(shard_result):
+            assay_segments.setdefault(assay_name, []).append(
+                (shard_result, start, end))
+
+    read_handles = {}
+    with open(tnt_results_path, 'wb') as write_handle:
+        for assay_name, segments in assay_segments.items():
+            if not segments:
+                continue
+            write_handle.write(tnt_separator)
+            for shard_result, start, end in segments:
+                if shard_result not in read_handles:
+                    read_handles[shard_result] = open(shard_result, 'rb')
+                copy_tnt_segment(
+                    read_handles[shard_result], write_handle, start, end)
+
+    for read_handle in read_handles.values():
+        read_handle.close()
+
+    print("Wrote merged tnt results:", tnt_results_path)
+
+
+def run_tntblast(path_ns, var_ns, procnum=1, num_shards=None, retries=2,
+                 keep_shards=False, tnt_results_path=None):
+    ''' Run tntblast over fasta shards in parallel and merge the output '''
+    if tnt_results_path is None:
+        tnt_results_path = get_tnt_results_path(path_ns)
+    if num_shards is None:
+        num_shards = procnum
+
+    if num_shards <= 1:
+        tnt_args = prep_tnt_command(path_ns, var_ns, None, tnt_results_path)
+        shard_status = [ run_tnt_shard(
+            (tnt_args, tnt_results_path, "tntblast", retries)) ]
+    else:
+        shard_files = write_fasta_shards(
+            path_ns.combined_fasta, path_ns.shard_dir, num_shards)
+        shard_results = [ "{}_results.out".format(shard_file.rsplit(".", 1)[0])
+                          for shard_file in shard_files ]
+
+        gen_of_shard_runs = (
+            (prep_tnt_command(path_ns, var_ns, shard_file, shard_result),
+             shard_result,
+             os.path.basename(shard_file).rsplit(".", 1)[0],
+             retries)
+            for shard_file, shard_result in zip(shard_files, shard_results)
+        )
+
+        # tntblast does the work; threads only wait on the subprocesses
+        print("Running tntblast on {} shards with {} processes...".format(
+            len(shard_files), procnum))
+        pool = ThreadPool(processes=procnum)
+        shard_status = pool.map_async(run_tnt_shard, gen_of_shard_runs).get()
+        pool.close()
+        pool.join()
+
+    failed_shards = [ label for label, return_code in shard_status
+                      if return_code != 0 ]
+    if failed_shards:
+        raise RuntimeError("tntblast failed on: {}".format(
+            ", ".join(failed_shards)))
+
+    if num_shards > 1:
+        merge_tnt_outputs(shard_results, tnt_results_path,
+                          get_assay_order(path_ns.assay_file))
+        if not keep_shards:
+            shutil.rmtree(path_ns.shard_dir)
+
+    return tnt_results_path
+
+
+def write_window_fastas(fasta_file, window_dir, assay_anchor_list,
+                        max_amplicon_length, procnum=1):
+    ''' Write the window fasta of each windowed assay, extracting windows
+        from fasta shards in parallel; returns the window fasta of each
+        assay and its count of genomes without a window '''
+    os.makedirs(window_dir, exist_ok=True)
+    shard_ranges = find_fasta_shard_ranges(fasta_file, procnum)
+    arguments = [ (fasta_file, start, end, shard_num, window_dir,
+                   assay_anchor_list, max_amplicon_length)
+                  for shard_num, (start, end) in enumerate(shard_ranges) ]
+
+    pool = mp.Pool(processes=procnum)
+    shard_windows = pool.map_async(awin.extract_windows, arguments).get()
+    pool.close()
+    pool.join()
+
+    assay_windows = {}
+    for assay_num, anchors in assay_anchor_list:
+        window_fasta = os.path.join(
+            window_dir, "assay{:04d}.fasta".format(assay_num))
+        full_count = 0
+        with open(window_fasta, 'wb') as write_handle:
+            for shard_num, full_counts in enumerate(shard_windows):
+                part_file = awin.get_part_path(window_dir, assay_num, shard_num)
+                with open(part_file, 'rb') as read_handle:
+                    shutil.copyfileobj(read_handle, write_handle,
+                                       copy_chunk_size)
+                os.remove(part_file)
+                full_count += full_counts[assay_num]
+        assay_windows[assay_num] = (window_fasta, full_count)
+
+    return assay_windows
+
+
+def run_tntblast_windows(path_ns, var_ns, procnum=1, num_shards=None,
+                         retries=2, keep_shards=False, tnt_results_path=None):
+    ''' Run tntblast on each assay's amplicon windows (see
+        amplicon_windows.py) instead of whole genomes, and merge the
+        output with ranges in genome coordinates '''
+    if tnt_results_path is None:
+        tnt_results_path = get_tnt_results_path(path_ns)
+    window_dir = os.path.join(path_ns.tnt_dir, awin.window_dirname)
+    assays = aparts.read_assays(path_ns.assay_file)
+
+    assay_anchor_list = []
+    for assay_num, (assay_name, _, line) in enumerate(assays):
+        anchors = awin.assay_anchors(line)
+        if anchors is None:
+            print("Assay {} can not be windowed; searching whole " \
+                  "genomes".format(assay_name))
+        else:
+            assay_anchor_list.append((assay_num, anchors))
+
+    print("Extracting amplicon windows of {} assays...".format(
+        len(assay_anchor_list)))
+    assay_windows = write_window_fastas(
+        path_ns.combined_fasta, window_dir, assay_anchor_list,
+        var_ns.max_amplicon_length, procnum)
+
+    assay_results = []
+    for assay_num, (assay_name, _, line) in enumerate(assays):
+        assay_ns = ap.Namespace(**vars(path_ns))
+        assay_prefix = os.path.join(window_dir, "assay{:04d}".format(assay_num))
+        assay_ns.assay_file = assay_prefix + ".txt"
+        assay_ns.shard_dir = assay_prefix + "_shards"
+        window_fasta, full_count = assay_windows.get(
+            assay_num, (path_ns.combined_fasta, 0))
+        assay_ns.combined_fasta = window_fasta
+        if full_count:
+            print("{} genomes without an amplicon window for assay {}".format(
+                full_count, assay_name))
+        with open(assay_ns.assay_file, 'w') as write_file:
+            write_file.write(line)
+
+        print("Running tntblast for assay {}...".format(assay_name))
+        assay_result = run_tntblast(assay_ns, var_ns, procnum, num_shards,
+                                    retries, keep_shards,
+                                    assay_prefix + "_results.out")
+        assay_results.append(assay_result)
+
+    with open(tnt_results_path, 'wb') as write_handle:
+        for assay_result in assay_results:
+            if not os.path.getsize(assay_result):
+                continue
+            write_handle.write(tnt_separator)
+            awin.write_shifted_hits(assay_result, write_handle)
+    print("Wrote tnt results:", tnt_results_path)
+
+    if not keep_shards:
+        shutil.rmtree(window_dir)
+
+    return tnt_results_path
+
+
+def get_tnt_settings(var_ns):
+    ''' Settings of var_ns that tntblast output depends on '''
+    return [var_ns.tntblast_location, var_ns.assay_type, var_ns.min_primer_Tm,
+            var_ns.min_probe_Tm, var_ns.max_amplicon_length,
+            var_ns.best_match]
+
+
+def tnt_partition_source_key(path_ns, var_ns):
+    ''' Everything besides the assay that tntblast output depends on '''
+    return aparts.hash_values(
+        [aparts.file_key(path_ns.combined_fasta)] + get_tnt_settings(var_ns))
+
+
+def split_tnt_partitions(tnt_result, assays, partition_cache):
+    ''' Write each assay's hits in tnt_result to its own partition '''
+    assay_segments = {}
+    for assay_name, start, end in find_tnt_assay_segments(tnt_result):
+        assay_segments.setdefault(assay_name, []).append((start, end))
+
+    with open(tnt_result, 'rb') as read_handle:
+        for assay_name, key, _ in assays:
+            partition_cache.reset(key)
+            with open(partition_cache.path(key, ".out"), 'wb') as write_handle:
+                for start, end in assay_segments.get(assay_name, []):
+                    copy_tnt_segment(read_handle, write_handle, start, end)
+            partition_cache.names[key] = assay_name
+
+
+def write_tnt_from_partitions(assays, partition_cache, tnt_results_path):
+    ''' Results file of all assays, in assays file order, from partitions;
+        hits of renamed assays get the current name '''
+    with open(tnt_results_path, 'wb') as write_handle:
+        for assay_name, key, _ in assays:
+            partition = partition_cache.path(key, ".out")
+            if not os.path.getsize(partition):
+                continue
+            write_handle.write(tnt_separator)
+            with open(partition, 'rb') as read_handle:
+                if partition_cache.names.get(key) == assay_name:
+                    shutil.copyfileobj(read_handle, write_handle,
+                                       copy_chunk_size)
+                    continue
+                name_line = "name = {}\n".format(assay_name).encode()
+                for line in read_handle:
+                    if line.startswith(b"name = "):
+                        line = name_line
+                    write_handle.write(line)
+
+    print("Wrote tnt results:", tnt_results_path)
+
+
+def run_tntblast_partitioned(path_ns, var_ns, procnum=1, num_shards=None,
+                             retries=2, keep_shards=False,
+                             tnt_results_path=None, windows=False):
+    ''' Run tntblast on only the assays without a cached partition '''
+    partition_cache = aparts.PartitionCache(
+        path_ns.partition_dir, tnt_partition_source_key(path_ns, var_ns))
+    assays = aparts.read_assays(path_ns.assay_file)
+
+    # One run per new oligo triple, under its first name
+    new_assays = {}
+    for assay in assays:
+        if not partition_cache.has(assay[1], ".out"):
+            new_assays.setdefault(assay[1], assay)
+    new_assays = list(new_assays.values())
+    print("{} of {} assays new or modified".format(
+        len(new_assays), len(assays)))
+
+    if new_assays:
+        delta_ns = ap.Namespace(**vars(path_ns))
+        delta_ns.assay_file = os.path.join(
+            path_ns.partition_dir, "new_assays.txt")
+        with open(delta_ns.assay_file, 'w') as write_file:
+            for _, _, line in new_assays:
+                write_file.write(line)
+        delta_result = os.path.join(
+            path_ns.partition_dir, "new_assays_results.out")
+
+        run_assays = run_tntblast_windows if windows else run_tntblast
+        run_assays(delta_ns, var_ns, procnum, num_shards, retries,
+                   keep_shards, delta_result)
+        split_tnt_partitions(delta_result, new_assays, partition_cache)
+        os.remove(delta_ns.assay_file)
+        os.remove(delta_result)
+    partition_cache.save()
+
+    if tnt_results_path is None:
+        tnt_results_path = get_tnt_results_path(path_ns)
+    write_tnt_from_partitions(assays, partition_cache, tnt_results_path)
+
+    return tnt_results_path
+
+
+def get_arguments():
+    parser = ap.ArgumentParser(prog=sys.argv[0].split('/')[-1])
+
+    parser.add_argument('-p', '--procnum',
+                        metavar='[INT]', type=int, default=mp.cpu_count(),
+                        help="Number of tntblast processes to run at " +
+                        "once. Default is the number of CPUs.")
+    parser.add_argument('-n', '--num_shards',
+                        metavar='[INT]', type=int, default=None,
+                        help="Number of shards to split the sequence file " +
+                        "into. Default is the number of processes.")
+    parser.add_argument('--retries',
+                        metavar='[INT]', type=int, default=2,
+                        help="Number of times to rerun a failed shard. " +
+                        "Default is 2.")
+    parser.add_argument('-k', '--keep_shards', action='store_true',
+                        help="Keep the fasta shards and per-shard tnt " +
+                        "output.")
+    parser.add_argument('-P', '--assay_partitions', action='store_true',
+                        help="Cache results per assay and run only new " +
+                        "or modified assays.")
+    parser.add_argument('-D', '--dedup', action='store_true',
+                        help="Run tntblast on one genome per distinct " +
+                        "sequence; the parser copies hits to duplicates.")
+    parser.add_argument('-W', '--amplicon_windows', action='store_true',
+                        help="Run tntblast on the amplicon region of each " +
+                        "genome, per assay, instead of whole genomes.")
+    return parser.parse_args()
 
 
 
@@ -142,12 +600,38 @@ def main():
     big_tic = time.perf_counter()
     
     
+    ''' Get command line arguments '''
+    args = get_arguments()
+
     ''' Prep namespace '''
     path_ns = create_filename_namespace(var_conf)
     
+    ''' Deduplicate sequences '''
+    tnt_results_path = get_tnt_results_path(path_ns)
+    members_file = gdedup.get_members_path(tnt_results_path)
+    tnt_ns = path_ns
+    if args.dedup:
+        tnt_ns = ap.Namespace(**vars(path_ns))
+        tnt_ns.combined_fasta = gdedup.get_dedup_path(
+            path_ns.tnt_dir, path_ns.combined_fasta)
+        gdedup.dedup_fasta(path_ns.combined_fasta, tnt_ns.combined_fasta,
+                           members_file)
+    elif os.path.isfile(members_file):
+        os.remove(members_file)
+
     ''' Run TNTBLAST '''
     print("\nRunning tntblast against all sequences in combined file...")
-    run_tntblast(path_ns, var_conf)
+    if args.assay_partitions:
+        run_tntblast_partitioned(tnt_ns, var_conf, args.procnum,
+                                 args.num_shards, args.retries,
+                                 args.keep_shards, tnt_results_path,
+                                 args.amplicon_windows)
+    elif args.amplicon_windows:
+        run_tntblast_windows(tnt_ns, var_conf, args.procnum, args.num_shards,
+                             args.retries, args.keep_shards, tnt_results_path)
+    else:
+        run_tntblast(tnt_ns, var_conf, args.procnum, args.num_shards,
+                     args.retries, args.keep_shards, tnt_results_path)
 
 
     big_toc = time.perf_counter()
@@ -5,61 +5,124 @@ Created on Mon Apr 27 16:18:46 2020
 
 @author: adanm
 """
+import multiprocessing as mp
 
-def check_fna_file(fna_file, minimum_file_length_considered):
+
+''' 'Global' Variables '''
+# Classes of removed genomes, by position in the removed tally
+bat_class = 0
+pangolin_class = 1
+short_class = 2
+filter_chunksize = 256
+
+
+''' Methods '''
+
+def classify_record(header, seq_length, minimum_file_length_considered):
+    ''' Class of a removed genome (bat, pangolin or short), or None if kept '''
+    if "bat" in header:
+        return bat_class
+    if "pangolin" in header:
+        return pangolin_class
+    if seq_length < minimum_file_length_considered:
+        return short_class
+    return None
+
+
+def check_record(header, seq_length, minimum_file_length_considered):
+    return classify_record(header, seq_length,
+                           minimum_file_length_considered) is None
+
+
+def tally_record(header, seq_length, minimum_file_length_considered,
+                 tally_list):
+    record_class = classify_record(header, seq_length,
+                                   minimum_file_length_considered)
+    if record_class is not None:
+        tally_list[record_class] += 1
+    return tally_list
+
+
+def read_fna_record(fna_file):
+    ''' Header and sequence length of an fna file, read once '''
     with open(fna_file, 'r') as file_handle:
         line1 = file_handle.readline().strip()
         line2 = file_handle.readline().strip()
-        remaining_length = len(file_handle.readlines())
-        if remaining_length > 0:
-            print("length of remaining lines:", remaining_length, fna_file)
-    if "bat" in line1:
-        return False
-    if "pangolin" in line1:
-        return False
-    if len(line2) < minimum_file_length_considered:
-        return False
-    return True
+        remaining_length = sum(1 for line in file_handle)
+    if remaining_length > 0:
+        print("length of remaining lines:", remaining_length, fna_file)
+    return line1, len(line2)
+
+
+def check_fna_file(fna_file, minimum_file_length_considered):
+    line1, seq_length = read_fna_record(fna_file)
+    return check_record(line1, seq_length, minimum_file_length_considered)
 
 
 def tally_removed(fna_file, minimum_file_length_considered, tally_list):
-    with open(fna_file, 'r') as file_handle:
-        line1 = file_handle.readline().strip()
-        line2 = file_handle.readline().strip()
-    if "bat" in line1:
-        tally_list[0] += 1
-    elif "pangolin" in line1:
-        tally_list[1] += 1
-    elif len(line2) < minimum_file_length_considered:
-        tally_list[2] += 1
-    return tally_list
+    line1, seq_length = read_fna_record(fna_file)
+    return tally_record(line1, seq_length, minimum_file_length_considered,
+                        tally_list)
+
 
+def classify_fna_file(argument):
+    fna_file, minimum_file_length_considered = argument
+    line1, seq_length = read_fna_record(fna_file)
+    return classify_record(line1, seq_length, minimum_file_length_considered)
 
 
-def filter_len_et_orgs(file_list, min_seq_len):
+def tally_classes(name_list, class_list):
+    ''' Kept names and the tallies db_stats.generate_db_stats expects,
+        from the class of each name '''
     bat_pang_short_tally = [ 0, 0, 0]
     removed = 0
     kept = 0
-    list_to_return = file_list.copy()
-    list_before = len(list_to_return)
-    for fna_file in file_list:
-        accession = fna_file.split('/')[-1].split('.')[0]
-        if not check_fna_file(fna_file, min_seq_len):
+    list_to_return = []
+    list_before = len(name_list)
+    for name, record_class in zip(name_list, class_list):
+        if record_class is not None:
+            accession = name.split('/')[-1].split('.')[0]
             print("Omitted file {} (Failed check) ".format(accession) + \
                   "#####################################################")
-            bat_pang_short_tally = tally_removed(fna_file, min_seq_len, bat_pang_short_tally)
-            list_to_return.remove(fna_file)
+            bat_pang_short_tally[record_class] += 1
             removed += 1
         else:
-            # print("{} checked".format(accession))
+            list_to_return.append(name)
             kept += 1
     list_after = len(list_to_return)
 
-    tallies = [ list_before, removed, bat_pang_short_tally[0], 
-               bat_pang_short_tally[1], bat_pang_short_tally[2], 
+    tallies = [ list_before, removed, bat_pang_short_tally[0],
+               bat_pang_short_tally[1], bat_pang_short_tally[2],
                kept, list_after ]
-    
+
     total_list_len = len(list_to_return)
 
     return list_to_return, tallies, total_list_len
 
+
+def filter_len_et_orgs(file_list, min_seq_len, procnum=1):
+    ''' Classify each fna file in one read, across procnum processes '''
+    arguments = [ (fna_file, min_seq_len) for fna_file in file_list ]
+    if procnum > 1:
+        pool = mp.Pool(processes=procnum)
+        class_list = pool.map_async(classify_fna_file, arguments,
+                                    chunksize=filter_chunksize).get()
+        pool.close()
+        pool.join()
+    else:
+        class_list = [ classify_fna_file(argument) for argument in arguments ]
+
+    return tally_classes(file_list, class_list)
+
+
+def filter_store_len_et_orgs(genome_store, min_seq_len):
+    ''' filter_len_et_orgs for the genomes of a genome_store.GenomeStore;
+        sequence lengths come from the store index, so only headers are
+        read.  Returns the accessions kept. '''
+    accession_list = genome_store.accessions()
+    class_list = [ classify_record(genome_store.get_header(accession),
+                                   genome_store.get_length(accession),
+                                   min_seq_len)
+                   for accession in accession_list ]
+
+    return tally_classes(accession_list, class_list)
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The package's modules are scripts, imported from the scripts directory
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir, "scripts"))
@@ -0,0 +1,77 @@
+"""
+Tests of genome_store.py: records read back from a store with more
+    shards than the process may open files, and shards cut off while
+    being written.
+"""
+import os
+import resource
+
+import pytest
+
+import genome_store as gstore
+
+
+def make_store(store_dir, num_shards):
+    ''' Store of one genome per shard; returns the records written '''
+    genome_store = gstore.GenomeStore(store_dir)
+    records = []
+    for shard in range(num_shards):
+        record = ("ACC{:05d}".format(shard),
+                  ">iso{0}|ACC{0:05d}|2021-01-01".format(shard),
+                  "ACGT" * (shard % 7 + 1))
+        genome_store.add_shard([record])
+        records.append(record)
+    genome_store.close()
+    return records
+
+
+def test_records_read_back(tmp_path):
+    records = make_store(str(tmp_path / "store"), 3)
+    genome_store = gstore.GenomeStore(str(tmp_path / "store"))
+
+    assert list(genome_store.iter_records()) == records
+    accession, header, sequence = records[1]
+    assert genome_store.get_header(accession) == header
+    assert genome_store.get_sequence(accession) == sequence
+    assert genome_store.get_length(accession) == len(sequence)
+    genome_store.close()
+
+
+def test_more_shards_than_open_file_limit(tmp_path):
+    fd_limit = 128
+    records = make_store(str(tmp_path / "store"), fd_limit * 3)
+
+    soft_limit, hard_limit = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (fd_limit, hard_limit))
+    try:
+        genome_store = gstore.GenomeStore(str(tmp_path / "store"))
+        assert list(genome_store.iter_records()) == records
+        # Again, in reverse, through readers closed and reopened
+        for accession, header, sequence in reversed(records):
+            assert genome_store.get_sequence(accession) == sequence
+        assert len(genome_store.readers) <= gstore.max_open_readers
+        genome_store.close()
+    finally:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (soft_limit, hard_limit))
+
+
+def test_cut_off_shard_is_discarded(tmp_path):
+    store_dir = str(tmp_path / "store")
+    genome_store = gstore.GenomeStore(store_dir)
+
+    def cut_off_records():
+        yield "ACC00000", ">iso0|ACC00000|2021-01-01", "ACGT"
+        raise IOError("response cut off")
+
+    with pytest.raises(IOError):
+        genome_store.add_shard(cut_off_records())
+    assert os.listdir(store_dir) == []
+    assert genome_store.add_shard(iter([])) == []
+    assert os.listdir(store_dir) == []
+
+    record = ("ACC00001", ">iso1|ACC00001|2021-01-01", "ACGTACGT")
+    genome_store.add_shard([record])
+    genome_store.close()
+    genome_store = gstore.GenomeStore(store_dir)
+    assert list(genome_store.iter_records()) == [record]
+    genome_store.close()
@@ -0,0 +1,281 @@
+"""
+Tests of ncbi_download.py and am_download.py against a local stub of the
+    E-utilities (http.server in a thread): rate limiting, retries with
+    backoff, paging of a history server search and reruns that fetch only
+    what an earlier failed run missed (download manifest, history page
+    progress).
+"""
+import os
+import sys
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+import pytest
+
+import am_download
+import ncbi_download
+
+
+''' Stub E-utilities '''
+
+def insdseq(uid):
+    ''' INSDSeq record of a stub uid '''
+    accession = "MZ{:06d}".format(int(uid))
+    sequence = "acgt" * (10 + int(uid))
+    return (
+        "<INSDSeq><INSDSeq_locus>{0}</INSDSeq_locus>"
+        "<INSDSeq_length>{1}</INSDSeq_length>"
+        "<INSDSeq_create-date>01-JAN-2021</INSDSeq_create-date>"
+        "<INSDSeq_definition>isolate X{2}</INSDSeq_definition>"
+        "<INSDSeq_primary-accession>{0}</INSDSeq_primary-accession>"
+        "<INSDSeq_accession-version>{0}.1</INSDSeq_accession-version>"
+        "<INSDSeq_taxonomy>Viruses</INSDSeq_taxonomy>"
+        "<INSDSeq_references><INSDReference>"
+        "<INSDReference_reference>1</INSDReference_reference>"
+        "<INSDReference_authors><INSDAuthor>Doe,J.</INSDAuthor>"
+        "</INSDReference_authors>"
+        "<INSDReference_title>Direct Submission</INSDReference_title>"
+        "<INSDReference_journal>Lab</INSDReference_journal>"
+        "</INSDReference></INSDSeq_references>"
+        "<INSDSeq_feature-table><INSDFeature>"
+        "<INSDFeature_key>source</INSDFeature_key>"
+        "<INSDFeature_intervals><INSDInterval>"
+        "<INSDInterval_from>1</INSDInterval_from>"
+        "<INSDInterval_to>{1}</INSDInterval_to>"
+        "</INSDInterval></INSDFeature_intervals>"
+        "<INSDFeature_quals><INSDQualifier>"
+        "<INSDQualifier_name>isolate</INSDQualifier_name>"
+        "<INSDQualifier_value>X{2}</INSDQualifier_value>"
+        "</INSDQualifier></INSDFeature_quals>"
+        "</INSDFeature></INSDSeq_feature-table>"
+        "<INSDSeq_sequence>{3}</INSDSeq_sequence></INSDSeq>").format(
+            accession, len(sequence), uid, sequence)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def send(self, status, body):
+        body = body.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "text/xml")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = { key: values[0]
+                   for key, values in parse_qs(url.query).items() }
+        utility = os.path.basename(url.path)
+        status, body = self.server.stub.respond(utility, params)
+        self.send(status, body)
+
+
+class StubEutils(object):
+    """ E-utilities stub: esearch (with history), esummary and INSDSeq
+    efetch of the uids "0" to str(num_records - 1).
+
+    Requests are logged as (time, utility, params).  A request is failed
+    with the next status in failures[(utility, retstart)], if any, and
+    every efetch of a uid in fail_uids is failed with a 503.
+    """
+
+    def __init__(self, num_records):
+        self.uids = [ str(uid) for uid in range(num_records) ]
+        self.failures = {}
+        self.fail_uids = set()
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def requests_of(self, utility):
+        with self.lock:
+            return [ params for _, each, params in self.requests
+                     if each == utility ]
+
+    def fetched_uids(self):
+        ''' uids of all successful efetch responses '''
+        return [ uid for params in self.requests_of("efetch.fcgi")
+                 if params.get("status") == 200
+                 for uid in params["uids"] ]
+
+    def respond(self, utility, params):
+        if utility == "efetch.fcgi":
+            if "id" in params:
+                uids = params["id"].split(",")
+            else:
+                assert (params["WebEnv"], params["query_key"]) == ("WE1", "1")
+                retstart = int(params["retstart"])
+                uids = self.uids[retstart:retstart + int(params["retmax"])]
+            params["uids"] = uids
+
+        with self.lock:
+            self.requests.append((time.monotonic(), utility, params))
+            statuses = self.failures.get((utility, params.get("retstart")))
+            status = statuses.pop(0) if statuses else 200
+        if utility == "efetch.fcgi" and self.fail_uids & set(params["uids"]):
+            status = 503
+        params["status"] = status
+        if status != 200:
+            return status, "<error>busy</error>"
+
+        if utility == "esearch.fcgi":
+            history = ""
+            ids = self.uids
+            if params.get("usehistory") == "y":
+                history = "<QueryKey>1</QueryKey><WebEnv>WE1</WebEnv>"
+                ids = []
+            return status, (
+                "<eSearchResult><Count>{}</Count>{}<IdList>{}</IdList>"
+                "</eSearchResult>").format(len(self.uids), history,
+                    "".join("<Id>{}</Id>".format(uid) for uid in ids))
+        if utility == "esummary.fcgi":
+            return status, "<eSummaryResult>{}</eSummaryResult>".format(
+                "".join(
+                    "<DocSum><Id>{0}</Id><Item Name=\"AccessionVersion\">"
+                    "MZ{0:06d}.1</Item><Item Name=\"UpdateDate\">2021/01/01"
+                    "</Item></DocSum>".format(int(uid))
+                    for uid in params["id"].split(",")))
+        if utility == "efetch.fcgi":
+            return status, "<INSDSet>{}</INSDSet>".format(
+                "".join(insdseq(uid) for uid in params["uids"]))
+        return 404, "<error>unknown utility</error>"
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    ''' Stub E-utilities of 5 records, served in a thread; short backoff,
+        a fast rate limit and small batches and pages '''
+    stub_eutils = StubEutils(5)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.daemon_threads = True
+    server.stub = stub_eutils
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    stub_eutils.base_url = "http://127.0.0.1:{}/".format(server.server_port)
+    monkeypatch.setattr(ncbi_download, "base_url", stub_eutils.base_url)
+    monkeypatch.setattr(ncbi_download, "backoff_seconds", 0.01)
+    monkeypatch.setattr(ncbi_download, "requests_per_second", 20)
+    monkeypatch.setattr(ncbi_download, "split_size", 2)
+    monkeypatch.setattr(ncbi_download, "history_page_size", 2)
+    yield stub_eutils
+
+    server.shutdown()
+    server.server_close()
+
+
+def run_am_download(monkeypatch, stub, tmp_path, *options):
+    ''' Run am_download.py on the stub, writing fna files '''
+    directories = {}
+    for name in ("resources", "results", "fasta"):
+        directories[name] = tmp_path / name
+        directories[name].mkdir(exist_ok=True)
+    monkeypatch.setattr(sys, "argv", [
+        "am_download.py", "-e", "test@example.com",
+        "-m", "2020/01/01", "-M", "2021/01/01", "-s", "0:99999999",
+        "-r", str(directories["resources"]),
+        "-R", str(directories["results"]),
+        "-f", str(directories["fasta"]),
+        "-u", stub.base_url, "-t", "2", "-F"] + list(options))
+    am_download.main()
+    return sorted(os.listdir(directories["fasta"]))
+
+
+def fna_files(uids):
+    return sorted("MZ{:06d}.fna".format(int(uid)) for uid in uids)
+
+
+''' Tests '''
+
+def test_token_bucket_limits_rate():
+    limiter = ncbi_download.TokenBucket(20)
+    tic = time.monotonic()
+    for _ in range(6):
+        limiter.acquire()
+    assert time.monotonic() - tic >= 5 / 20 * 0.9
+
+
+def test_get_with_retries_retries_throttled_and_failed_requests(stub):
+    stub.failures[("esearch.fcgi", None)] = [429, 503]
+    response = ncbi_download.get_with_retries(
+        stub.base_url + "esearch.fcgi?db=nuccore")
+
+    assert response.status_code == 200
+    assert [ params["status"] for params in stub.requests_of("esearch.fcgi") ] \
+        == [429, 503, 200]
+
+
+def test_get_with_retries_gives_up(stub, monkeypatch):
+    monkeypatch.setattr(ncbi_download, "max_retries", 2)
+    stub.failures[("esearch.fcgi", None)] = [500] * 5
+
+    with pytest.raises(ncbi_download.requests.RequestException):
+        ncbi_download.get_with_retries(
+            stub.base_url + "esearch.fcgi?db=nuccore")
+    assert len(stub.requests_of("esearch.fcgi")) == 3
+
+
+def test_history_pages_fetched_with_retries(stub, monkeypatch, tmp_path):
+    # Second page throttled, then failed, then served
+    stub.failures[("efetch.fcgi", "2")] = [429, 503]
+
+    fasta_files = run_am_download(monkeypatch, stub, tmp_path, "-H")
+
+    assert fasta_files == fna_files(stub.uids)
+    efetch_requests = stub.requests_of("efetch.fcgi")
+    assert sorted(params["retstart"] for params in efetch_requests) \
+        == ["0", "2", "2", "2", "4"]
+    assert sorted(stub.fetched_uids()) == sorted(stub.uids)
+
+    # Requests are spaced by the rate limit
+    times = [ request_time for request_time, utility, _ in stub.requests
+              if utility == "efetch.fcgi" ]
+    assert max(times) - min(times) >= (len(times) - 1) / 20 * 0.9
+
+
+def test_manifest_rerun_fetches_only_missing_records(stub, monkeypatch,
+                                                     tmp_path):
+    monkeypatch.setattr(ncbi_download, "max_retries", 1)
+
+    # First run: the batch of uids 2 and 3 keeps failing
+    stub.fail_uids = {"3"}
+    with pytest.raises(ncbi_download.requests.RequestException):
+        run_am_download(monkeypatch, stub, tmp_path)
+    assert sorted(stub.fetched_uids()) == ["0", "1", "4"]
+
+    # Second run: only the failed batch is fetched
+    stub.fail_uids = set()
+    stub.requests = []
+    fasta_files = run_am_download(monkeypatch, stub, tmp_path)
+    assert fasta_files == fna_files(stub.uids)
+    assert sorted(stub.fetched_uids()) == ["2", "3"]
+    assert len(stub.requests_of("efetch.fcgi")) == 1
+
+    # Third run: nothing left to fetch
+    stub.requests = []
+    run_am_download(monkeypatch, stub, tmp_path)
+    assert stub.requests_of("efetch.fcgi") == []
+
+
+def test_history_rerun_fetches_only_missing_pages(stub, monkeypatch,
+                                                  tmp_path):
+    monkeypatch.setattr(ncbi_download, "max_retries", 1)
+
+    # First run: the page of uids 2 and 3 keeps failing
+    stub.failures[("efetch.fcgi", "2")] = [503] * 2
+    with pytest.raises(ncbi_download.requests.RequestException):
+        run_am_download(monkeypatch, stub, tmp_path, "-H")
+    assert sorted(stub.fetched_uids()) == ["0", "1", "4"]
+
+    # Second run: only the failed page is fetched
+    stub.requests = []
+    fasta_files = run_am_download(monkeypatch, stub, tmp_path, "-H")
+    assert fasta_files == fna_files(stub.uids)
+    assert [ params["retstart"] for params
+             in stub.requests_of("efetch.fcgi") ] == ["2"]
@@ -0,0 +1,98 @@
+"""
+Tests of results_store.py: a Full_Dict written to a results store reads
+    back equal, with accession-only False Negatives as a NegativesList.
+"""
+import numpy as np
+
+import results_store as rstore
+from accession_index import AccessionIndex, NegativesList, expand_negatives
+
+
+def make_hit(accession, mismatches):
+    return {
+        "Accession": accession,
+        "Common Name": "iso|{}|2021-01-01".format(accession),
+        "Alignments": {
+            "Forward Primer": {"5'": "ACGTAC", "3'": "TGCATG",
+                               "pairing": "||||||"},
+            "Reverse Primer": {"5'": "GGCATT", "3'": "CCGTNA",
+                               "pairing": "|||| |"},
+        },
+        "Composition": {"amplicon range": ["100", "200"],
+                        "amplicon length": "101"},
+        "Thermo": {"Forward Primer": {"dG": "-21.2"},
+                   "Reverse Primer": {"dG": "-22.2"}},
+        "Values": {"Forward Primer": {"mismatches": str(mismatches),
+                                      "gaps": "0", "tm": "58.8"},
+                   "Reverse Primer": {"mismatches": "0", "gaps": "1",
+                                      "tm": "59.1"}},
+    }
+
+
+def make_full_dict():
+    accession_index = AccessionIndex([ "ACC{:04d}".format(i)
+                                       for i in range(50) ])
+    negatives = NegativesList(accession_index,
+                              np.array([3, 7, 8, 20], dtype=np.int32))
+    # A True Positive moved by the three prime filter
+    negatives.append(make_hit("ACC0001", 3))
+
+    odd_hit = make_hit("ACC0002", 1)
+    odd_hit["Extra"] = {"none": None, "dict": {}, "list": [], "int": 3,
+                        "float": 1.5, "bool": True,
+                        "nested": [[1, "a"], {"key": [None]}]}
+    return {
+        "Assay": [
+            {"Name": "Assay_0",
+             "True Positives": [ make_hit("ACC0000", 0), odd_hit ],
+             "False Negatives": negatives},
+            # Plain list negatives, with entries that are not only an
+            # accession after the accession-only ones
+            {"Name": "Assay_1",
+             "True Positives": [ make_hit("ACC0010", 2) ],
+             "False Negatives": [ {"Accession": "ACC0011"},
+                                  {"Accession": "ACC0049"},
+                                  {"Accession": None},
+                                  {"Accession": "ACC0012", "Note": "x"} ]},
+            {"Name": "Assay_2",
+             "True Positives": [],
+             "False Negatives": []},
+        ],
+        "Timestamp": "2021-01-01 00:00:00",
+    }
+
+
+def test_store_round_trip(tmp_path, capsys):
+    full_dict = make_full_dict()
+    store_dir = str(tmp_path / ("Assay_Results" + rstore.store_suffix))
+
+    rstore.write_results_store(full_dict, store_dir)
+    assert rstore.is_results_store(store_dir)
+    read_dict = rstore.read_results_store(store_dir)
+
+    assert expand_negatives(read_dict) == expand_negatives(full_dict)
+    for read_assay, assay_dict in zip(read_dict["Assay"],
+                                      full_dict["Assay"]):
+        negatives = read_assay["False Negatives"]
+        assert isinstance(negatives, NegativesList)
+        assert negatives.accession_list() == [
+            negative["Accession"] for negative in
+            assay_dict["False Negatives"] ]
+
+    negatives = read_dict["Assay"][0]["False Negatives"]
+    assert negatives.accession_index.decode(negatives.idx) == \
+        ["ACC0003", "ACC0007", "ACC0008", "ACC0020"]
+    assert negatives.extra == [ make_hit("ACC0001", 3) ]
+
+
+def test_store_reads_selected_result_types(tmp_path, capsys):
+    full_dict = make_full_dict()
+    store_dir = str(tmp_path / ("Assay_Results" + rstore.store_suffix))
+    rstore.write_results_store(full_dict, store_dir)
+
+    read_dict = rstore.load_results(store_dir, [rstore.positives_type])
+    assert [ assay_dict["True Positives"]
+             for assay_dict in read_dict["Assay"] ] == \
+        [ assay_dict["True Positives"] for assay_dict in full_dict["Assay"] ]
+    assert all(assay_dict["False Negatives"] == []
+               for assay_dict in read_dict["Assay"])
@@ -0,0 +1,119 @@
+"""
+Tests of the 3' terminal mismatch filter of newer_tnt_parse_oldtnt.py:
+    filter_three_prime_vectorized partitions True Positives into True
+    Positives and False Negatives as filter_three_prime does, on
+    synthetic alignments with N (and gap and lowercase) target bases.
+"""
+import copy
+import random
+
+import pytest
+
+import newer_tnt_parse_oldtnt as nuparse
+
+
+''' Synthetic alignments '''
+
+def write_del_ct_table(table_file, seed=0):
+    ''' Random delta Ct table; perfect terminal matches get 0 '''
+    rng = random.Random(seed)
+    dinucleotides = list(nuparse.dinucleotide_codes)
+    with open(table_file, 'w') as write_file:
+        print("\t".join(["Row"] + dinucleotides), file=write_file)
+        for primer_bases in dinucleotides:
+            del_cts = [ 0.0 if primer_bases == target_bases
+                        else round(rng.uniform(0, 3), 2)
+                        for target_bases in dinucleotides ]
+            print("\t".join([primer_bases] + [ str(del_ct)
+                                               for del_ct in del_cts ]),
+                  file=write_file)
+
+
+def terminal_pair(rng):
+    ''' Last two primer bases and the target bases aligned to them (the
+        complement of the primer's, on a match); an N is on at most one
+        strand at each position, as filter_three_prime needs.  Target
+        bases may be lowercase or gaps (read as N). '''
+    primer_bases = ""
+    target_bases = ""
+    for _ in range(2):
+        primer_base = rng.choice("ACGTACGTN")
+        target_base = rng.choice("ACGTacgtN-")
+        while primer_base == "N" and target_base in "N-":
+            target_base = rng.choice("ACGTacgt")
+        primer_bases += primer_base
+        target_bases += target_base
+    return primer_bases, target_bases
+
+
+def make_hit(rng, accession, for_pair=None, rev_pair=None):
+    alignments = {}
+    for primer, pair in ((nuparse.FP, for_pair), (nuparse.RP, rev_pair)):
+        primer_bases, target_bases = pair or terminal_pair(rng)
+        prefix = "".join(rng.choice("ACGT") for _ in range(18))
+        alignments[primer] = {
+            "5'": prefix + primer_bases,
+            "3'": nuparse.complement(prefix) + target_bases,
+        }
+    return {"Accession": accession, "Alignments": alignments}
+
+
+def make_full_dict(seed=0, num_assays=4, hits_per_assay=200):
+    rng = random.Random(seed)
+    return {"Assay": [
+        {"Name": "Assay_{}".format(assay),
+         "True Positives": [ make_hit(rng, "ACC{:06d}".format(hit))
+                             for hit in range(hits_per_assay) ],
+         "False Negatives": []}
+        for assay in range(num_assays) ]}
+
+
+def without_timestamp(full_dict):
+    return { key: value for key, value in full_dict.items()
+             if key != "Timestamp" }
+
+
+''' Tests '''
+
+@pytest.mark.parametrize("del_ct_thresh", [0.5, 1.5, 2.5])
+def test_vectorized_filter_partitions_as_filter_three_prime(
+        tmp_path, capsys, del_ct_thresh):
+    table_file = str(tmp_path / "del_ct_table.txt")
+    write_del_ct_table(table_file)
+    full_dict = make_full_dict()
+
+    expected = nuparse.filter_three_prime(
+        copy.deepcopy(full_dict), table_file, del_ct_thresh)
+    result = nuparse.filter_three_prime_vectorized(
+        copy.deepcopy(full_dict), table_file, del_ct_thresh)
+
+    assert without_timestamp(result) == without_timestamp(expected)
+    # Both lists of each assay are exercised
+    for assay_dict in expected["Assay"]:
+        assert assay_dict["True Positives"]
+        assert assay_dict["False Negatives"]
+
+
+def test_n_on_both_strands_looks_up_zero(tmp_path, capsys):
+    table_file = str(tmp_path / "del_ct_table.txt")
+    write_del_ct_table(table_file)
+    rng = random.Random(0)
+    # N opposite N (or a gap) at the last primer base; the other primer
+    # is a perfect match
+    full_dict = {"Assay": [
+        {"Name": "Assay_0",
+         "True Positives": [
+             make_hit(rng, "ACC000000", ("AN", "TN"), ("CG", "GC")),
+             make_hit(rng, "ACC000001", ("AN", "T-"), ("CG", "GC"))],
+         "False Negatives": []}]}
+
+    with pytest.raises(KeyError):
+        nuparse.filter_three_prime(
+            copy.deepcopy(full_dict), table_file, 0.1)
+
+    result = nuparse.filter_three_prime_vectorized(
+        copy.deepcopy(full_dict), table_file, 0.1)
+    assay_dict = result["Assay"][0]
+    assert [ hit["Accession"] for hit in assay_dict["True Positives"] ] \
+        == ["ACC000000", "ACC000001"]
+    assert assay_dict["False Negatives"] == []
@@ -0,0 +1,39 @@
+"""
+Tests of the tntblast output parser of newer_tnt_parse_oldtnt.py on a
+    small tntblast results file (data/tnt_results.out: 3 assays of 5
+    hits): a parallel parse gives the same Full_Dict as a serial one.
+"""
+import os
+
+import newer_tnt_parse_oldtnt as nuparse
+
+
+tnt_result = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          "data", "tnt_results.out")
+
+
+def get_iso_acc_dict():
+    ''' Accession of each isolate (the first header field) in tnt_result '''
+    with open(tnt_result, 'r') as read_file:
+        return { line[1:].split("|")[0]: line[1:].split("|")[1]
+                 for line in read_file if line.startswith(">") }
+
+
+def without_timestamp(full_dict):
+    return { key: value for key, value in full_dict.items()
+             if key != "Timestamp" }
+
+
+def test_parallel_parse_matches_serial_parse(capsys):
+    iso_acc_dict = get_iso_acc_dict()
+
+    serial_dict = nuparse.brute_parse_tnt_results(
+        tnt_result, iso_acc_dict, 0, 1, {})
+    parallel_dict = nuparse.brute_parse_tnt_results(
+        tnt_result, iso_acc_dict, 0, 4, {})
+
+    assert without_timestamp(parallel_dict) == without_timestamp(serial_dict)
+    assert [ assay_dict["Name"] for assay_dict in serial_dict["Assay"] ] == \
+        ["Assay_0", "Assay_1", "Assay_2"]
+    assert [ len(assay_dict["True Positives"])
+             for assay_dict in serial_dict["Assay"] ] == [5, 5, 5]